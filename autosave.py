@@ -0,0 +1,450 @@
+# File: autosave.py
+
+# Write-ahead journal of scene changes, replayed on the next launch after a
+# crash. Each running instance journals to its own file in ~/.mare/ and
+# holds a lock on it while it runs, so a journal nobody holds is one a
+# crashed session left behind. The Tk thread only records which shapes changed and, a moment
+# later, captures them as ("put", ...) / ("del", id) ops holding references
+# (record coords are never modified in place, so a reference is a
+# snapshot). A writer thread encodes the ops, appends them to the journal
+# with fsyncs batched per FSYNC_INTERVAL, and folds the journal into a
+# snapshot once it grows past COMPACT_BYTES.
+#
+# Ops, each idempotent so a replay may safely repeat them:
+#   ("clear",)                       empty document
+#   ("base", path)                   the document as saved at path (or None)
+#   ("layers", ((id, name, visible, locked, opacity), ...), active_layer)
+#   ("put", id, kind, coords, fill, outline, width, dash, group, layer, matrix, data)
+#   ("del", id)
+
+import base64
+import glob
+import json
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+
+from scene_model import Layer, ShapeRecord
+
+AUTOSAVE_DIR = os.path.join(os.path.expanduser("~"), ".mare")
+CAPTURE_DELAY_MS = 300
+CAPTURE_BATCH = 2000
+CAPTURE_SLICE = 0.004
+FSYNC_INTERVAL = 0.5
+COMPACT_BYTES = 8 * 1024 * 1024
+# The writer yields the GIL every this many ops so long writes and
+# compactions never hold up the Tk thread.
+YIELD_EVERY = 256
+FRAME = struct.Struct("<II")  # payload length, crc32
+
+
+def encode_op(op):
+    if op[0] != "put":
+        return list(op)
+    _, shape_id, kind, coords, fill, outline, width, dash, group, layer, matrix, data = op
+    if data is not None:
+        data = [data.width, data.height, base64.b64encode(data.bits).decode("ascii")]
+    return ["put", shape_id, kind, coords.tolist(), fill, outline, width, dash, group, layer, matrix, data]
+
+def decode_op(item):
+    if item[0] != "put":
+        if item[0] == "layers":
+            return ("layers", tuple(tuple(layer) for layer in item[1]), item[2])
+        return tuple(item)
+    _, shape_id, kind, coords, fill, outline, width, dash, group, layer, matrix, data = item
+    if data is not None:
+        from raster import Bitmap
+        data = Bitmap(data[0], data[1], base64.b64decode(data[2]))
+    return (
+        "put", shape_id, kind, array('d', coords), fill, outline, width, tuple(dash) if dash else dash, group, layer,
+        tuple(matrix) if matrix else None, data,
+    )
+
+def put_op(record):
+    return (
+        "put", record.id, record.kind, record.coords, record.fill, record.outline, record.width, record.dash,
+        record.group, record.layer, record.matrix, record.data,
+    )
+
+def op_record(op):
+    _, shape_id, kind, coords, fill, outline, width, dash, group, layer, matrix, data = op
+    return ShapeRecord(shape_id, kind, coords, fill, outline, width, dash, group, data, layer, matrix)
+
+def read_frames(path):
+    # Decoded ops and the length of the intact prefix; a torn or corrupt
+    # frame (a crash mid-write) ends the journal.
+    ops = []
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return ops, 0
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        payload = data[offset + FRAME.size:offset + FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        ops.append(decode_op(json.loads(payload)))
+        offset += FRAME.size + length
+    return ops, offset
+
+
+class JournalState:
+    # What the ops so far add up to: a base document plus the shapes put or
+    # deleted since.
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.base = None
+        self.layers = None
+        self.records = {}
+        self.deleted = set()
+
+    def __bool__(self):
+        return bool(self.base or self.layers or self.records or self.deleted)
+
+    def apply(self, op):
+        name = op[0]
+        if name == "put":
+            self.records[op[1]] = op
+            self.deleted.discard(op[1])
+        elif name == "del":
+            self.records.pop(op[1], None)
+            self.deleted.add(op[1])
+        elif name == "layers":
+            self.layers = op
+        elif name == "base":
+            self.base = op[1]
+            self.records.clear()
+            self.deleted.clear()
+        elif name == "clear":
+            self.clear()
+
+    def ops(self):
+        yield ("clear",)
+        if self.base is not None:
+            yield ("base", self.base)
+        if self.layers is not None:
+            yield self.layers
+        for shape_id in sorted(self.records):
+            yield self.records[shape_id]
+        for shape_id in sorted(self.deleted):
+            yield ("del", shape_id)
+
+
+class Journal:
+    # The on-disk side. Everything after start() runs on the writer thread;
+    # the Tk thread only calls append(), which never blocks.
+    def __init__(self, path, fsync_interval=FSYNC_INTERVAL, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.snapshot_path = f"{path}.snap"
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.state = JournalState()
+        self.error = None
+        self.compactions = 0
+        self._queue = queue.Queue()
+        self._file = None
+        self._thread = None
+        self._lock_file = None
+
+    def lock(self):
+        # Takes the journal for this process; False if another one has it.
+        lock_file = open(f"{self.path}.lock", "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def release(self):
+        # Closing the file drops the lock, as the process dying would.
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def read(self):
+        # Snapshot then journal, replayed into `state`; returns that state.
+        # The journal is cut back to its intact prefix so appends stay
+        # readable.
+        for path in (self.snapshot_path, self.path):
+            ops, length = read_frames(path)
+            for op in ops:
+                self.state.apply(op)
+            if path == self.path and os.path.exists(path) and length < os.path.getsize(path):
+                with open(path, "r+b") as f:
+                    f.truncate(length)
+        return self.state
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def append(self, ops):
+        if ops and self.error is None:
+            self._queue.put(ops)
+
+    def close(self, discard=False):
+        # Flushes what is queued; `discard` then removes the files (a clean
+        # exit leaves nothing to recover).
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if discard:
+            for path in (self.path, self.snapshot_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        held = self._lock_file is not None
+        self.release()
+        if discard and held:
+            try:
+                os.remove(f"{self.path}.lock")
+            except OSError:
+                pass
+
+    def flush(self):
+        # Blocks until everything appended so far is on disk; for tests.
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _run(self):
+        synced = time.monotonic()
+        unsynced = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval if unsynced else None)
+            except queue.Empty:
+                item = ()
+            items = [item]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in items
+            waiters = [item for item in items if isinstance(item, threading.Event)]
+            try:
+                for ops in items:
+                    if isinstance(ops, list):
+                        self._write(ops)
+                        unsynced = True
+                if unsynced and (stop or waiters or time.monotonic() - synced >= self.fsync_interval):
+                    self._sync(self._file)
+                    synced = time.monotonic()
+                    unsynced = False
+                    if self._file.tell() >= self.compact_bytes:
+                        self._compact()
+            except OSError as error:
+                # Out of disk or the like: stop journaling, keep the app going.
+                self.error = error
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, ops):
+        for i, op in enumerate(ops):
+            payload = json.dumps(encode_op(op), separators=(",", ":")).encode("utf-8")
+            self._file.write(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.state.apply(op)
+            if i % YIELD_EVERY == YIELD_EVERY - 1:
+                time.sleep(0)
+        self._file.flush()
+
+    def _sync(self, f):
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _compact(self):
+        # Snapshot first, then truncate: a crash in between replays the old
+        # journal over the new snapshot, which the ops' idempotence allows.
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "wb") as f:
+            for i, op in enumerate(self.state.ops()):
+                payload = json.dumps(encode_op(op), separators=(",", ":")).encode("utf-8")
+                f.write(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+                if i % YIELD_EVERY == YIELD_EVERY - 1:
+                    time.sleep(0)
+            self._sync(f)
+        os.replace(temp_path, self.snapshot_path)
+        self._file.seek(0)
+        self._file.truncate()
+        self._sync(self._file)
+        self.compactions += 1
+
+
+class Autosave:
+    # The Tk-thread side: a scene listener that notes what changed and,
+    # CAPTURE_DELAY_MS later, hands the changes to the journal in slices of
+    # at most CAPTURE_SLICE seconds.
+    def __init__(self, app, journal, delay=CAPTURE_DELAY_MS):
+        self.app = app
+        self.journal = journal
+        self.delay = delay
+        # Shape id -> None; captured as a put if the shape still exists,
+        # else a delete.
+        self._dirty = {}
+        # Per group tuple, the shapes its latest "transform" touched, so a
+        # long drag costs one entry rather than one per frame.
+        self._transformed = {}
+        self._cleared = False
+        self._layers = False
+        self._base = app.document_path
+        self._after_id = None
+        app.scene.subscribe(self._on_scene_change)
+
+    def _on_scene_change(self, event, record):
+        if event == "transform":
+            self._transformed[record.groups or object()] = record.shape_ids
+        elif event in ("add", "update", "style", "remove"):
+            loader = self.app.document_loader
+            if event == "add" and loader is not None and loader.restoring:
+                # Part of the base document, not a change to it.
+                return
+            self._dirty[record.id] = None
+        elif event == "layers":
+            self._layers = True
+        elif event == "clear":
+            self._dirty.clear()
+            self._transformed.clear()
+            self._cleared = True
+            self._layers = True
+        self._schedule()
+
+    def _schedule(self, delay=None):
+        if self._after_id is None:
+            self._after_id = self.app.canvas.after(self.delay if delay is None else delay, self.capture)
+
+    def rebase(self):
+        # After a save the file holds everything; the journal starts over
+        # from it at the next capture.
+        self._base = object()
+        self._schedule()
+
+    def capture(self):
+        self._after_id = None
+        ops = []
+        if self._cleared:
+            ops.append(("clear",))
+            self._cleared = False
+        path = self.app.document_path
+        if path != self._base:
+            ops.append(("base", path))
+            self._base = path
+        if self._layers:
+            scene = self.app.scene
+            layers = tuple((layer.id, layer.name, layer.visible, layer.locked, layer.opacity) for layer in scene.layers())
+            ops.append(("layers", layers, scene.active_layer))
+            self._layers = False
+        for shape_ids in self._transformed.values():
+            self._dirty.update(dict.fromkeys(shape_ids))
+        self._transformed.clear()
+        scene = self.app.scene
+        deadline = time.perf_counter() + CAPTURE_SLICE
+        dirty = self._dirty
+        while dirty:
+            for _ in range(min(CAPTURE_BATCH, len(dirty))):
+                shape_id, _ = dirty.popitem()
+                record = scene.get(shape_id)
+                ops.append(put_op(record) if record is not None else ("del", shape_id))
+            if time.perf_counter() >= deadline:
+                break
+        self.journal.append(ops)
+        if dirty:
+            self._schedule(1)
+
+    def flush(self):
+        # Capture everything pending now and wait for it to reach the disk.
+        if self._after_id is not None:
+            self.app.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        while self._dirty or self._transformed or self._cleared or self._layers or self._base != self.app.document_path:
+            self.capture()
+            if self._after_id is not None:
+                self.app.canvas.after_cancel(self._after_id)
+                self._after_id = None
+        self.journal.flush()
+
+    def close(self, discard=False):
+        if self._after_id is not None:
+            self.app.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        self.app.scene.unsubscribe(self._on_scene_change)
+        self.journal.close(discard)
+
+
+def recover(app, state):
+    # Rebuilds the journaled document into a freshly started app: the base
+    # file, then the layers and the shapes changed since.
+    if state.base is not None and os.path.exists(state.base):
+        from document import open_document
+        open_document(app, state.base)
+        if app.document_loader is not None:
+            app.document_loader.finish()
+    scene = app.scene
+    if state.layers is not None:
+        _, layers, active = state.layers
+        scene.set_layers([Layer(*layer) for layer in layers], active)
+    for shape_id in sorted(state.deleted):
+        scene.remove(shape_id)
+    for shape_id in sorted(state.records):
+        scene.remove(shape_id)
+        scene.restore(op_record(state.records[shape_id]))
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+def open_journal(directory):
+    # The newest journal no running instance holds, else a new one, locked
+    # for this process.
+    os.makedirs(directory, exist_ok=True)
+    paths = glob.glob(os.path.join(glob.escape(directory), "autosave*.journal"))
+    for path in sorted(paths, key=_mtime, reverse=True):
+        journal = Journal(path)
+        if journal.lock():
+            return journal
+    while True:
+        handle, path = tempfile.mkstemp(prefix="autosave-", suffix=".journal", dir=directory)
+        os.close(handle)
+        journal = Journal(path)
+        # Another instance starting up may adopt the empty file first.
+        if journal.lock():
+            return journal
+
+def enable_autosave(app, directory=AUTOSAVE_DIR):
+    # Replays whatever a crashed session left behind, then journals this
+    # one on top of it. Returns the Autosave and whether anything was
+    # recovered.
+    journal = open_journal(directory)
+    state = journal.read()
+    recovered = bool(state)
+    if recovered:
+        recover(app, state)
+    journal.start()
+    return Autosave(app, journal), recovered
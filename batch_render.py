@@ -0,0 +1,122 @@
+# File: batch_render.py
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from document import EXTENSION, load_scene
+from export import EXPORTERS, export_size, export_snapshot
+
+
+def find_documents(source):
+    if os.path.isfile(source):
+        return [source]
+    return sorted(
+        os.path.join(source, name) for name in os.listdir(source)
+        if name.endswith(EXTENSION) and os.path.isfile(os.path.join(source, name))
+    )
+
+def output_path(path, out_dir, kind):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_dir, f"{stem}.{kind}")
+
+
+def render_file(path, out_path, kind="png", scale=1.0, max_size=None):
+    # Runs in a worker process; returns (seconds, size) for the report.
+    started = time.perf_counter()
+    scene, raster = load_scene(path)
+    snapshot = export_snapshot(scene, raster)
+    options = {}
+    if kind == "png":
+        if max_size:
+            width, height = export_size(snapshot)
+            scale = min(scale, max_size / max(width, height))
+        # One file per worker already keeps every core busy.
+        options = {"scale": scale, "workers": 1}
+    EXPORTERS[kind](snapshot, out_path, **options)
+    size = export_size(snapshot, options.get("scale", 1.0))
+    return time.perf_counter() - started, size
+
+
+def render_batch(paths, out_dir, kind="png", scale=1.0, max_size=None, workers=None, skip_existing=False, report=print):
+    # Returns the number of files that failed.
+    jobs = []
+    for path in paths:
+        out_path = output_path(path, out_dir, kind)
+        if skip_existing and os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(path):
+            continue
+        jobs.append((path, out_path))
+    skipped = len(paths) - len(jobs)
+    if skipped:
+        report(f"skipping {skipped} up-to-date file(s)")
+    if not jobs:
+        return 0
+    os.makedirs(out_dir, exist_ok=True)
+
+    failures = 0
+    done = 0
+    started = time.perf_counter()
+    width = len(str(len(jobs)))
+
+    def finish(path, outcome):
+        nonlocal done, failures
+        done += 1
+        name = os.path.basename(path)
+        if isinstance(outcome, Exception):
+            failures += 1
+            report(f"[{done:>{width}}/{len(jobs)}] {name}  FAILED: {outcome}")
+        else:
+            seconds, (w, h) = outcome
+            report(f"[{done:>{width}}/{len(jobs)}] {name}  {w}x{h}  {seconds:.3f}s")
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        for path, out_path in jobs:
+            try:
+                outcome = render_file(path, out_path, kind, scale, max_size)
+            except Exception as error:
+                outcome = error
+            finish(path, outcome)
+    else:
+        with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+            futures = {
+                pool.submit(render_file, path, out_path, kind, scale, max_size): path for path, out_path in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as error:
+                    outcome = error
+                finish(futures[future], outcome)
+    elapsed = time.perf_counter() - started
+    report(f"rendered {len(jobs) - failures} of {len(jobs)} file(s) in {elapsed:.2f}s, {failures} failed")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="drawing_app render", description="Render saved drawings to PNG or SVG.")
+    parser.add_argument("source", help=f"a {EXTENSION} file or a directory of them")
+    parser.add_argument("out_dir", help="directory for the rendered files")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), default="png")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--max-size", type=int, help="fit PNGs within this many pixels, e.g. for thumbnails")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--skip-existing", action="store_true", help="skip outputs newer than their document")
+    args = parser.parse_args(argv)
+    try:
+        paths = find_documents(args.source)
+    except OSError as error:
+        parser.error(str(error))
+    if not paths:
+        parser.error(f"no {EXTENSION} files in {args.source}")
+    failures = render_batch(
+        paths, args.out_dir, args.format, args.scale, args.max_size, args.workers, args.skip_existing,
+        report=lambda line: print(line, flush=True),
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
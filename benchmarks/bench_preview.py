@@ -0,0 +1,76 @@
+# File: benchmarks/bench_preview.py
+
+# Preview updates per second for the legacy delete+create path versus the
+# reused preview item. Uses a real Tk canvas when a display is available,
+# otherwise the headless stand-in (which then measures Python-side cost
+# and canvas call/item churn only).
+#
+#   python -m benchmarks.bench_preview [--sides 64] [--updates 5000]
+
+import argparse
+import time
+import types
+
+from scene_model import Scene
+from scene_view import SceneView
+from shape_management import draw_shape_preview, get_shape
+from viewport import Viewport
+from benchmarks.headless_canvas import HeadlessCanvas
+
+
+def make_canvas():
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception:
+        return HeadlessCanvas(), None
+    canvas = tk.Canvas(root, width=800, height=600)
+    canvas.pack()
+    return canvas, root
+
+def make_app(canvas, sides):
+    return types.SimpleNamespace(
+        canvas=canvas, view=SceneView(canvas, Scene(), viewport=Viewport(800, 600)),
+        preview_shape=None, preview_key=None,
+        custom_mode=True, current_shape_sides=sides, reverse_direction=False,
+        shapes=["Circle", "Triangle", "Square"], shape_index=0, current_color="black",
+    )
+
+def legacy_preview(app, x1, y1, x2, y2):
+    if app.preview_shape:
+        app.canvas.delete(app.preview_shape)
+    shape = get_shape(app)
+    app.preview_shape = shape.draw(app.canvas, x1, y1, x2, y2, color=app.current_color, preview=True)
+
+def run(preview, canvas, sides, updates):
+    app = make_app(canvas, sides)
+    first_item = None
+    start = time.perf_counter()
+    for i in range(updates):
+        preview(app, 100, 100, 150 + i % 400, 150 + i % 300)
+        if first_item is None:
+            first_item = app.preview_shape
+    elapsed = time.perf_counter() - start
+    ids_used = app.preview_shape - first_item + 1 if isinstance(first_item, int) else None
+    canvas.delete(app.preview_shape)
+    return {"updates_per_sec": updates / elapsed, "item_ids_used": ids_used}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark shape preview updates")
+    parser.add_argument("--sides", type=int, default=64)
+    parser.add_argument("--updates", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    canvas, root = make_canvas()
+    backend = "tk" if root is not None else "headless"
+    before = run(legacy_preview, canvas, args.sides, args.updates)
+    after = run(draw_shape_preview, canvas, args.sides, args.updates)
+    print(f"backend={backend} sides={args.sides} updates={args.updates}")
+    print(f"before: {before['updates_per_sec']:10.0f} updates/s, {before['item_ids_used']} canvas ids")
+    print(f"after:  {after['updates_per_sec']:10.0f} updates/s, {after['item_ids_used']} canvas ids")
+    if root is not None:
+        root.destroy()
+
+
+if __name__ == "__main__":
+    main()
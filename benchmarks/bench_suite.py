@@ -0,0 +1,363 @@
+# File: benchmarks/bench_suite.py
+
+# Interaction hot paths on synthetic drawings of 1k, 10k and 100k shapes,
+# run headless against the stand-in canvas. Results are written as JSON
+# so runs from two commits can be compared:
+#
+#   python -m benchmarks.bench_suite --out before.json
+#   python -m benchmarks.bench_suite --out after.json --compare before.json
+#
+# Startup is timed as import cost and, given a display, launch to the
+# first drawn frame via --startup-profile.
+#
+# Times are wall-clock milliseconds (median and p95 over the samples).
+# `calls` is canvas calls per operation: on a real canvas each is a Tcl
+# round trip, so it tracks Tk cost independently of the stand-in's speed.
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from document import load_scene, save_document
+from geometry_utils import TransformCommand, translate_matrix
+from render_scheduler import RenderScheduler
+from scene_model import Scene
+from scene_view import SceneView
+from shape_management import draw_shape_preview
+from shape_selector import on_click, on_drag, on_hover, on_release
+from undo_utils import UndoStack, redo, undo
+from viewport import Viewport
+
+SIZES = (1000, 10000, 100000)
+SAMPLES = 50
+SEED = 1234
+# Shapes per 100x100 px; the drawing grows with the shape count so hit
+# tests see the same density at every size.
+DENSITY = 6
+# A median this many times the baseline's counts as a regression.
+THRESHOLD = 1.25
+COLORS = ("black", "red", "blue", "green", "orange", "purple")
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def drawing_side(count):
+    return 100 * math.sqrt(count / DENSITY)
+
+def build_scene(scene, count, seed=SEED):
+    # Half freehand strokes, the rest rectangles, ovals and polygons.
+    rng = random.Random(seed)
+    side = drawing_side(count)
+    for _ in range(count):
+        x, y = rng.uniform(0, side), rng.uniform(0, side)
+        color = rng.choice(COLORS)
+        roll = rng.random()
+        if roll < 0.5:
+            points = [x, y]
+            for _ in range(rng.randint(8, 40)):
+                x += rng.uniform(-6, 6)
+                y += rng.uniform(-6, 6)
+                points.extend((x, y))
+            scene.add("line", points, fill=color, width=rng.choice((1, 2, 4)))
+        elif roll < 0.7:
+            scene.add("rectangle", [x, y, x + rng.uniform(5, 60), y + rng.uniform(5, 60)], fill=color)
+        elif roll < 0.85:
+            scene.add("oval", [x, y, x + rng.uniform(5, 60), y + rng.uniform(5, 60)], outline=color)
+        else:
+            sides = rng.randint(3, 8)
+            radius = rng.uniform(5, 30)
+            points = []
+            for i in range(sides):
+                angle = 2 * math.pi * i / sides
+                points.extend((x + radius * math.cos(angle), y + radius * math.sin(angle)))
+            scene.add("polygon", points, fill=color)
+    return scene
+
+def make_app(count, seed=SEED):
+    canvas = HeadlessCanvas(width=1200, height=900)
+    scene = Scene()
+    scheduler = RenderScheduler(canvas)
+    app = types.SimpleNamespace(
+        canvas=canvas, scene=scene, scheduler=scheduler, view=SceneView(canvas, scene, scheduler, Viewport(1200, 900)),
+        undo_stack=UndoStack(), preview_shape=None, preview_key=None, custom_mode=False,
+        current_shape_sides=0, reverse_direction=False, shapes=["Circle", "Triangle", "Square"],
+        shape_index=0, current_color="black",
+    )
+    canvas.scheduler = scheduler
+    canvas.undo_stack = app.undo_stack
+    canvas.selected_item = None
+    canvas.hovered_handle = None
+    build_scene(scene, count, seed)
+    scheduler.flush_now()
+    return app
+
+def event(app, x, y, state=0):
+    return types.SimpleNamespace(widget=app.canvas, x=x, y=y, state=state)
+
+def summarize(times, calls):
+    times = sorted(times)
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        "calls": calls / len(times),
+    }
+
+def measure(app, operation, samples):
+    times = []
+    calls = app.canvas.calls
+    for i in range(samples):
+        start = time.perf_counter()
+        operation(i)
+        times.append(time.perf_counter() - start)
+    return summarize(times, app.canvas.calls - calls)
+
+def shape_centers(app, rng, samples):
+    ids = rng.sample(sorted(record.id for record in app.scene), min(samples, len(app.scene)))
+    centers = []
+    for shape_id in ids:
+        x1, y1, x2, y2 = app.scene.get(shape_id).bbox()
+        centers.append(((x1 + x2) / 2, (y1 + y2) / 2))
+    return centers
+
+
+def bench_click(app, rng, samples):
+    # Alternating hits near shapes and clicks on open canvas, each followed
+    # by the frame that paints the new selection.
+    side = drawing_side(len(app.scene))
+    centers = shape_centers(app, rng, samples)
+    points = [centers[i] if i % 2 == 0 else (rng.uniform(0, side), rng.uniform(0, side)) for i in range(samples)]
+
+    def click(i):
+        on_click(event(app, *points[i]))
+        app.scheduler.flush_now()
+        on_release(event(app, *points[i]))
+    return measure(app, click, samples)
+
+def bench_drag(app, rng, samples):
+    x, y = shape_centers(app, rng, 1)[0]
+    on_click(event(app, x, y))
+    app.scheduler.flush_now()
+    app.canvas.selected_item = app.canvas.selected_item or app.scene.get(app.scene.topmost_at(x, y, 50)).group
+
+    def frame(i):
+        on_drag(event(app, x + i % 40, y + i % 30))
+        app.scheduler.flush_now()
+    result = measure(app, frame, samples)
+    on_release(event(app, x, y))
+    return result
+
+def bench_preview(app, rng, samples):
+    def update(i):
+        draw_shape_preview(app, 100, 100, 150 + i % 400, 150 + i % 300)
+    result = measure(app, update, samples)
+    result["updates_per_sec"] = 1000 / result["median_ms"] if result["median_ms"] else None
+    return result
+
+def bench_undo(app, rng, samples):
+    groups = rng.sample(app.scene.groups(), min(samples, len(app.scene)))
+    for group in groups:
+        command = TransformCommand([group], translate_matrix(rng.uniform(-20, 20), rng.uniform(-20, 20)))
+        command.redo(app)
+        app.undo_stack.push(command)
+    app.scheduler.flush_now()
+
+    def step(i):
+        undo(app)
+        app.scheduler.flush_now()
+    result = measure(app, step, len(groups))
+    result["ops_per_sec"] = 1000 / result["median_ms"] if result["median_ms"] else None
+    while app.undo_stack.can_redo():
+        redo(app)
+    app.scheduler.flush_now()
+    return result
+
+def bench_hover(app, rng, samples):
+    # A selected shape so its handles are live, then pointer motion both
+    # over its corners and across the rest of the drawing.
+    x, y = shape_centers(app, rng, 1)[0]
+    on_click(event(app, x, y))
+    on_release(event(app, x, y))
+    app.scheduler.flush_now()
+    bbox = app.view.selection_bbox() or (x, y, x, y)
+    side = drawing_side(len(app.scene))
+    points = [
+        (bbox[i % 2 * 2], bbox[1 + i // 2 % 2 * 2]) if i % 2 == 0 else (rng.uniform(0, side), rng.uniform(0, side))
+        for i in range(samples)
+    ]
+    return measure(app, lambda i: on_hover(event(app, *points[i])), samples)
+
+def bench_pan(app, rng, samples):
+    # A drag-pan sweeping 50 px a frame; the occasional re-cull costs what
+    # lies in view, not the drawing's size.
+    view = app.view
+    zoom, x0, y0 = view.viewport.state()
+
+    def frame(i):
+        view.set_view(zoom, x0 + i * 40 / zoom, y0 + i * 30 / zoom)
+        app.scheduler.flush_now()
+    result = measure(app, frame, samples)
+    view.set_view(zoom, x0, y0)
+    app.scheduler.flush_now()
+    return result
+
+def bench_open(app):
+    # Reading the saved drawing back and giving every shape a canvas item.
+    handle, path = tempfile.mkstemp(suffix=".mare")
+    os.close(handle)
+    try:
+        save_document(app.scene, path)
+        canvas = HeadlessCanvas()
+        start = time.perf_counter()
+        loaded, _ = load_scene(path)
+        scene = Scene()
+        SceneView(canvas, scene)
+        scene.set_layers(loaded.layers(), loaded.active_layer)
+        for record in sorted(loaded, key=lambda record: record.id):
+            scene.restore(record)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+    return {"median_ms": elapsed * 1000, "p95_ms": elapsed * 1000, "calls": canvas.calls, "file_bytes": size}
+
+def bench_import(samples=3):
+    # Interpreter start plus importing the app, less a bare interpreter.
+    def best(code):
+        times = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=REPO, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return {"median_ms": (best("import drawing_app") - best("pass")) * 1000}
+
+def bench_first_paint(samples=3):
+    # Launch to the first drawn frame (Tk root, DrawingApp, first paint) as
+    # --startup-profile reports it; None without a display.
+    totals = []
+    phases = None
+    handle, path = tempfile.mkstemp(suffix=".json")
+    os.close(handle)
+    try:
+        for _ in range(samples):
+            out = subprocess.run(
+                [sys.executable, "drawing_app.py", f"--startup-profile={path}", "--exit-after-startup", "--no-autosave"],
+                cwd=REPO, capture_output=True,
+            )
+            if out.returncode != 0:
+                return None
+            with open(path) as f:
+                report = json.load(f)
+            totals.append(report["total_ms"])
+            phases = report["phases"]
+    finally:
+        os.remove(path)
+    return {"median_ms": statistics.median(totals), "p95_ms": max(totals), "phases": phases}
+
+BENCHES = {
+    "click": bench_click,
+    "drag": bench_drag,
+    "preview": bench_preview,
+    "undo": bench_undo,
+    "hover": bench_hover,
+    "pan": bench_pan,
+}
+
+
+def run_size(count, samples, report=print):
+    start = time.perf_counter()
+    app = make_app(count)
+    results = {"build_s": time.perf_counter() - start}
+    rng = random.Random(SEED + count)
+    for name, bench in BENCHES.items():
+        results[name] = bench(app, rng, samples)
+        report(f"  {name:<8} {results[name]['median_ms']:9.3f} ms median  {results[name]['calls']:8.1f} calls")
+    results["open"] = bench_open(app)
+    report(f"  {'open':<8} {results['open']['median_ms']:9.3f} ms")
+    return results
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+def run_suite(sizes=SIZES, samples=SAMPLES, startup=True, report=print):
+    results = {
+        "meta": {
+            "commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+            "backend": "headless", "samples": samples, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "sizes": {},
+    }
+    if startup:
+        results["startup"] = bench_import()
+        report(f"startup  {results['startup']['median_ms']:9.1f} ms import")
+        results["first_paint"] = bench_first_paint()
+        if results["first_paint"] is None:
+            report("startup  first paint skipped (no display)")
+        else:
+            report(f"startup  {results['first_paint']['median_ms']:9.1f} ms to first paint")
+    for count in sizes:
+        report(f"{count} shapes")
+        results["sizes"][str(count)] = run_size(count, samples, report)
+    return results
+
+def compare(current, baseline, threshold=THRESHOLD, report=print):
+    # Returns the number of regressions.
+    regressions = 0
+    rows = [
+        ("startup", "import", baseline.get("startup"), current.get("startup")),
+        ("startup", "paint", baseline.get("first_paint"), current.get("first_paint")),
+    ]
+    for size, metrics in current["sizes"].items():
+        for name, now in metrics.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if isinstance(now, dict):
+                rows.append((size, name, before, now))
+    for size, name, before, now in rows:
+        if not before or not now or not before.get("median_ms"):
+            continue
+        ratio = now["median_ms"] / before["median_ms"]
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        report(f"{size:>8} {name:<8} {before['median_ms']:9.3f} -> {now['median_ms']:9.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark interaction hot paths on synthetic drawings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--no-startup", action="store_true", help="skip the import and first-paint measurements")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.samples, not args.no_startup)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"against {baseline['meta'].get('commit')}:")
+        return 1 if compare(results, baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+# File: benchmarks/headless_canvas.py
+
+# A stand-in for tk.Canvas covering the calls the app makes. Every method
+# that would be a Tcl round-trip on a real canvas bumps `calls`, so
+# benchmarks can report Tcl traffic without a display.
+
+import itertools
+
+
+class HeadlessCanvas:
+    def __init__(self, width=800, height=600):
+        self.width = width
+        self.height = height
+        self.calls = 0
+        self._items = {}
+        # Tag -> items carrying it (insertion-ordered), so tag lookups cost
+        # what they would in Tk's C loop rather than a Python scan.
+        self._tagged = {}
+        self._ids = itertools.count(1)
+        self._after = {}
+        self._after_ids = itertools.count(1)
+        self.options = {}
+
+    def _find(self, tag_or_id, ordered=False):
+        # Items for an id or tag; in stacking order only when `ordered`.
+        if isinstance(tag_or_id, int):
+            return [tag_or_id] if tag_or_id in self._items else []
+        if tag_or_id == "all":
+            return list(self._items)
+        tagged = self._tagged.get(tag_or_id, {})
+        if ordered:
+            return [item for item in self._items if item in tagged]
+        return list(tagged)
+
+    def _create(self, kind, args, options):
+        self.calls += 1
+        if len(args) == 1 and isinstance(args[0], (list, tuple)):
+            args = args[0]
+        tags = options.pop("tags", ())
+        if isinstance(tags, str):
+            tags = (tags,)
+        item = next(self._ids)
+        self._items[item] = {"type": kind, "coords": [float(v) for v in args], "tags": list(tags), "options": options}
+        for tag in tags:
+            self._tagged.setdefault(tag, {})[item] = None
+        return item
+
+    def create_oval(self, *args, **options):
+        return self._create("oval", args, options)
+
+    def create_rectangle(self, *args, **options):
+        return self._create("rectangle", args, options)
+
+    def create_polygon(self, *args, **options):
+        return self._create("polygon", args, options)
+
+    def create_line(self, *args, **options):
+        return self._create("line", args, options)
+
+    def create_image(self, *args, **options):
+        return self._create("image", args, options)
+
+    def create_text(self, *args, **options):
+        return self._create("text", args, options)
+
+    def coords(self, tag_or_id, *args):
+        self.calls += 1
+        items = self._find(tag_or_id)
+        if not items:
+            return []
+        if len(args) == 1 and isinstance(args[0], (list, tuple)):
+            args = args[0]
+        if args:
+            self._items[items[0]]["coords"] = [float(v) for v in args]
+        return list(self._items[items[0]]["coords"])
+
+    def insert(self, tag_or_id, before, values):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            coords = self._items[item]["coords"]
+            index = len(coords) if before == "end" else int(before)
+            coords[index:index] = [float(v) for v in values]
+
+    def itemconfig(self, tag_or_id, **options):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            self._items[item]["options"].update(options)
+
+    itemconfigure = itemconfig
+
+    def itemcget(self, tag_or_id, option):
+        self.calls += 1
+        items = self._find(tag_or_id)
+        return self._items[items[0]]["options"].get(option, "") if items else ""
+
+    def move(self, tag_or_id, dx, dy):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            coords = self._items[item]["coords"]
+            for i in range(0, len(coords), 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+
+    def scale(self, tag_or_id, x0, y0, sx, sy):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            coords = self._items[item]["coords"]
+            for i in range(0, len(coords), 2):
+                coords[i] = x0 + (coords[i] - x0) * sx
+                coords[i + 1] = y0 + (coords[i + 1] - y0) * sy
+
+    def delete(self, *tags_or_ids):
+        self.calls += 1
+        for tag_or_id in tags_or_ids:
+            for item in self._find(tag_or_id):
+                for tag in self._items.pop(item)["tags"]:
+                    self._tagged[tag].pop(item, None)
+
+    def type(self, tag_or_id):
+        self.calls += 1
+        items = self._find(tag_or_id)
+        return self._items[items[0]]["type"] if items else None
+
+    def gettags(self, tag_or_id):
+        self.calls += 1
+        items = self._find(tag_or_id)
+        return tuple(self._items[items[0]]["tags"]) if items else ()
+
+    def addtag_withtag(self, new_tag, tag_or_id):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            if new_tag not in self._items[item]["tags"]:
+                self._items[item]["tags"].append(new_tag)
+                self._tagged.setdefault(new_tag, {})[item] = None
+
+    def dtag(self, tag_or_id, tag=None):
+        self.calls += 1
+        for item in self._find(tag_or_id):
+            tags = self._items[item]["tags"]
+            if tag in tags:
+                tags.remove(tag)
+                self._tagged[tag].pop(item, None)
+
+    def find_all(self):
+        self.calls += 1
+        return tuple(self._items)
+
+    def find_withtag(self, tag_or_id):
+        self.calls += 1
+        return tuple(self._find(tag_or_id, ordered=True))
+
+    def find_overlapping(self, x1, y1, x2, y2):
+        self.calls += 1
+        found = []
+        for item, data in self._items.items():
+            coords = data["coords"]
+            if len(coords) < 2 or data["options"].get("state") == "hidden":
+                continue
+            xs = coords[::2]
+            ys = coords[1::2]
+            if min(xs) <= x2 and max(xs) >= x1 and min(ys) <= y2 and max(ys) >= y1:
+                found.append(item)
+        return tuple(found)
+
+    def tag_raise(self, tag_or_id, above=None):
+        self.calls += 1
+        self._restack(self._find(tag_or_id, ordered=True), above, after=True)
+
+    def tag_lower(self, tag_or_id, below=None):
+        self.calls += 1
+        self._restack(self._find(tag_or_id, ordered=True), below, after=False)
+
+    def _restack(self, moved, anchor, after):
+        # Without an anchor, items go to the top (raise) or bottom (lower);
+        # with one, directly above its topmost or below its lowest item.
+        rest = [item for item in self._items if item not in moved]
+        anchors = [item for item in self._find(anchor, ordered=True) if item not in moved] if anchor is not None else []
+        if anchor is None:
+            position = len(rest) if after else 0
+        elif not anchors:
+            return
+        elif after:
+            position = rest.index(anchors[-1]) + 1
+        else:
+            position = rest.index(anchors[0])
+        order = rest[:position] + moved + rest[position:]
+        self._items = {item: self._items[item] for item in order}
+
+    def bind(self, sequence=None, func=None, add=None):
+        pass
+
+    def unbind(self, sequence, funcid=None):
+        pass
+
+    def config(self, **options):
+        self.calls += 1
+        self.options.update(options)
+
+    configure = config
+
+    def cget(self, option):
+        if option in ("width", "height"):
+            return getattr(self, option)
+        return self.options.get(option, "")
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def update_idletasks(self):
+        self.run_pending()
+
+    def after(self, ms, func=None, *args):
+        after_id = f"after#{next(self._after_ids)}"
+        self._after[after_id] = (func, args)
+        return after_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self._after.pop(after_id, None)
+
+    def run_pending(self):
+        while self._after:
+            pending, self._after = self._after, {}
+            for func, args in pending.values():
+                func(*args)
+
+    def item_count(self):
+        return len(self._items)
@@ -0,0 +1,189 @@
+# File: clipboard.py
+
+import re
+import tkinter as tk
+from array import array
+
+from scene_model import ShapeRecord
+from selection_helpers import delete_selected_item, select_groups, selected_groups
+from undo_utils import AddCommand
+
+PASTE_OFFSET = 20
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+class Clipboard:
+    # Detached copies of cut or copied records. They share coords with the
+    # originals, so a copy costs nothing per point. `svg` is the text put
+    # on the system clipboard, to tell our own copy from someone else's.
+    def __init__(self, records, svg=None, pastes=0):
+        self.records = records
+        self.svg = svg
+        self.pastes = pastes
+
+
+def _detach(record):
+    return ShapeRecord(
+        record.id, record.kind, record.coords, record.fill, record.outline, record.width, record.dash,
+        record.group, record.data, record.layer, record.matrix,
+    )
+
+def _selected_records(app):
+    records = [
+        app.scene.get(shape_id)
+        for group in selected_groups(app) for shape_id in app.scene.group_members(group)
+    ]
+    return sorted(records, key=lambda record: record.id)
+
+
+def records_svg(records):
+    boxes = [record.bbox() for record in records]
+    x1 = min(box[0] for box in boxes)
+    y1 = min(box[1] for box in boxes)
+    x2 = max(box[2] for box in boxes)
+    y2 = max(box[3] for box in boxes)
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{x2 - x1:g}" height="{y2 - y1:g}" '
+        f'viewBox="{x1:g} {y1:g} {x2 - x1:g} {y2 - y1:g}">'
+    ]
+    # Export (and NumPy with it) is only loaded once something is copied.
+    from export import svg_element
+
+    for record in records:
+        kind, coords = record.drawn()
+        element = svg_element(kind, coords, record.fill, record.outline, record.width, record.data)
+        if element:
+            lines.append(element)
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
+
+
+def _svg_style(element):
+    style = dict(element.attrib)
+    for declaration in element.get("style", "").split(";"):
+        name, _, value = declaration.partition(":")
+        if value:
+            style[name.strip()] = value.strip()
+    return style
+
+def _svg_number(style, name, default=0.0):
+    match = _NUMBER.match(style.get(name, "").strip())
+    return float(match.group()) if match else default
+
+def _svg_paint(value, default):
+    if value is None:
+        return default
+    return "" if value in ("none", "transparent") else value
+
+def parse_svg(text):
+    # Plain rect, circle, ellipse, line, polyline and polygon elements, each
+    # its own group. Paths, transforms and images are skipped.
+    import xml.etree.ElementTree as ET
+
+    records = []
+    for element in ET.fromstring(text).iter():
+        tag = element.tag.rsplit("}", 1)[-1]
+        style = _svg_style(element)
+        fill = _svg_paint(style.get("fill"), "black")
+        stroke = _svg_paint(style.get("stroke"), "")
+        width = _svg_number(style, "stroke-width", 1.0)
+        if tag == "rect":
+            x, y = _svg_number(style, "x"), _svg_number(style, "y")
+            kind, coords = "rectangle", [x, y, x + _svg_number(style, "width"), y + _svg_number(style, "height")]
+        elif tag in ("circle", "ellipse"):
+            cx, cy = _svg_number(style, "cx"), _svg_number(style, "cy")
+            rx = _svg_number(style, "r" if tag == "circle" else "rx")
+            ry = _svg_number(style, "r" if tag == "circle" else "ry")
+            kind, coords = "oval", [cx - rx, cy - ry, cx + rx, cy + ry]
+        elif tag in ("line", "polyline"):
+            if tag == "line":
+                coords = [_svg_number(style, name) for name in ("x1", "y1", "x2", "y2")]
+            else:
+                coords = [float(value) for value in _NUMBER.findall(style.get("points", ""))]
+            # Lines draw in their fill colour.
+            kind, fill, stroke = "line", stroke or "black", ""
+        elif tag == "polygon":
+            kind, coords = "polygon", [float(value) for value in _NUMBER.findall(style.get("points", ""))]
+        else:
+            continue
+        if len(coords) < 4 or len(coords) % 2:
+            continue
+        shape_id = len(records) + 1
+        records.append(ShapeRecord(
+            shape_id, kind, array('d', coords), fill, stroke, width, group=f"svg_{shape_id}",
+        ))
+    return records
+
+
+def _system_text(app):
+    try:
+        return app.root.clipboard_get()
+    except tk.TclError:
+        return None
+
+def _set_system_text(app, text):
+    try:
+        app.root.clipboard_clear()
+        app.root.clipboard_append(text)
+    except tk.TclError:
+        pass
+
+def copy_selection(app, event=None):
+    records = _selected_records(app)
+    if not records:
+        return None
+    clipboard = app.clipboard = Clipboard([_detach(record) for record in records])
+    clipboard.svg = records_svg(records)
+    _set_system_text(app, clipboard.svg)
+    return clipboard
+
+def cut_selection(app, event=None):
+    clipboard = copy_selection(app)
+    if clipboard is not None:
+        delete_selected_item(app)
+    return clipboard
+
+def _current_clipboard(app):
+    # SVG another program put on the system clipboard wins over ours.
+    text = _system_text(app)
+    clipboard = app.clipboard
+    if text and "<svg" in text and (clipboard is None or text != clipboard.svg):
+        import xml.etree.ElementTree as ET
+
+        try:
+            records = parse_svg(text)
+        except ET.ParseError:
+            records = []
+        if records:
+            # Someone else's drawing lands where it was, then steps on.
+            clipboard = app.clipboard = Clipboard(records, text, pastes=-1)
+    return clipboard
+
+def paste(app, event=None):
+    clipboard = _current_clipboard(app)
+    if clipboard is None or not app.scene.is_editable():
+        return []
+    clipboard.pastes += 1
+    offset = PASTE_OFFSET * clipboard.pastes
+    return paste_records(app, clipboard.records, offset, offset)
+
+def duplicate_selection(app, event=None):
+    records = _selected_records(app)
+    if not records or not app.scene.is_editable():
+        return []
+    return paste_records(app, records, PASTE_OFFSET, PASTE_OFFSET)
+
+def paste_records(app, records, dx, dy):
+    # Every source group becomes a new group on the active layer.
+    groups = {}
+    added = []
+    for record in records:
+        shape_id = app.scene.add_copy(record, dx, dy, group=groups.get(record.group))
+        pasted = app.scene.get(shape_id)
+        groups.setdefault(record.group, pasted.group)
+        added.append(pasted)
+    for group in groups.values():
+        app.view.create_decorations(group)
+    app.undo_stack.push(AddCommand(added))
+    select_groups(app, groups.values())
+    return added
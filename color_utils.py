@@ -1,6 +1,5 @@
 
 import tkinter as tk
-from tkinter import colorchooser
 
 def rgb_to_hex(r, g, b):
     if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
@@ -19,6 +18,7 @@ def set_color_from_rgb(app):
         print("Invalid RGB values")
 
 def pick_color(app):
+    from tkinter import colorchooser
     color_tuple = colorchooser.askcolor(title="Choose color")
     if color_tuple and color_tuple[0] and color_tuple[1]:
         r, g, b = map(int, color_tuple[0])
@@ -0,0 +1,415 @@
+# File: document.py
+
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+from raster import Bitmap
+from raster_layer import enable_raster_layer
+from scene_model import Layer, Scene, ShapeRecord
+
+# Layout: header, then 8-byte aligned sections. Records are a columnar
+# table of fixed-size rows; coordinates are one float32 array and styles,
+# group and layer names are interned, so a reader can mmap the file and
+# materialize only the rows it needs.
+MAGIC = b"MAREDOC\x00"
+VERSION = 3
+EXTENSION = ".mare"
+KINDS = ("line", "rectangle", "oval", "polygon", "image")
+SECTIONS = ("strings", "styles", "layers", "records", "coords", "blobs", "raster", "transforms")
+# Version 1 files predate the transforms section; before version 3 the
+# raster always started at the document origin.
+SECTION_COUNTS = {1: 7, 2: len(SECTIONS), 3: len(SECTIONS)}
+HEADERS = {version: struct.Struct("<8sHHiI" + "QQ" * count) for version, count in SECTION_COUNTS.items()}
+HEADER = HEADERS[VERSION]
+LOAD_BATCH = 256
+LOAD_SLICE = 0.012
+LOAD_DELAY_MS = 1
+
+STYLE_DTYPE = np.dtype([("fill", "<u4"), ("outline", "<u4"), ("width", "<f4"), ("dash", "<u4")])
+LAYER_DTYPE = np.dtype([("id", "<u4"), ("name", "<u4"), ("visible", "u1"), ("locked", "u1"), ("opacity", "<f4")])
+RECORD_DTYPE = np.dtype([
+    ("id", "<u4"), ("kind", "u1"), ("style", "<u4"), ("group", "<u4"), ("layer", "<u4"),
+    ("coord_start", "<u8"), ("coord_count", "<u4"), ("bbox", "<f4", (4,)),
+    ("blob_start", "<u8"), ("blob_width", "<u4"), ("blob_height", "<u4"),
+])
+# Matrices of rotated rectangles and ovals and of pasted copies, keyed by
+# record row.
+TRANSFORM_DTYPE = np.dtype([("row", "<u4"), ("matrix", "<f8", (6,))])
+
+
+class DocumentError(Exception):
+    pass
+
+
+class _Interner:
+    def __init__(self):
+        # Index 0 is the empty string; a group of 0 means the default
+        # "group_<id>" name, which is not worth storing.
+        self.strings = [""]
+        self._index = {"": 0}
+
+    def __call__(self, value):
+        value = value or ""
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def pack(self):
+        encoded = [value.encode("utf-8") for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return struct.pack("<I", len(encoded)) + offsets.tobytes() + b"".join(encoded)
+
+
+def _dash_string(dash):
+    return " ".join(str(int(value)) for value in dash) if dash else ""
+
+def save_document(scene, path, raster_layer=None):
+    strings = _Interner()
+    styles = {}
+    records = sorted(scene, key=lambda record: record.id)
+    table = np.zeros(len(records), dtype=RECORD_DTYPE)
+    chunks = []
+    blobs = []
+    transforms = []
+    # Pasted copies share their source's coords; store them once.
+    coord_spans = {}
+    coord_start = blob_start = 0
+    for row, record in enumerate(records):
+        style = (strings(record.fill), strings(record.outline), float(record.width), strings(_dash_string(record.dash)))
+        style_index = styles.setdefault(style, len(styles))
+        group = 0 if record.group == f"group_{record.id}" else strings(record.group)
+        count = len(record.coords)
+        start = coord_spans.get(id(record.coords))
+        if start is None:
+            start = coord_spans[id(record.coords)] = coord_start
+            chunks.append(np.frombuffer(record.coords, dtype=np.float64))
+            coord_start += count
+        table[row] = (
+            record.id, KINDS.index(record.kind), style_index, group, record.layer,
+            start, count, record.bbox(), blob_start,
+            record.data.width if record.data is not None else 0,
+            record.data.height if record.data is not None else 0,
+        )
+        if record.data is not None:
+            blobs.append(record.data.bits)
+            blob_start += len(record.data.bits)
+        if record.matrix is not None:
+            transforms.append((row, record.matrix))
+
+    style_table = np.array(list(styles), dtype=STYLE_DTYPE) if styles else np.zeros(0, STYLE_DTYPE)
+    layers = scene.layers()
+    layer_table = np.array(
+        [(layer.id, strings(layer.name), layer.visible, layer.locked, layer.opacity) for layer in layers],
+        dtype=LAYER_DTYPE,
+    )
+    coords = np.concatenate(chunks).astype("<f4") if chunks else np.zeros(0, "<f4")
+    raster = b""
+    if raster_layer is not None and raster_layer.pixels[..., 3].any():
+        height, width = raster_layer.pixels.shape[:2]
+        raster = struct.pack("<iiII", *raster_layer.origin, width, height) + zlib.compress(raster_layer.pixels.tobytes(), 6)
+
+    sections = {
+        "strings": strings.pack(), "styles": style_table.tobytes(), "layers": layer_table.tobytes(),
+        "records": table.tobytes(), "coords": coords.tobytes(), "blobs": b"".join(blobs), "raster": raster,
+        "transforms": np.array(transforms, dtype=TRANSFORM_DTYPE).tobytes(),
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        spans = []
+        for name in SECTIONS:
+            f.write(b"\0" * (-f.tell() % 8))
+            spans.extend([f.tell(), len(sections[name])])
+            f.write(sections[name])
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, scene.active_layer, len(records), *spans))
+    os.replace(temp_path, path)
+
+
+class Document:
+    # Read-only view of a saved drawing. The file is mapped, not read; the
+    # record table and coordinates are numpy views over the mapping and a
+    # ShapeRecord is only built when record() asks for it.
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise DocumentError(f"{path} is empty")
+        try:
+            self._read(path)
+        except (DocumentError, ValueError, IndexError, struct.error) as error:
+            self.close()
+            if isinstance(error, DocumentError):
+                raise
+            raise DocumentError(f"{path} is damaged ({error})") from error
+
+    def _read(self, path):
+        if len(self._map) < HEADERS[1].size or self._map[:len(MAGIC)] != MAGIC:
+            raise DocumentError(f"{path} is not a drawing document")
+        version, = struct.unpack_from("<H", self._map, len(MAGIC))
+        if version not in HEADERS:
+            raise DocumentError(f"unsupported document version {version}")
+        if len(self._map) < HEADERS[version].size:
+            raise DocumentError(f"{path} is truncated")
+        magic, version, flags, self.active_layer, count, *spans = HEADERS[version].unpack_from(self._map, 0)
+        self.version = version
+        self._spans = dict.fromkeys(SECTIONS, (0, 0))
+        self._spans.update(zip(SECTIONS, zip(spans[::2], spans[1::2])))
+        # A cut-off or corrupt file must fail here, not as a bad view later.
+        for name, (offset, length) in self._spans.items():
+            if offset + length > len(self._map):
+                raise DocumentError(f"{path} is truncated ({name} section)")
+        self.records = self._array("records", RECORD_DTYPE)
+        self.coords = self._array("coords", np.dtype("<f4"))
+        self.styles = self._array("styles", STYLE_DTYPE)
+        strings_offset, _ = self._spans["strings"]
+        string_count, = struct.unpack_from("<I", self._map, strings_offset)
+        self._string_offsets = np.frombuffer(self._map, "<u4", string_count + 1, strings_offset + 4)
+        self._strings_base = strings_offset + 4 + 4 * (string_count + 1)
+        if self._strings_base + int(self._string_offsets[-1]) > sum(self._spans["strings"]):
+            raise DocumentError(f"{path} has a damaged string table")
+        if self._out_of_bounds(string_count):
+            raise DocumentError(f"{path} has records pointing outside the file")
+        self._strings = {}
+        starts, counts = np.unique(self.records["coord_start"], return_counts=True)
+        self._shared_starts = set(starts[counts > 1].tolist())
+        self._shared_coords = {}
+        self._transforms = {
+            int(row): tuple(float(value) for value in matrix)
+            for row, matrix in self._array("transforms", TRANSFORM_DTYPE)
+        }
+
+    def _out_of_bounds(self, string_count):
+        # Every index the tables hold is checked here, so record() and
+        # layers() cannot fail halfway through a load.
+        records = self.records
+        string_columns = [self.styles["fill"], self.styles["outline"], self.styles["dash"]]
+        string_columns.append(self._array("layers", LAYER_DTYPE)["name"])
+        if len(records):
+            coord_ends = records["coord_start"] + records["coord_count"]
+            blob_ends = records["blob_start"] + (records["blob_width"].astype(np.uint64) * records["blob_height"] + 7) // 8
+            if (
+                coord_ends.max() > len(self.coords)
+                or blob_ends.max() > self._spans["blobs"][1]
+                or records["style"].max() >= len(self.styles)
+                or records["kind"].max() >= len(KINDS)
+            ):
+                return True
+            string_columns.append(records["group"])
+        return any(len(column) and column.max() >= string_count for column in string_columns)
+
+    def _array(self, name, dtype):
+        offset, length = self._spans[name]
+        return np.frombuffer(self._map, dtype, length // dtype.itemsize, offset)
+
+    def __len__(self):
+        return len(self.records)
+
+    def string(self, index):
+        value = self._strings.get(index)
+        if value is None:
+            start, end = self._string_offsets[index], self._string_offsets[index + 1]
+            value = self._strings[index] = self._map[self._strings_base + start:self._strings_base + end].decode("utf-8")
+        return value
+
+    def layers(self):
+        return [
+            Layer(int(row["id"]), self.string(row["name"]), bool(row["visible"]), bool(row["locked"]), float(row["opacity"]))
+            for row in self._array("layers", LAYER_DTYPE)
+        ]
+
+    def next_id(self):
+        return int(self.records["id"].max()) + 1 if len(self.records) else 1
+
+    def load_order(self, bbox=None):
+        # Row numbers with everything intersecting `bbox` first, so what is
+        # on screen appears before the rest of the file is touched.
+        rows = np.arange(len(self.records))
+        if bbox is None or not len(rows):
+            return rows
+        x1, y1, x2, y2 = bbox
+        boxes = self.records["bbox"]
+        visible = (boxes[:, 0] <= x2) & (boxes[:, 2] >= x1) & (boxes[:, 1] <= y2) & (boxes[:, 3] >= y1)
+        return np.concatenate([rows[visible], rows[~visible]])
+
+    def record(self, row):
+        matrix = self._transforms.get(int(row))
+        row = self.records[row]
+        shape_id = int(row["id"])
+        style = self.styles[row["style"]]
+        start = int(row["coord_start"])
+        coords = self._shared_coords.get(start)
+        if coords is None:
+            coords = array('d', self.coords[start:start + int(row["coord_count"])].astype(np.float64).tobytes())
+            if start in self._shared_starts:
+                self._shared_coords[start] = coords
+        dash = self.string(style["dash"])
+        data = None
+        if row["blob_width"]:
+            width, height = int(row["blob_width"]), int(row["blob_height"])
+            offset = self._spans["blobs"][0] + int(row["blob_start"])
+            data = Bitmap(width, height, bytes(self._map[offset:offset + (width * height + 7) // 8]))
+        return ShapeRecord(
+            shape_id, KINDS[row["kind"]], coords,
+            fill=self.string(style["fill"]), outline=self.string(style["outline"]),
+            width=_number(style["width"]), dash=tuple(int(v) for v in dash.split()) or None,
+            group=self.string(row["group"]) if row["group"] else f"group_{shape_id}",
+            data=data, layer=int(row["layer"]), matrix=matrix,
+        )
+
+    def raster(self):
+        # (origin, RGBA pixels) of the raster layer, or None.
+        offset, length = self._spans["raster"]
+        if not length:
+            return None
+        if self.version >= 3:
+            ox, oy, width, height = struct.unpack_from("<iiII", self._map, offset)
+            start = offset + 16
+        else:
+            ox = oy = 0
+            width, height = struct.unpack_from("<II", self._map, offset)
+            start = offset + 8
+        try:
+            pixels = zlib.decompress(self._map[start:offset + length])
+            return (ox, oy), np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4).copy()
+        except (zlib.error, ValueError) as error:
+            raise DocumentError(f"damaged raster layer ({error})") from error
+
+    def close(self):
+        # Views into the mapping must be gone before it can be closed.
+        self.records = self.coords = self.styles = self._string_offsets = None
+        self._shared_coords = {}
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+def load_scene(path):
+    # The whole document in a fresh Scene plus its raster layer as
+    # Document.raster() gives it, without Tk; for batch tools.
+    document = Document(path)
+    try:
+        scene = Scene()
+        scene.set_layers(document.layers(), document.active_layer)
+        scene.reserve_ids(document.next_id())
+        for row in range(len(document)):
+            scene.restore(document.record(row))
+        return scene, document.raster()
+    finally:
+        document.close()
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class DocumentLoader:
+    # Restores a Document into the app in batches, yielding to the Tk event
+    # loop once a step has used up `time_slice` seconds.
+    def __init__(self, app, document, bbox=None, batch=LOAD_BATCH, time_slice=LOAD_SLICE):
+        self.app = app
+        self.document = document
+        self.batch = batch
+        self.time_slice = time_slice
+        self.order = document.load_order(bbox)
+        self.loaded = 0
+        # True while this loader's own restores run, so listeners can tell
+        # them from edits.
+        self.restoring = False
+        self._after_id = None
+
+    @property
+    def done(self):
+        return self.loaded >= len(self.order)
+
+    def start(self):
+        self.app.scene.reserve_ids(self.document.next_id())
+        self.app.compositor.paused = True
+        self.step()
+
+    def step(self):
+        self._after_id = None
+        scene = self.app.scene
+        deadline = time.perf_counter() + self.time_slice
+        self.restoring = True
+        while not self.done:
+            end = min(self.loaded + self.batch, len(self.order))
+            for row in self.order[self.loaded:end]:
+                scene.restore(self.document.record(row))
+            self.loaded = end
+            if time.perf_counter() >= deadline:
+                break
+        self.restoring = False
+        if self.done:
+            self._finish()
+        else:
+            self._after_id = self.app.canvas.after(LOAD_DELAY_MS, self.step)
+
+    def finish(self):
+        # Load whatever is left right now, e.g. before saving.
+        self.cancel_pending()
+        while not self.done:
+            self.step()
+
+    def cancel(self):
+        self.cancel_pending()
+        self.order = self.order[:self.loaded]
+        self._finish()
+
+    def cancel_pending(self):
+        if self._after_id is not None:
+            self.app.canvas.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _finish(self):
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        self.app.compositor.resume()
+        if self.app.document_loader is self:
+            self.app.document_loader = None
+
+
+def visible_bbox(app):
+    if app.view.viewport is not None:
+        return app.view.viewport.visible_bbox()
+    canvas = app.canvas
+    return (0, 0, max(canvas.winfo_width(), 1), max(canvas.winfo_height(), 1))
+
+def open_document(app, path):
+    document = Document(path)
+    # Everything that can still fail is read before the current drawing
+    # is thrown away.
+    try:
+        layers = document.layers()
+        raster = document.raster()
+    except DocumentError:
+        document.close()
+        raise
+    app.clear_canvas()
+    app.scene.set_layers(layers, document.active_layer)
+    if raster is not None:
+        enable_raster_layer(app).load(*raster)
+    app.document_path = path
+    app.document_loader = DocumentLoader(app, document, visible_bbox(app))
+    app.document_loader.start()
+    return app.document_loader
+
+def save_to_path(app, path):
+    if app.document_loader is not None:
+        app.document_loader.finish()
+    save_document(app.scene, path, app.raster_layer)
+    app.document_path = path
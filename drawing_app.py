@@ -1,28 +1,83 @@
 # File: drawing_app.py
 
+import time
+# Taken before anything else is imported, for --startup-profile.
+STARTED = time.perf_counter()
+
+import sys
 import tkinter as tk
-from tkinter import colorchooser, messagebox
 from shape_selector import setup_shape_selection
-from shapes import Circle, Triangle, Square, PolygonShape
-from undo_utils import undo
+from shapes import load_shape_plugins, shape_names
+from undo_utils import UndoStack, undo, redo
 from geometry_utils import rotate_selected_shape, crop_selected_area
 from color_utils import set_color_from_rgb, pick_color, add_color_input
-from selection_helpers import update_bbox_and_handles
+from clipboard import copy_selection, cut_selection, duplicate_selection, paste
+from selection_helpers import delete_selected_item, recolor_selection, update_bbox_and_handles
 from shape_management import finalize_shape_creation, draw_shape_preview
+from strokes import StrokeBuilder, finalize_stroke
+from eraser import EraseSession, SegmentIndex, eraser_radius, finalize_erase
+from layers import (
+    LayerCompositor, add_layer, remove_active_layer, select_layer, shift_active_layer,
+    toggle_layer_visible, toggle_layer_locked, set_layer_opacity, layer_label
+)
 from modes import set_mode_pencil, set_mode_eraser, set_mode_fill, use_shape_mode, use_pencil, use_eraser, use_fill
+from scene_model import Scene
+from scene_view import SceneView
+from render_scheduler import RenderScheduler
+from jobs import JobPool
+from profiler import PerfHud, Profiler, StartupProfile, timed
+from viewport import (
+    ZOOM_STEP, Viewport, drag_pan, on_resize, on_wheel, reset_zoom, set_view, start_pan, zoom_by, zoom_to_fit
+)
+
 
+# Fill, raster, document, export and the dialogs (and NumPy behind them)
+# are imported where first used, so none of it is paid for at startup.
 
 
 class DrawingApp:
-    def __init__(self, root):
+    def __init__(self, root, raster_backend=False):
         self.root = root
         self.root.title("Mare Drawing App")
         self.menu_bar = tk.Menu(root)
         root.config(menu=self.menu_bar)
         file_menu = tk.Menu(self.menu_bar, tearoff=0)
-        file_menu.add_command(label="New", command=self.clear_canvas)
+        file_menu.add_command(label="New", command=self.new_document)
+        file_menu.add_command(label="Open...", accelerator="Ctrl+O", command=self.open_document)
+        file_menu.add_command(label="Save", accelerator="Ctrl+S", command=self.save_document)
+        file_menu.add_command(label="Save As...", command=self.save_document_as)
+        file_menu.add_separator()
+        file_menu.add_command(label="Export PNG...", command=lambda: self.export_document("png"))
+        file_menu.add_command(label="Export SVG...", command=lambda: self.export_document("svg"))
+        file_menu.add_separator()
         file_menu.add_command(label="Exit", command=root.quit)
         self.menu_bar.add_cascade(label="File", menu=file_menu)
+        edit_menu = tk.Menu(self.menu_bar, tearoff=0)
+        edit_menu.add_command(label="Undo", accelerator="Ctrl+Z", command=lambda: undo(self))
+        edit_menu.add_command(label="Redo", accelerator="Ctrl+Y", command=lambda: redo(self))
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Cut", accelerator="Ctrl+X", command=lambda: cut_selection(self))
+        edit_menu.add_command(label="Copy", accelerator="Ctrl+C", command=lambda: copy_selection(self))
+        edit_menu.add_command(label="Paste", accelerator="Ctrl+V", command=lambda: paste(self))
+        edit_menu.add_command(label="Duplicate", accelerator="Ctrl+D", command=lambda: duplicate_selection(self))
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Recolor Selection", command=lambda: recolor_selection(self, self.current_color))
+        edit_menu.add_command(label="Delete Selection", accelerator="Del", command=self.delete_selected_item)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="History Usage", command=self.show_history_usage)
+        self.menu_bar.add_cascade(label="Edit", menu=edit_menu)
+        view_menu = tk.Menu(self.menu_bar, tearoff=0)
+        view_menu.add_command(label="Zoom In", accelerator="Ctrl++", command=lambda: zoom_by(self, ZOOM_STEP))
+        view_menu.add_command(label="Zoom Out", accelerator="Ctrl+-", command=lambda: zoom_by(self, 1 / ZOOM_STEP))
+        view_menu.add_command(label="Actual Size", accelerator="Ctrl+0", command=lambda: reset_zoom(self))
+        view_menu.add_command(label="Zoom to Fit", command=lambda: zoom_to_fit(self))
+        view_menu.add_separator()
+        view_menu.add_command(label="Performance HUD", accelerator="F12", command=self.toggle_hud)
+        view_menu.add_command(label="Save Performance Report...", command=self.save_profile_report)
+        self.menu_bar.add_cascade(label="View", menu=view_menu)
+
+        load_shape_plugins()
+        self.shapes = shape_names()
 
         self.toolbar = tk.Frame(root, pady=2, relief=tk.RAISED, bd=1)
         self.toolbar.pack(side=tk.TOP, fill=tk.X)
@@ -34,20 +89,32 @@ class DrawingApp:
         self._build_style_section()
         self._build_size_section()
         self._build_color_section()
+        self._build_layers_section()
 
         self.canvas = tk.Canvas(root, bg="white", width=800, height=600)
+        self.scene = Scene()
+        self.scheduler = RenderScheduler(self.canvas)
+        self.canvas.scheduler = self.scheduler
+        self.view = SceneView(self.canvas, self.scene, self.scheduler, Viewport(800, 600))
+        self.segment_index = SegmentIndex(self.scene)
+        self.compositor = LayerCompositor(self.canvas, self.scene, self.view, self.scheduler)
+        self.profiler = Profiler(self.canvas, self.view.item_count)
+        self.hud = PerfHud(self.canvas, self.profiler)
+        self.scene.subscribe(self._on_layers_changed)
         setup_shape_selection(self.canvas, root, self.toolbar)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
         self.canvas.enable_selection_mode()
 
-        self.shapes = ["Circle", "Triangle", "Square"]
         self.shape_index = 0
         self.custom_mode = False
         self.current_shape_sides = 0
         self.reverse_direction = False
         self.preview_shape = None
+        self.preview_key = None
         self.selected_item = None
+        self.clipboard = None
+        self.pan_anchor = None
         self.start_x = self.start_y = None
         self.last_x = self.last_y = None
         self.current_color = "black"
@@ -55,9 +122,20 @@ class DrawingApp:
         self.fill_mode = False
         self.shape_mode = True
         self.is_dragging = False
-        self.undo_stack = []
-        self.current_line_points = []
-        self.current_line_item = None
+        self.undo_stack = UndoStack()
+        self.canvas.undo_stack = self.undo_stack
+        self.current_stroke = None
+        self.current_erase = None
+        self.jobs = JobPool(self.canvas)
+        self.fill_job = None
+        self.fill_tolerance = None  # None: flood_fill.FILL_TOLERANCE
+        self.raster_layer = None
+        self.document_path = None
+        self.document_loader = None
+        self.autosave = None
+        if raster_backend:
+            from raster_layer import enable_raster_layer
+            enable_raster_layer(self)
 
         self.canvas.bind("<Button-1>", self.mouse_down)
         self.canvas.bind("<Button-3>", self.mouse_down)
@@ -65,22 +143,50 @@ class DrawingApp:
         self.canvas.bind("<B3-Motion>", self.paint)
         self.canvas.bind("<ButtonRelease-1>", self.reset)
         self.canvas.bind("<ButtonRelease-3>", self.reset)
-        root.bind("<BackSpace>", self.delete_selected_item)
-        root.bind("<Delete>", self.delete_selected_item)
+        root.bind("<BackSpace>", self._editing_key(self.delete_selected_item))
+        root.bind("<Delete>", self._editing_key(self.delete_selected_item))
         root.bind("<Up>", self.keyboard_up)
         root.bind("<Down>", self.keyboard_down)
         root.bind("<Control-z>", lambda e: undo(self))
-
-        # set_mode_pencil(self)
+        root.bind("<Control-o>", lambda e: self.open_document())
+        root.bind("<Control-s>", lambda e: self.save_document())
+        root.bind("<Control-y>", lambda e: redo(self))
+        root.bind("<Control-Z>", lambda e: redo(self))
+        root.bind("<Control-x>", self._editing_key(lambda e: cut_selection(self)))
+        root.bind("<Control-c>", self._editing_key(lambda e: copy_selection(self)))
+        root.bind("<Control-v>", self._editing_key(lambda e: paste(self)))
+        root.bind("<Control-d>", self._editing_key(lambda e: duplicate_selection(self)))
+        root.bind("<F12>", lambda e: self.toggle_hud())
+        root.bind("<Control-plus>", lambda e: zoom_by(self, ZOOM_STEP))
+        root.bind("<Control-equal>", lambda e: zoom_by(self, ZOOM_STEP))
+        root.bind("<Control-minus>", lambda e: zoom_by(self, 1 / ZOOM_STEP))
+        root.bind("<Control-0>", lambda e: reset_zoom(self))
+        # Wheel scrolls (Ctrl+wheel zooms), middle-drag pans.
+        self.canvas.bind("<Configure>", lambda e: on_resize(self, e))
+        self.canvas.bind("<MouseWheel>", lambda e: on_wheel(self, e))
+        self.canvas.bind("<Button-4>", lambda e: on_wheel(self, e))
+        self.canvas.bind("<Button-5>", lambda e: on_wheel(self, e))
+        self.canvas.bind("<Button-2>", lambda e: start_pan(self, e))
+        self.canvas.bind("<B2-Motion>", lambda e: drag_pan(self, e))
+
+        self._on_layers_changed("layers", None)
         use_pencil(self)
-        
+
+    def _editing_key(self, handler):
+        # Root bindings fire after an Entry's own class binding, so keys
+        # typed into the RGB fields must not also act on the shapes.
+        def on_key(event):
+            if isinstance(event.widget, tk.Entry):
+                return None
+            return handler(event)
+        return on_key
 
     def _build_clipboard_section(self):
         f = tk.LabelFrame(self.toolbar, text="Clipboard")
         f.pack(side=tk.LEFT, padx=5)
-        tk.Button(f, text="Paste").pack(side=tk.TOP, pady=2)
-        tk.Button(f, text="Cut").pack(side=tk.TOP, pady=2)
-        tk.Button(f, text="Copy").pack(side=tk.TOP, pady=2)
+        tk.Button(f, text="Paste", command=lambda: paste(self)).pack(side=tk.TOP, pady=2)
+        tk.Button(f, text="Cut", command=lambda: cut_selection(self)).pack(side=tk.TOP, pady=2)
+        tk.Button(f, text="Copy", command=lambda: copy_selection(self)).pack(side=tk.TOP, pady=2)
 
     def _build_image_section(self):
         f = tk.LabelFrame(self.toolbar, text="Image")
@@ -89,6 +195,7 @@ class DrawingApp:
         tk.Button(f, text="Crop", command=lambda: crop_selected_area(self)).pack(side=tk.TOP, pady=2)
         tk.Button(f, text="Rotate Left", command=lambda: rotate_selected_shape(self, -15)).pack(side=tk.TOP, pady=2)
         tk.Button(f, text="Rotate Right", command=lambda: rotate_selected_shape(self, 15)).pack(side=tk.TOP, pady=2)
+        tk.Button(f, text="Flatten", command=self.flatten).pack(side=tk.TOP, pady=2)
 
     def _build_tools_section(self):
         f = tk.LabelFrame(self.toolbar, text="Tools")
@@ -100,7 +207,7 @@ class DrawingApp:
     def _build_shapes_section(self):
         f = tk.LabelFrame(self.toolbar, text="Shapes")
         f.pack(side=tk.LEFT, padx=5)
-        self.shape_button = tk.Button(f, text="🔄 Shape: Circle", command=self.update_shape_button)
+        self.shape_button = tk.Button(f, text=f"🔄 Shape: {self.shapes[0]}", command=self.update_shape_button)
         self.shape_button.pack(side=tk.TOP, padx=2)
         tk.Button(f, text="🔼 Up", command=self.add_shape_sides).pack(side=tk.LEFT, padx=2)
         tk.Button(f, text="🔽 Down", command=self.remove_shape_sides).pack(side=tk.LEFT, padx=2)
@@ -116,7 +223,7 @@ class DrawingApp:
         f.pack(side=tk.LEFT, padx=5)
         self.brush_size_var = tk.IntVar(value=2)
         tk.OptionMenu(f, self.brush_size_var, 1, 2, 4, 8, 10).pack()
-    print("use_pencil(self)")
+
     def _build_color_section(self):
         f = tk.LabelFrame(self.toolbar, text="Colors")
         f.pack(side=tk.LEFT, padx=5)
@@ -126,52 +233,217 @@ class DrawingApp:
         tk.Button(f, text="🎨 Set Color", command=lambda: set_color_from_rgb(self)).pack(side=tk.LEFT, padx=2)
         tk.Button(f, text="🌈 Picker", command=lambda: pick_color(self)).pack(side=tk.LEFT, padx=2)
 
+    def _build_layers_section(self):
+        f = tk.LabelFrame(self.toolbar, text="Layers")
+        f.pack(side=tk.LEFT, padx=5)
+        self.layer_list = tk.Listbox(f, height=4, width=14, exportselection=False)
+        self.layer_list.pack(side=tk.LEFT)
+        self.layer_list.bind("<<ListboxSelect>>", self.on_layer_select)
+        buttons = tk.Frame(f)
+        buttons.pack(side=tk.LEFT)
+        tk.Button(buttons, text="➕", command=lambda: add_layer(self)).grid(row=0, column=0)
+        tk.Button(buttons, text="➖", command=lambda: remove_active_layer(self)).grid(row=0, column=1)
+        tk.Button(buttons, text="🔼", command=lambda: shift_active_layer(self, 1)).grid(row=1, column=0)
+        tk.Button(buttons, text="🔽", command=lambda: shift_active_layer(self, -1)).grid(row=1, column=1)
+        tk.Button(buttons, text="👁", command=lambda: toggle_layer_visible(self)).grid(row=2, column=0)
+        tk.Button(buttons, text="🔒", command=lambda: toggle_layer_locked(self)).grid(row=2, column=1)
+        self.layer_opacity = tk.Scale(
+            f, from_=100, to=0, length=70, showvalue=False,
+            command=lambda value: set_layer_opacity(self, int(value) / 100)
+        )
+        self.layer_opacity.pack(side=tk.LEFT)
+
+    def _on_layers_changed(self, event, record):
+        if event not in ("layers", "clear"):
+            return
+        # The listbox shows the top layer first.
+        layers = self.scene.layers()[::-1]
+        self.layer_list.delete(0, tk.END)
+        for layer in layers:
+            self.layer_list.insert(tk.END, layer_label(layer))
+        active = [layer.id for layer in layers].index(self.scene.active_layer)
+        self.layer_list.selection_set(active)
+        self.layer_opacity.set(int(self.scene.layer(self.scene.active_layer).opacity * 100))
+
+    def on_layer_select(self, event):
+        selection = self.layer_list.curselection()
+        if selection:
+            select_layer(self, self.scene.layers()[::-1][selection[0]].id)
+
+    def new_document(self):
+        self.clear_canvas()
+        self.document_path = None
+
+    def open_document(self):
+        from tkinter import filedialog, messagebox
+        from document import EXTENSION, DocumentError, open_document
+        path = filedialog.askopenfilename(filetypes=[("Drawing", f"*{EXTENSION}"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            open_document(self, path)
+        except (OSError, DocumentError) as error:
+            messagebox.showerror("Open", f"Could not open {path}:\n{error}")
+
+    def save_document(self):
+        if self.document_path is None:
+            self.save_document_as()
+            return
+        from tkinter import messagebox
+        from document import save_to_path
+        try:
+            save_to_path(self, self.document_path)
+        except OSError as error:
+            messagebox.showerror("Save", f"Could not save {self.document_path}:\n{error}")
+            return
+        if self.autosave is not None:
+            self.autosave.rebase()
+
+    def save_document_as(self):
+        from tkinter import filedialog
+        from document import EXTENSION
+        path = filedialog.asksaveasfilename(defaultextension=EXTENSION, filetypes=[("Drawing", f"*{EXTENSION}")])
+        if path:
+            self.document_path = path
+            self.save_document()
+
+    def export_document(self, kind):
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(defaultextension=f".{kind}", filetypes=[(kind.upper(), f"*.{kind}")])
+        if path:
+            from export import start_export
+            start_export(self, kind, path, on_progress=lambda fraction: self.show_progress("exporting", fraction))
+
+    def show_progress(self, label, fraction):
+        # Progress of a background job in the title bar; None clears it.
+        title = self.root.title().split(" — ")[0]
+        self.root.title(title if fraction is None else f"{title} — {label} {fraction:.0%}")
+
+    def flatten(self):
+        from raster_layer import flatten_blocker, flatten_shapes
+        reason = flatten_blocker(self.scene)
+        if reason is not None:
+            from tkinter import messagebox
+            messagebox.showinfo("Flatten", reason)
+            return
+        flatten_shapes(self)
+
     def clear_canvas(self):
+        if self.document_loader is not None:
+            self.document_loader.cancel()
+        if self.fill_job is not None:
+            self.fill_job.cancel()
+            self.fill_job = None
+        self.scene.clear()
         self.canvas.delete("all")
+        if self.raster_layer is not None:
+            self.raster_layer.clear()
+        self.undo_stack.clear()
+        set_view(self, 1.0, 0.0, 0.0)
 
     def enable_selection_mode(self):
         if hasattr(self.canvas, 'enable_selection_mode'):
             self.canvas.enable_selection_mode()
 
     def delete_selected_item(self, event=None):
-        if hasattr(self.canvas, 'selected_item') and self.canvas.selected_item:
-            self.canvas.delete(self.canvas.selected_item)
-            self.canvas.selected_item = None
+        delete_selected_item(self, event)
+
+    def show_history_usage(self):
+        from tkinter import messagebox
+        messagebox.showinfo("History", self.undo_stack.usage())
+
+    def set_history_budget(self, megabytes):
+        self.undo_stack.set_budget(int(megabytes * 1024 * 1024))
+
+    def toggle_hud(self):
+        self.hud.toggle()
+
+    def save_profile_report(self):
+        from tkinter import filedialog, messagebox
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.profiler.dump(path)
+        except OSError as error:
+            messagebox.showerror("Performance Report", f"Could not save {path}:\n{error}")
+
+    def set_target_fps(self, fps):
+        self.scheduler.set_fps(fps)
+
+    def request_preview(self):
+        self.scheduler.request(
+            "preview",
+            lambda: draw_shape_preview(self, self.start_x, self.start_y, self.last_x, self.last_y)
+        )
 
     def keyboard_up(self, event):
         self.reverse_direction = True
         if self.is_dragging:
-            draw_shape_preview(self, self.start_x, self.start_y, self.last_x, self.last_y)
+            self.request_preview()
 
     def keyboard_down(self, event):
         self.reverse_direction = False
         if self.is_dragging:
-            draw_shape_preview(self, self.start_x, self.start_y, self.last_x, self.last_y)
+            self.request_preview()
 
+    @timed("paint")
     def paint(self, event):
-        x, y = event.x, event.y
+        if not self.scene.is_editable():
+            return
+        x, y = self.view.to_document(event.x, event.y)
         if self.shape_mode:
             if self.start_x is None or self.start_y is None:
                 self.start_x, self.start_y = x, y
             self.is_dragging = True
             self.last_x, self.last_y = x, y
-            draw_shape_preview(self, self.start_x, self.start_y, x, y)
+            self.request_preview()
+            return
 
+        if self.eraser_mode:
+            if self.current_erase is None:
+                self.current_erase = EraseSession(self, eraser_radius(self.brush_size_var.get()))
+                if self.start_x is not None and self.start_y is not None:
+                    self.current_erase.add_point(self.start_x, self.start_y)
+            self.current_erase.add_point(x, y)
+            self.scheduler.request("erase", self.current_erase.flush)
+            return
+        if self.fill_mode:
+            return
+        if self.current_stroke is None:
+            self.current_stroke = StrokeBuilder(
+                self.canvas, self.current_color, self.brush_size_var.get(), self.view.viewport
+            )
+            if self.start_x is not None and self.start_y is not None:
+                self.current_stroke.add_point(self.start_x, self.start_y)
+        self.current_stroke.add_point(x, y)
+        self.last_x, self.last_y = x, y
+        self.scheduler.request("stroke", self.current_stroke.flush)
+
+    @timed("reset")
     def reset(self, event):
         if self.shape_mode and self.is_dragging:
             self.is_dragging = False
-            finalize_shape_creation(self, self.start_x, self.start_y, event.x, event.y)
-            group_tag = f"group_{self.selected_item}"
+            self.scheduler.cancel("preview")
+            x, y = self.view.to_document(event.x, event.y)
+            group_tag = finalize_shape_creation(self, self.start_x, self.start_y, x, y)
             update_bbox_and_handles(self, group_tag)
+            self.start_x = self.start_y = None
             return
 
         self.last_x = self.last_y = None
-        if not self.eraser_mode and self.current_line_item:
-            if hasattr(self.canvas, 'tag_new_item'):
-                self.canvas.tag_new_item(self.current_line_item)
-            self.undo_stack.append(self.current_line_item)
-            self.current_line_item = None
-            self.current_line_points = []
+        self.start_x = self.start_y = None
+        if self.eraser_mode and self.current_erase:
+            self.scheduler.cancel("erase")
+            finalize_erase(self, self.current_erase)
+            self.current_erase = None
+            return
+        if not self.eraser_mode and self.current_stroke:
+            self.scheduler.cancel("stroke")
+            group_tag = finalize_stroke(self, self.current_stroke)
+            self.current_stroke = None
+            if group_tag and hasattr(self.canvas, 'tag_new_item'):
+                self.canvas.tag_new_item(group_tag)
 
     def update_shape_button(self):
         self.shape_index += 1
@@ -205,15 +477,61 @@ class DrawingApp:
             self.current_shape_sides = 3
         self.shape_button.config(text=f"🔄 Shape: Polygon ({self.current_shape_sides} sides)")
 
+    def fill_color(self, event):
+        if not self.scene.is_editable():
+            return
+        from flood_fill import start_fill
+        start_fill(self, *self.view.to_document(event.x, event.y))
+
+    @timed("mouse_down")
     def mouse_down(self, event):
-        self.last_x = self.start_x = event.x
-        self.last_y = self.start_y = event.y
+        x, y = self.view.to_document(event.x, event.y)
+        self.last_x = self.start_x = x
+        self.last_y = self.start_y = y
 
     def mouse_up(self, event):
         self.last_x = self.last_y = None
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if getattr(sys, "frozen", False):
+        # Export workers are spawned; a frozen build has to hand them off here.
+        import multiprocessing
+        multiprocessing.freeze_support()
+    if argv[:1] == ["render"]:
+        from batch_render import main as render
+        return render(argv[1:])
+    # --startup-profile[=PATH] times startup up to the first drawn frame and
+    # prints the report (or writes it to PATH as JSON).
+    profile_arg = next((arg for arg in argv if arg.split("=")[0] == "--startup-profile"), None)
+    startup = StartupProfile(STARTED) if profile_arg else None
     root = tk.Tk()
-    app = DrawingApp(root)
+    if startup:
+        startup.mark("tk")
+    app = DrawingApp(root, raster_backend="--raster" in argv)
+    if "--profile" in argv:
+        app.profiler.enable()
+    if "--no-autosave" not in argv:
+        from autosave import enable_autosave
+        app.autosave, recovered = enable_autosave(app)
+        if recovered:
+            root.title(f"{root.title()} (recovered)")
+    if startup:
+        startup.mark("build")
+        root.update()
+        startup.mark("first paint")
+        startup.finish(profile_arg.partition("=")[2] or None)
+        if "--exit-after-startup" in argv:
+            root.destroy()
+            return 0
     root.mainloop()
+    app.jobs.shutdown()
+    if app.autosave is not None:
+        # A clean exit leaves nothing to recover.
+        app.autosave.close(discard=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
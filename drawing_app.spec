@@ -1,12 +1,16 @@
 # -*- mode: python ; coding: utf-8 -*-
+from PyInstaller.utils.hooks import collect_submodules
 
+# Shape plugins are found at runtime with pkgutil, which the import
+# analysis cannot follow, so the package is collected explicitly.
+plugins = ['shape_plugins'] + collect_submodules('shape_plugins')
 
 a = Analysis(
     ['drawing_app.py'],
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=plugins,
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -16,19 +20,18 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# One-dir build: a one-file exe unpacks itself to a temp dir on every launch,
+# and UPX-compressed libraries are decompressed on every load.
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='drawing_app',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +39,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='drawing_app',
+)
@@ -0,0 +1,223 @@
+# File: eraser.py
+
+import math
+
+from spatial_index import GridIndex, record_contains
+from undo_utils import ENTRY_OVERHEAD, record_nbytes, restore_records
+
+
+def eraser_radius(brush_size):
+    return max(4, brush_size * 2)
+
+
+class SegmentIndex:
+    # Grid over individual line segments, kept in sync with the scene, so
+    # the eraser only looks at the few segments near the cursor instead of
+    # walking every point of every stroke whose bbox it touches.
+    def __init__(self, scene, cell_size=32):
+        self.scene = scene
+        self.grid = GridIndex(cell_size)
+        self._counts = {}
+        # Lines changed since the last query; re-indexing waits for the
+        # eraser to need it, so moving thousands of strokes stays cheap.
+        self._stale = set()
+        scene.subscribe(self._on_scene_change)
+
+    def _on_scene_change(self, event, record):
+        if event == "clear":
+            self.grid.clear()
+            self._counts.clear()
+            self._stale.clear()
+        elif event == "transform":
+            self._stale.update(record.shape_ids)
+        elif event in ("add", "update", "remove") and record.kind == "line":
+            self._stale.add(record.id)
+
+    def _refresh(self):
+        stale, self._stale = self._stale, set()
+        for shape_id in stale:
+            self._remove(shape_id)
+            record = self.scene.get(shape_id)
+            if record is not None and record.kind == "line":
+                self._insert(record)
+
+    def _insert(self, record):
+        coords = record.drawn()[1]
+        pad = record.width / 2
+        count = max(len(coords) // 2 - 1, 0)
+        for i in range(count):
+            x1, y1, x2, y2 = coords[2 * i:2 * i + 4]
+            self.grid.insert((record.id, i), (min(x1, x2) - pad, min(y1, y2) - pad, max(x1, x2) + pad, max(y1, y2) + pad))
+        self._counts[record.id] = count
+
+    def _remove(self, shape_id):
+        for i in range(self._counts.pop(shape_id, 0)):
+            self.grid.remove((shape_id, i))
+
+    def segments_near(self, x, y, radius):
+        if self._stale:
+            self._refresh()
+        hits = {}
+        for shape_id, i in self.grid.query_point(x, y, radius):
+            hits.setdefault(shape_id, []).append(i)
+        return hits
+
+
+def _circle_interval(x1, y1, x2, y2, cx, cy, radius):
+    # Parameter range [t0, t1] of segment p1->p2 inside the circle, or None.
+    dx = x2 - x1
+    dy = y2 - y1
+    fx = x1 - cx
+    fy = y1 - cy
+    a = dx * dx + dy * dy
+    c = fx * fx + fy * fy - radius * radius
+    if a == 0:
+        return (0.0, 1.0) if c <= 0 else None
+    b = 2 * (fx * dx + fy * dy)
+    disc = b * b - 4 * a * c
+    if disc < 0:
+        return None
+    root = math.sqrt(disc)
+    t0 = max(0.0, (-b - root) / (2 * a))
+    t1 = min(1.0, (-b + root) / (2 * a))
+    if t0 > t1:
+        return None
+    return t0, t1
+
+def split_polyline(coords, segments, cx, cy, radius):
+    # Cut the circle out of the given segments; returns the surviving runs,
+    # or None when the circle misses the line entirely.
+    cuts = {}
+    for i in segments:
+        x1, y1, x2, y2 = coords[2 * i:2 * i + 4]
+        interval = _circle_interval(x1, y1, x2, y2, cx, cy, radius)
+        if interval is not None:
+            cuts[i] = interval
+    if not cuts:
+        return None
+
+    runs = []
+    current = [coords[0], coords[1]]
+    for i in range(len(coords) // 2 - 1):
+        x1, y1, x2, y2 = coords[2 * i:2 * i + 4]
+        if i not in cuts:
+            current.extend([x2, y2])
+            continue
+        t0, t1 = cuts[i]
+        if t0 > 0:
+            current.extend([x1 + (x2 - x1) * t0, y1 + (y2 - y1) * t0])
+        if len(current) >= 4:
+            runs.append(current)
+        current = []
+        if t1 < 1:
+            current = [x1 + (x2 - x1) * t1, y1 + (y2 - y1) * t1, x2, y2]
+    if len(current) >= 4:
+        runs.append(current)
+    return runs
+
+
+class EraseAction:
+    # Everything one eraser drag changed, so undo reverts the whole drag.
+    def __init__(self, raster_action=None):
+        self.removed = []
+        self.added = []
+        self._added_records = None
+        self.raster_action = raster_action
+
+    def __bool__(self):
+        return bool(self.removed or self.added or self.raster_action)
+
+    def record_removed(self, record):
+        if record.id in self.added:
+            self.added.remove(record.id)
+        else:
+            self.removed.append(record)
+
+    def nbytes(self):
+        # While done the history owns the erased records; once undone it
+        # owns the pieces the drag produced.
+        owned = self._added_records if self._added_records is not None else self.removed
+        size = ENTRY_OVERHEAD * (len(self.removed) + len(self.added))
+        size += sum(record_nbytes(record) for record in owned)
+        if self.raster_action is not None:
+            size += self.raster_action.nbytes()
+        return size
+
+    def undo(self, app):
+        self._added_records = [app.scene.remove(shape_id) for shape_id in reversed(self.added)][::-1]
+        restore_records(app, self.removed[::-1])
+        if self.raster_action is not None:
+            self.raster_action.undo(app)
+
+    def redo(self, app):
+        for record in self.removed:
+            app.scene.remove(record.id)
+        restore_records(app, self._added_records)
+        self._added_records = None
+        if self.raster_action is not None:
+            self.raster_action.redo(app)
+
+
+class EraseSession:
+    def __init__(self, app, radius):
+        self.app = app
+        self.radius = radius
+        raster_action = None
+        if app.raster_layer is not None:
+            from raster_layer import RasterAction
+
+            raster_action = RasterAction(app.raster_layer)
+        self.action = EraseAction(raster_action)
+        self._last = None
+        self._pending = []
+
+    def add_point(self, x, y):
+        self._pending.append((x, y))
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        for x, y in pending:
+            if self._last is None:
+                self.erase_at(x, y)
+            else:
+                # Step along the path so fast drags leave no gaps.
+                lx, ly = self._last
+                steps = max(1, int(math.hypot(x - lx, y - ly) / (self.radius / 2)))
+                for step in range(1, steps + 1):
+                    t = step / steps
+                    self.erase_at(lx + (x - lx) * t, ly + (y - ly) * t)
+            self._last = (x, y)
+
+    def erase_at(self, x, y):
+        app = self.app
+        scene = app.scene
+        if app.raster_layer is not None:
+            r = self.radius
+            self.action.raster_action.capture(x - r, y - r, x + r, y + r)
+            app.raster_layer.erase_circle(x, y, r)
+        for shape_id, segments in app.segment_index.segments_near(x, y, self.radius).items():
+            record = scene.get(shape_id)
+            if record.layer != scene.active_layer:
+                continue
+            runs = split_polyline(record.drawn()[1], segments, x, y, self.radius + record.width / 2)
+            if runs is None:
+                continue
+            scene.remove(shape_id)
+            self.action.record_removed(record)
+            for run in runs:
+                piece = scene.add("line", run, fill=record.fill, width=record.width, dash=record.dash, layer=record.layer)
+                self.action.added.append(piece)
+                app.view.create_decorations(scene.get(piece).group)
+
+        for shape_id in scene.index.query_point(x, y, self.radius):
+            record = scene.get(shape_id)
+            if record.kind != "line" and record.layer == scene.active_layer and record_contains(record, x, y, self.radius):
+                scene.remove(shape_id)
+                self.action.record_removed(record)
+
+
+def finalize_erase(app, session):
+    session.flush()
+    if session.action:
+        app.undo_stack.push(session.action)
+    return session.action
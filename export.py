@@ -0,0 +1,338 @@
+# File: export.py
+
+import base64
+import math
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from raster import PngWriter, RasterTarget, draw_record, encode_png, mask_to_rgba, new_buffer, parse_color, snapshot_records
+
+EXPORT_TILE = 512
+# Below this many tiles, spawning worker processes costs more than it saves.
+MIN_POOL_TILES = 4
+BACKGROUND = (255, 255, 255)
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportSnapshot:
+    # The visible document detached from the scene and from Tk, so it can
+    # be pickled to worker processes. `layers` is bottom-to-top
+    # (opacity, records) with records as in raster.snapshot_records;
+    # `raster` is RGBA pixels with their top-left at `raster_origin`.
+    __slots__ = ("layers", "raster", "raster_origin", "bbox")
+
+    def __init__(self, layers, raster, bbox, raster_origin=(0, 0)):
+        self.layers = layers
+        self.raster = raster
+        self.raster_origin = raster_origin
+        self.bbox = bbox
+
+    def __getstate__(self):
+        return (self.layers, self.raster, self.raster_origin, self.bbox)
+
+    def __setstate__(self, state):
+        self.layers, self.raster, self.raster_origin, self.bbox = state
+
+
+def export_snapshot(scene, raster=None):
+    # `raster` is the raster layer as (origin, RGBA pixels), if any, as
+    # Document.raster() gives it. The export box
+    # runs from the document origin, or further up and left if anything
+    # lies at negative coordinates, to the far edge of the content.
+    layers = []
+    x1 = y1 = 0
+    x2 = y2 = 1
+    for layer in scene.layers():
+        if not layer.visible:
+            continue
+        records = snapshot_records(scene, layers=(layer.id,))
+        if records:
+            boxes = _record_boxes(records)
+            # The near edge is the geometry itself, as on the canvas and in
+            # clipboard.records_svg; the far edge keeps the stroke padding.
+            shapes = _record_boxes(records, padded=False)
+            x1 = min(x1, shapes[:, 0].min())
+            y1 = min(y1, shapes[:, 1].min())
+            x2 = max(x2, boxes[:, 2].max())
+            y2 = max(y2, boxes[:, 3].max())
+        layers.append((layer.opacity, records))
+    origin = (0, 0)
+    if raster is not None and raster[1][..., 3].any():
+        (ox, oy), pixels = raster
+        # Cropped to what is painted, which is also all that gets pickled.
+        rows = np.nonzero(pixels[..., 3].any(axis=1))[0]
+        cols = np.nonzero(pixels[..., 3].any(axis=0))[0]
+        raster = pixels[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].copy()
+        origin = (ox + int(cols[0]), oy + int(rows[0]))
+        x1 = min(x1, origin[0])
+        y1 = min(y1, origin[1])
+        x2 = max(x2, ox + cols[-1] + 1)
+        y2 = max(y2, oy + rows[-1] + 1)
+    else:
+        raster = None
+    bbox = (math.floor(x1), math.floor(y1), math.ceil(x2), math.ceil(y2))
+    return ExportSnapshot(layers, raster, bbox, origin)
+
+def _record_boxes(records, padded=True):
+    # Document-space bounds of each record, padded by its stroke width.
+    boxes = np.empty((len(records), 4))
+    for i, (kind, coords, fill, outline, width, data) in enumerate(records):
+        xs = coords[::2]
+        ys = coords[1::2]
+        if kind == "image" and data is not None:
+            xs = (coords[0], coords[0] + data.width)
+            ys = (coords[1], coords[1] + data.height)
+        pad = width / 2 + 1 if padded else 0
+        boxes[i] = (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+    return boxes
+
+def _blend(buf, rgba, opacity=1.0):
+    alpha = rgba[..., 3:4] * np.float32(opacity / 255)
+    buf[:] = (rgba[..., :3] * alpha + buf * (1 - alpha)).astype(np.uint8)
+
+
+class TileRenderer:
+    def __init__(self, snapshot, scale=1.0, background=BACKGROUND):
+        self.snapshot = snapshot
+        self.scale = scale
+        self.background = background
+        self._boxes = [_record_boxes(records) for _, records in snapshot.layers]
+
+    def render(self, x, y, width, height):
+        # (x, y, width, height) is a pixel region of the output image.
+        scale = self.scale
+        ox = self.snapshot.bbox[0] + x / scale
+        oy = self.snapshot.bbox[1] + y / scale
+        rx2 = ox + width / scale
+        ry2 = oy + height / scale
+        buf = new_buffer(width, height, self.background)
+        if self.snapshot.raster is not None:
+            self._render_raster(buf, ox, oy)
+        target = RasterTarget(buf, ox, oy, scale)
+        for (opacity, records), boxes in zip(self.snapshot.layers, self._boxes):
+            if opacity <= 0 or not len(records):
+                continue
+            hits = np.nonzero(
+                (boxes[:, 0] <= rx2) & (boxes[:, 2] >= ox) & (boxes[:, 1] <= ry2) & (boxes[:, 3] >= oy)
+            )[0]
+            if not len(hits):
+                continue
+            if opacity >= 1:
+                for i in hits:
+                    draw_record(target, *records[i])
+                continue
+            layer_buf = new_buffer(width, height, None, 4)
+            layer_target = RasterTarget(layer_buf, ox, oy, scale)
+            for i in hits:
+                draw_record(layer_target, *records[i])
+            _blend(buf, layer_buf, opacity)
+        return buf
+
+    def _render_raster(self, buf, ox, oy):
+        raster = self.snapshot.raster
+        rx, ry = self.snapshot.raster_origin
+        height, width = buf.shape[:2]
+        rows = np.floor(oy - ry + (np.arange(height) + 0.5) / self.scale).astype(int)
+        cols = np.floor(ox - rx + (np.arange(width) + 0.5) / self.scale).astype(int)
+        row_ok = (rows >= 0) & (rows < raster.shape[0])
+        col_ok = (cols >= 0) & (cols < raster.shape[1])
+        if not row_ok.any() or not col_ok.any():
+            return
+        region = buf[np.ix_(row_ok, col_ok)]
+        _blend(region, raster[np.ix_(rows[row_ok], cols[col_ok])])
+        buf[np.ix_(row_ok, col_ok)] = region
+
+
+_renderer = None
+
+def _init_worker(snapshot, scale, background):
+    global _renderer
+    _renderer = TileRenderer(snapshot, scale, background)
+
+def _render_tile(region):
+    return _renderer.render(*region)
+
+
+def export_size(snapshot, scale=1.0):
+    x1, y1, x2, y2 = snapshot.bbox
+    return max(1, round((x2 - x1) * scale)), max(1, round((y2 - y1) * scale))
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def export_png(
+    snapshot, path, scale=1.0, tile=EXPORT_TILE, workers=None, background=BACKGROUND, compression=6,
+    cancelled=None, progress=None,
+):
+    # Renders tile by tile and streams finished bands of rows into the PNG,
+    # so memory is bounded by the bands in flight, not the image size.
+    # `cancelled` (an Event) is checked and `progress` called once per band.
+    width, height = export_size(snapshot, scale)
+    columns = list(range(0, width, tile))
+    bands = list(range(0, height, tile))
+    workers = workers or os.cpu_count() or 1
+    temp_path = f"{path}.tmp"
+
+    def band_done(index):
+        if cancelled is not None and cancelled.is_set():
+            raise ExportCancelled()
+        if progress is not None:
+            progress((index + 1) / len(bands))
+
+    try:
+        with open(temp_path, "wb") as f:
+            writer = PngWriter(f, width, height, 3, compression)
+            if workers == 1 or len(columns) * len(bands) < MIN_POOL_TILES:
+                renderer = TileRenderer(snapshot, scale, background)
+                for index, y in enumerate(bands):
+                    band_height = min(tile, height - y)
+                    band = np.empty((band_height, width, 3), dtype=np.uint8)
+                    for x in columns:
+                        band[:, x:x + tile] = renderer.render(x, y, min(tile, width - x), band_height)
+                    writer.write_rows(band)
+                    band_done(index)
+            else:
+                # Spawned, not forked: the GUI calls this from a thread with Tk
+                # running, which fork does not survive reliably.
+                context = multiprocessing.get_context("spawn")
+                ahead = max(2, -(-workers // len(columns)) + 1)
+                with ProcessPoolExecutor(workers, context, _init_worker, (snapshot, scale, background)) as pool:
+                    def submit(y):
+                        band_height = min(tile, height - y)
+                        return y, band_height, [
+                            pool.submit(_render_tile, (x, y, min(tile, width - x), band_height)) for x in columns
+                        ]
+                    pending = deque(submit(y) for y in bands[:ahead])
+                    queued = len(pending)
+                    for index in range(len(bands)):
+                        y, band_height, futures = pending.popleft()
+                        if queued < len(bands):
+                            pending.append(submit(bands[queued]))
+                            queued += 1
+                        band = np.empty((band_height, width, 3), dtype=np.uint8)
+                        for x, future in zip(columns, futures):
+                            band[:, x:x + tile] = future.result()
+                        writer.write_rows(band)
+                        try:
+                            band_done(index)
+                        except ExportCancelled:
+                            # Queued tiles are dropped, not rendered on the way out.
+                            pool.shutdown(cancel_futures=True)
+                            raise
+            writer.close()
+    except BaseException:
+        _discard(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return width, height
+
+
+def _svg_color(color):
+    rgb = parse_color(color)
+    return "none" if rgb is None else "#%02x%02x%02x" % rgb
+
+def _svg_points(coords):
+    return " ".join(f"{coords[i]:g},{coords[i + 1]:g}" for i in range(0, len(coords), 2))
+
+def _svg_png(pixels):
+    return "data:image/png;base64," + base64.b64encode(encode_png(pixels)).decode("ascii")
+
+def svg_element(kind, coords, fill, outline, width, data=None):
+    if kind == "image":
+        rgb = parse_color(fill)
+        if data is None or rgb is None:
+            return ""
+        return (
+            f'<image x="{coords[0]:g}" y="{coords[1]:g}" width="{data.width}" height="{data.height}" '
+            f'href="{_svg_png(mask_to_rgba(data.to_mask(), rgb))}"/>'
+        )
+    if kind == "line":
+        return (
+            f'<polyline points="{_svg_points(coords)}" fill="none" stroke="{_svg_color(fill)}" '
+            f'stroke-width="{width:g}" stroke-linecap="round" stroke-linejoin="round"/>'
+        )
+    paint = f'fill="{_svg_color(fill)}" stroke="{_svg_color(outline)}" stroke-width="{width:g}"'
+    if kind in ("rectangle", "oval"):
+        x1, x2 = sorted(coords[0::2][:2])
+        y1, y2 = sorted(coords[1::2][:2])
+        if kind == "rectangle":
+            return f'<rect x="{x1:g}" y="{y1:g}" width="{x2 - x1:g}" height="{y2 - y1:g}" {paint}/>'
+        return (
+            f'<ellipse cx="{(x1 + x2) / 2:g}" cy="{(y1 + y2) / 2:g}" '
+            f'rx="{(x2 - x1) / 2:g}" ry="{(y2 - y1) / 2:g}" {paint}/>'
+        )
+    return f'<polygon points="{_svg_points(coords)}" {paint}/>'
+
+def export_svg(snapshot, path, background=BACKGROUND, cancelled=None, progress=None):
+    x1, y1, x2, y2 = snapshot.bbox
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(
+                f'<svg xmlns="http://www.w3.org/2000/svg" width="{x2 - x1:g}" height="{y2 - y1:g}" '
+                f'viewBox="{x1:g} {y1:g} {x2 - x1:g} {y2 - y1:g}">\n'
+            )
+            if background is not None:
+                f.write(f'<rect x="{x1:g}" y="{y1:g}" width="{x2 - x1:g}" height="{y2 - y1:g}" fill="#%02x%02x%02x"/>\n' % background)
+            if snapshot.raster is not None:
+                height, width = snapshot.raster.shape[:2]
+                rx, ry = snapshot.raster_origin
+                f.write(
+                    f'<image x="{rx}" y="{ry}" width="{width}" height="{height}" '
+                    f'href="{_svg_png(snapshot.raster)}"/>\n'
+                )
+            for index, (opacity, records) in enumerate(snapshot.layers):
+                if cancelled is not None and cancelled.is_set():
+                    raise ExportCancelled()
+                f.write(f'<g id={quoteattr(f"layer-{index}")}' + (f' opacity="{opacity:g}"' if opacity < 1 else "") + ">\n")
+                for record in records:
+                    element = svg_element(*record)
+                    if element:
+                        f.write(element + "\n")
+                f.write("</g>\n")
+                if progress is not None:
+                    progress((index + 1) / len(snapshot.layers))
+            f.write("</svg>\n")
+    except BaseException:
+        _discard(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+EXPORTERS = {"png": export_png, "svg": export_svg}
+
+
+def _export(job, kind, snapshot, path, options):
+    return EXPORTERS[kind](snapshot, path, cancelled=job.cancelled, progress=job.report, **options)
+
+def start_export(app, kind, path, on_progress=None, **options):
+    # The snapshot is taken here on the Tk thread; rendering and encoding
+    # run on a pool thread (and its worker processes). `on_progress` gets
+    # a 0..1 fraction as the export goes, then None once it is over.
+    if app.document_loader is not None:
+        app.document_loader.finish()
+    layer = app.raster_layer
+    raster = (layer.origin, layer.pixels) if layer is not None else None
+
+    def finished(error=None):
+        if on_progress is not None:
+            on_progress(None)
+        if error is not None:
+            from tkinter import messagebox
+            messagebox.showerror("Export", f"Could not export {path}:\n{error}")
+
+    return app.jobs.submit(
+        _export, kind, export_snapshot(app.scene, raster), path, options,
+        on_done=lambda result: finished(), on_error=finished, on_progress=on_progress,
+    )
@@ -0,0 +1,169 @@
+# File: flood_fill.py
+
+import math
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from raster import Bitmap, parse_color, rasterize, snapshot_records
+from raster_layer import rasterize_fill
+from undo_utils import AddCommand
+
+FILL_TOLERANCE = 16
+# Zoomed far out, the fill only looks at this many document pixels a side
+# around the click rather than everything in view.
+FILL_LIMIT = 4096
+
+
+class FillCancelled(Exception):
+    pass
+
+
+def similar_mask(pixels, x, y, tolerance):
+    # Per-channel range checks stay in uint8, avoiding a widened copy of the
+    # whole buffer.
+    mask = None
+    for channel in range(pixels.shape[2]):
+        seed = int(pixels[y, x, channel])
+        plane = pixels[..., channel]
+        if tolerance == 0:
+            hit = plane == seed
+        else:
+            hit = (plane >= max(seed - tolerance, 0)) & (plane <= min(seed + tolerance, 255))
+        mask = hit if mask is None else mask & hit
+    return mask
+
+def span_fill(similar, x, y, cancelled=None):
+    # Scanline fill over precomputed horizontal runs: each run of similar
+    # pixels is visited once, and neighbours in the rows above and below are
+    # found with a binary search instead of pixel-by-pixel probing.
+    height, width = similar.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = similar
+    edges = np.diff(padded, axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    _, run_ends = np.nonzero(edges == -1)
+    row_offsets = np.searchsorted(run_rows, np.arange(height + 1))
+
+    lo, hi = row_offsets[y], row_offsets[y + 1]
+    seed = lo + np.searchsorted(run_starts[lo:hi], x, side="right") - 1
+    if seed < lo or run_ends[seed] <= x:
+        return np.zeros((height, width), dtype=bool)
+
+    starts = run_starts.tolist()
+    ends = run_ends.tolist()
+    offsets = row_offsets.tolist()
+    rows = run_rows.tolist()
+    visited = bytearray(len(starts))
+    visited[seed] = 1
+    stack = [seed]
+    steps = 0
+    while stack:
+        run = stack.pop()
+        row, a, b = rows[run], starts[run], ends[run]
+        steps += 1
+        if cancelled is not None and steps % 512 == 0 and cancelled.is_set():
+            raise FillCancelled()
+        # Runs overlapping [a, b) in the row above, then the row below.
+        if row > 0:
+            lo, hi = offsets[row - 1], offsets[row]
+            for other in range(bisect_right(ends, a, lo, hi), bisect_left(starts, b, lo, hi)):
+                if not visited[other]:
+                    visited[other] = 1
+                    stack.append(other)
+        if row + 1 < height:
+            lo, hi = offsets[row + 1], offsets[row + 2]
+            for other in range(bisect_right(ends, a, lo, hi), bisect_left(starts, b, lo, hi)):
+                if not visited[other]:
+                    visited[other] = 1
+                    stack.append(other)
+
+    # Paint all visited runs at once: +1 at each start, -1 at each end, then
+    # a running sum along each row.
+    chosen = np.frombuffer(bytes(visited), dtype=np.uint8).astype(bool)
+    edges = np.zeros((height, width + 1), dtype=np.int8)
+    edges[run_rows[chosen], run_starts[chosen]] = 1
+    edges[run_rows[chosen], run_ends[chosen]] = -1
+    return np.cumsum(edges, axis=1, dtype=np.int8)[:, :width] > 0
+
+def fill_region(snapshot, region, x, y, tolerance=FILL_TOLERANCE, cancelled=None, base=None):
+    # Returns ((x1, y1, x2, y2), Bitmap) in document coordinates, or None when
+    # the seed lies outside the region.
+    rx, ry, width, height = region
+    px, py = int(x - rx), int(y - ry)
+    if not (0 <= px < width and 0 <= py < height):
+        return None
+    pixels = rasterize(snapshot, rx, ry, width, height, base=base)
+    if cancelled is not None and cancelled.is_set():
+        raise FillCancelled()
+    similar = similar_mask(pixels, px, py, tolerance)
+    del pixels
+    mask = span_fill(similar, px, py, cancelled)
+    rows = np.nonzero(mask.any(axis=1))[0]
+    cols = np.nonzero(mask.any(axis=0))[0]
+    if len(rows) == 0:
+        return None
+    y1, y2 = rows[0], rows[-1] + 1
+    x1, x2 = cols[0], cols[-1] + 1
+    bitmap = Bitmap.from_mask(mask[y1:y2, x1:x2])
+    return (rx + x1, ry + y1, rx + x2, ry + y2), bitmap
+
+
+def _fill(job, snapshot, region, x, y, tolerance, base):
+    return fill_region(snapshot, region, x, y, tolerance, job.cancelled, base)
+
+
+def fill_area(app, x, y):
+    # (x, y, width, height) in whole document pixels: what is in view.
+    viewport = app.view.viewport
+    if viewport is None:
+        return (0, 0, max(app.canvas.winfo_width(), 1), max(app.canvas.winfo_height(), 1))
+    vx1, vy1, vx2, vy2 = viewport.visible_bbox()
+    x1 = max(math.floor(vx1), int(x) - FILL_LIMIT // 2)
+    y1 = max(math.floor(vy1), int(y) - FILL_LIMIT // 2)
+    x2 = min(math.ceil(vx2), x1 + FILL_LIMIT)
+    y2 = min(math.ceil(vy2), y1 + FILL_LIMIT)
+    return (x1, y1, max(x2 - x1, 1), max(y2 - y1, 1))
+
+def start_fill(app, x, y):
+    # A new click supersedes any fill still running.
+    if app.fill_job is not None:
+        app.fill_job.cancel()
+    region = fill_area(app, x, y)
+    visible = {layer.id for layer in app.scene.layers() if layer.visible}
+    snapshot = snapshot_records(app.scene, (region[0], region[1], region[0] + region[2], region[1] + region[3]), visible)
+    base = None
+    if app.raster_layer is not None:
+        base = app.raster_layer.composite_rgb(*region)
+    tolerance = FILL_TOLERANCE if app.fill_tolerance is None else app.fill_tolerance
+    color = app.current_color
+    # Cancelled, this job's snapshot and pixels are released at its next
+    # check rather than after a full fill nobody wants.
+    app.fill_job = app.jobs.submit(
+        _fill, snapshot, region, x, y, tolerance, base,
+        on_done=lambda result: _fill_done(app, result, color),
+        on_error=lambda error: _fill_failed(app, error),
+    )
+    return app.fill_job
+
+def _fill_done(app, result, color):
+    app.fill_job = None
+    if result is not None:
+        apply_fill(app, result, color)
+
+def _fill_failed(app, error):
+    from tkinter import messagebox
+    app.fill_job = None
+    messagebox.showerror("Fill", f"Could not fill the area:\n{error}")
+
+def apply_fill(app, result, color):
+    bbox, bitmap = result
+    if parse_color(color) is None:
+        return None
+    if app.raster_layer is not None:
+        rasterize_fill(app, bbox, bitmap, color)
+        return None
+    shape_id = app.scene.add("image", bbox, fill=color, outline="", data=bitmap)
+    group_tag = app.scene.get(shape_id).group
+    app.undo_stack.push(AddCommand.for_group(app.scene, group_tag))
+    return group_tag
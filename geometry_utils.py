@@ -1,57 +1,235 @@
 import math
+from array import array
+
+from scene_model import BOX_KINDS, bbox_corners
+from undo_utils import ENTRY_OVERHEAD, RemoveCommand
+from viewport import set_view
+
+ROTATABLE_KINDS = ("polygon", "line", "rectangle", "oval")
+AXIS_EPSILON = 1e-9
+
+# Affine matrices are (a, b, c, d, e, f): x' = a*x + c*y + e, y' = b*x + d*y + f.
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+def translate_matrix(dx, dy):
+    return (1.0, 0.0, 0.0, 1.0, dx, dy)
+
+def scale_matrix(sx, sy, ax=0.0, ay=0.0):
+    return (sx, 0.0, 0.0, sy, ax - ax * sx, ay - ay * sy)
+
+def rotate_matrix(angle_degrees, cx=0.0, cy=0.0):
+    radians = math.radians(angle_degrees)
+    cos_val = math.cos(radians)
+    sin_val = math.sin(radians)
+    return (cos_val, sin_val, -sin_val, cos_val, cx - cos_val * cx + sin_val * cy, cy - sin_val * cx - cos_val * cy)
+
+def compose(outer, inner):
+    # The matrix that applies `inner` first, then `outer`.
+    a2, b2, c2, d2, e2, f2 = outer
+    a1, b1, c1, d1, e1, f1 = inner
+    return (
+        a2 * a1 + c2 * b1, b2 * a1 + d2 * b1,
+        a2 * c1 + c2 * d1, b2 * c1 + d2 * d1,
+        a2 * e1 + c2 * f1 + e2, b2 * e1 + d2 * f1 + f2,
+    )
+
+def invert(matrix):
+    a, b, c, d, e, f = matrix
+    det = a * d - b * c
+    ia, ib, ic, id_ = d / det, -b / det, -c / det, a / det
+    return (ia, ib, ic, id_, -(ia * e + ic * f), -(ib * e + id_ * f))
+
+def is_axis_aligned(matrix):
+    return abs(matrix[1]) < AXIS_EPSILON and abs(matrix[2]) < AXIS_EPSILON
+
+def _transform_points(points, matrix):
+    # `points` is a flat x, y, x, y... float64 array.
+    import numpy as np
+
+    a, b, c, d, e, f = matrix
+    xs = points[0::2]
+    ys = points[1::2]
+    out = np.empty_like(points)
+    out[0::2] = xs * a + ys * c + e
+    out[1::2] = xs * b + ys * d + f
+    return out
+
+def apply_matrix(coords, matrix):
+    import numpy as np
+
+    return array('d', _transform_points(np.asarray(coords, dtype=np.float64), matrix).tobytes())
+
+def box_geometry(box, record_matrix, matrix):
+    # New (coords, record matrix) for a rectangle or oval: upright results
+    # fold back into plain corners, anything else keeps the original box.
+    total = matrix if record_matrix is None else compose(matrix, record_matrix)
+    if not is_axis_aligned(total):
+        return box, total
+    a, b, c, d, e, f = total
+    x1, y1, x2, y2 = box
+    x1, x2 = sorted((a * x1 + e, a * x2 + e))
+    y1, y2 = sorted((d * y1 + f, d * y2 + f))
+    return (x1, y1, x2, y2), None
+
+
+class GroupTransform:
+    # The groups' geometry as it was when a transform began. apply() maps
+    # that original geometry through the accumulated matrix in one
+    # vectorized pass, so repeated frames never re-transform (and drift)
+    # already-transformed coordinates.
+    def __init__(self, scene, groups, kinds=None):
+        # NumPy loads on the first transform rather than at startup.
+        import numpy as np
+
+        self.scene = scene
+        self.groups = tuple(groups)
+        self.kinds = kinds
+        self.matrix = IDENTITY
+        # What the scene currently shows, so each frame can report the
+        # delta from the previous one.
+        self._applied = IDENTITY
+        self._spans = []
+        self._boxes = []
+        self._images = []
+        # Whether every member is transformed, so the view may move whole
+        # group tags instead of syncing items one by one.
+        self._whole = True
+        chunks = []
+        offset = 0
+        for group in self.groups:
+            for shape_id in scene.group_members(group):
+                record = scene.get(shape_id)
+                if kinds is not None and record.kind not in kinds:
+                    self._whole = False
+                    continue
+                if record.kind in BOX_KINDS:
+                    self._boxes.append((shape_id, tuple(record.coords[:4]), record.matrix))
+                    continue
+                if record.kind == "image":
+                    self._images.append((shape_id, array('d', record.coords)))
+                    continue
+                # Pasted copies are baked into coords of their own here.
+                chunks.append(np.frombuffer(record.drawn()[1], dtype=np.float64))
+                self._spans.append((shape_id, offset, offset + len(record.coords)))
+                offset += len(record.coords)
+        self._base = np.concatenate(chunks) if chunks else np.zeros(0)
+
+    def apply(self, app, matrix=None):
+        if matrix is not None:
+            self.matrix = matrix
+        scene = self.scene
+        points = _transform_points(self._base, self.matrix)
+        changes = [
+            (shape_id, array('d', points[start:end].tobytes()), None)
+            for shape_id, start, end in self._spans if shape_id in scene
+        ]
+        changes.extend(
+            (shape_id, *box_geometry(box, record_matrix, self.matrix))
+            for shape_id, box, record_matrix in self._boxes if shape_id in scene
+        )
+        # Fill bitmaps are not resampled, so images follow a move but stay
+        # where they are under a resize or rotation.
+        shift = self.matrix if self.matrix[:4] == IDENTITY[:4] else IDENTITY
+        changes.extend(
+            (shape_id, apply_matrix(coords, shift), None)
+            for shape_id, coords in self._images if shape_id in scene
+        )
+        whole = self._whole and (shift is self.matrix or not self._images)
+        delta = compose(self.matrix, invert(self._applied)) if whole else None
+        self._applied = self.matrix
+        scene.set_geometry(changes, self.groups, delta)
+
+def transform_groups(app, groups, matrix, kinds=None):
+    GroupTransform(app.scene, groups, kinds).apply(app, matrix)
+
+
+class TransformCommand:
+    # A move/resize/rotate kept as one affine matrix; undo applies the
+    # inverse. Pushes carrying the same `drag` id merge into one entry.
+    def __init__(self, groups, matrix, kinds=None, drag=None):
+        self.groups = tuple(groups)
+        self.matrix = matrix
+        self.kinds = kinds
+        self.drag = drag
+
+    def nbytes(self):
+        return ENTRY_OVERHEAD + 8 * len(self.matrix) + sum(len(group) for group in self.groups)
+
+    def merge(self, other):
+        if (
+            not isinstance(other, TransformCommand) or self.drag is None or other.drag != self.drag
+            or other.groups != self.groups or other.kinds != self.kinds
+        ):
+            return False
+        self.matrix = compose(other.matrix, self.matrix)
+        return True
+
+    def undo(self, app):
+        transform_groups(app, self.groups, invert(self.matrix), self.kinds)
+
+    def redo(self, app):
+        transform_groups(app, self.groups, self.matrix, self.kinds)
 
 def rotate_selected_shape(app, angle_degrees):
     if not hasattr(app.canvas, 'selected_item') or not app.canvas.selected_item:
         return
 
-    item = app.canvas.selected_item
-    try:
-        coords = app.canvas.coords(item)
-        if not coords:
-            return
-    except:
+    group_tag = app.canvas.selected_item
+    groups = [group_tag]
+    bbox = app.scene.group_bbox(group_tag)
+    if group_tag in app.view.highlighted and app.view.multi:
+        # The whole selection turns about its common centre.
+        groups = sorted(app.view.highlighted)
+        bbox = app.view.selection_bbox()
+    if bbox is None:
         return
 
-    if len(coords) >= 4:
-        x_coords = coords[::2]
-        y_coords = coords[1::2]
-        center_x = sum(x_coords) / len(x_coords)
-        center_y = sum(y_coords) / len(y_coords)
-
-        radians = math.radians(angle_degrees)
-        cos_val = math.cos(radians)
-        sin_val = math.sin(radians)
-
-        new_coords = []
-        for x, y in zip(x_coords, y_coords):
-            dx = x - center_x
-            dy = y - center_y
-            new_x = center_x + dx * cos_val - dy * sin_val
-            new_y = center_y + dx * sin_val + dy * cos_val
-            new_coords.extend([new_x, new_y])
+    center_x = (bbox[0] + bbox[2]) / 2
+    center_y = (bbox[1] + bbox[3]) / 2
+    command = TransformCommand(groups, rotate_matrix(angle_degrees, center_x, center_y), ROTATABLE_KINDS)
+    command.redo(app)
+    app.undo_stack.push(command)
 
-        app.canvas.coords(item, *new_coords)
+def group_corners(scene, group_tag):
+    bbox = scene.group_bbox(group_tag)
+    return bbox_corners(bbox) if bbox else []
 
 def crop_selected_area(app):
     if not hasattr(app.canvas, 'selected_item') or not app.canvas.selected_item:
         return
 
-    item = app.canvas.selected_item
-    try:
-        coords = app.canvas.coords(item)
-        if not coords or len(coords) < 4:
-            return
-    except:
+    group_tag = app.canvas.selected_item
+    bbox = app.scene.group_bbox(group_tag)
+    if bbox is None:
         return
+    x1, y1, x2, y2 = bbox
+
+    records = [
+        app.scene.get(shape_id)
+        for other_group in app.scene.groups() if other_group != group_tag
+        for shape_id in app.scene.group_members(other_group)
+    ]
+    # The crop becomes the new window: actual size, origin at its corner.
+    before = {"view": app.view.viewport.state(), "width": app.canvas.cget("width"), "height": app.canvas.cget("height")}
+    command = CropCommand(records, before, {"view": (1.0, x1, y1), "width": int(x2 - x1), "height": int(y2 - y1)})
+    command.redo(app)
+    app.undo_stack.push(command)
+
+
+class CropCommand(RemoveCommand):
+    def __init__(self, records, before, after):
+        super().__init__(records)
+        self.before = before
+        self.after = after
 
-    x_coords = coords[::2]
-    y_coords = coords[1::2]
-    x1, y1 = min(x_coords), min(y_coords)
-    x2, y2 = max(x_coords), max(y_coords)
+    def undo(self, app):
+        super().undo(app)
+        self._apply(app, self.before)
 
-    for other_item in app.canvas.find_all():
-        if other_item != item:
-            app.canvas.delete(other_item)
+    def redo(self, app):
+        super().redo(app)
+        self._apply(app, self.after)
 
-    app.canvas.config(scrollregion=(x1, y1, x2, y2))
-    app.canvas.configure(width=int(x2 - x1), height=int(y2 - y1))
+    def _apply(self, app, state):
+        app.canvas.configure(width=state["width"], height=state["height"])
+        set_view(app, *state["view"])
@@ -0,0 +1,167 @@
+# File: jobs.py
+
+import os
+import queue
+import threading
+import time
+
+POLL_MS = 15
+THREAD_WORKERS = 4
+
+
+class Job:
+    # One piece of work handed to a JobPool. Thread jobs get the Job as
+    # their first argument: they check `cancelled` at safe points and call
+    # report() with a 0..1 fraction. Callbacks only ever run on the Tk thread.
+    def __init__(self, pool, fn, args, on_done, on_error, on_progress):
+        self.pool = pool
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+        self.progress = 0.0
+        self.future = None
+        self._progress_queued = False
+
+    def report(self, fraction):
+        # Called from the worker; progress messages are coalesced so a fast
+        # loop cannot flood the queue between two polls.
+        self.progress = fraction
+        if self.on_progress is not None and not self._progress_queued:
+            self._progress_queued = True
+            self.pool.results.put(("progress", self))
+
+    def cancel(self):
+        # A job that has not started never runs; a running one stops at its
+        # next check. Either way nothing is delivered, and the inputs and
+        # callbacks are dropped now rather than when the worker gets around
+        # to noticing.
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        self.args = self.on_done = self.on_error = self.on_progress = None
+
+
+class JobPool:
+    # Runs work off the Tk thread and marshals results back through a queue
+    # drained by canvas.after, so callbacks may touch Tk and the scene. The
+    # executors are made on first use; the queue is only polled while jobs
+    # are outstanding.
+    def __init__(self, canvas, thread_workers=THREAD_WORKERS, process_workers=None, poll_ms=POLL_MS):
+        self.canvas = canvas
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.poll_ms = poll_ms
+        self.results = queue.SimpleQueue()
+        self.active = set()
+        self._threads = None
+        self._processes = None
+        self._poll_id = None
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, process=False):
+        # With process=True, fn(*args) runs in a worker process and must be
+        # picklable; it cannot report progress, and once running it finishes
+        # (its result discarded) even if cancelled.
+        job = Job(self, fn, args, on_done, on_error, on_progress)
+        if process:
+            job.future = self._process_pool().submit(fn, *args)
+            job.args = None
+        else:
+            job.future = self._thread_pool().submit(self._run, job)
+        self.active.add(job)
+        job.future.add_done_callback(lambda future: self.results.put(("done", job)))
+        if self._poll_id is None:
+            self._poll_id = self.canvas.after(self.poll_ms, self._poll)
+        return job
+
+    def _run(self, job):
+        fn, args = job.fn, job.args
+        job.args = None
+        if job.cancelled.is_set() or args is None:
+            return None
+        try:
+            return fn(job, *args)
+        except Exception:
+            # Dropped rather than kept on the future, whose traceback would
+            # pin the abandoned job's frames and buffers.
+            if job.cancelled.is_set():
+                return None
+            raise
+
+    def _thread_pool(self):
+        if self._threads is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._threads = ThreadPoolExecutor(self.thread_workers, thread_name_prefix="job")
+        return self._threads
+
+    def _process_pool(self):
+        if self._processes is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # Spawned, not forked, as Tk is running in this process.
+            context = multiprocessing.get_context("spawn")
+            self._processes = ProcessPoolExecutor(self.process_workers or os.cpu_count() or 1, context)
+        return self._processes
+
+    def _poll(self):
+        self._poll_id = None
+        self.deliver()
+        if self.active:
+            self._poll_id = self.canvas.after(self.poll_ms, self._poll)
+
+    def deliver(self):
+        while True:
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(*message)
+
+    def wait(self, timeout=None):
+        # Blocks, delivering as results arrive, until no job is outstanding.
+        # For tests and batch use; never called from a Tk callback.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.active:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                message = self.results.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            self._handle(*message)
+        self.deliver()
+        return True
+
+    def _handle(self, kind, job):
+        if kind == "progress":
+            job._progress_queued = False
+            if job.on_progress is not None and not job.cancelled.is_set():
+                job.on_progress(job.progress)
+            return
+        self.active.discard(job)
+        if job.cancelled.is_set():
+            return
+        on_done, on_error = job.on_done, job.on_error
+        job.fn = job.on_done = job.on_error = job.on_progress = None
+        error = job.future.exception()
+        if error is None:
+            if on_done is not None:
+                on_done(job.future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            from tkinter import messagebox
+            messagebox.showerror("Background job", f"A background task failed:\n{error!r}")
+
+    def shutdown(self):
+        for job in list(self.active):
+            job.cancel()
+        self.active.clear()
+        if self._poll_id is not None:
+            self.canvas.after_cancel(self._poll_id)
+            self._poll_id = None
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
@@ -0,0 +1,207 @@
+# File: layers.py
+
+import base64
+import math
+import tkinter as tk
+
+
+class LayerCompositor:
+    # Keeps only the active layer as live canvas items. Every other visible
+    # layer is rasterized once into an RGBA cache; the caches below and above
+    # the active layer are blended into one image item each, so edits on the
+    # active layer never touch them. The caches cover `region` (document
+    # coordinates) at `zoom`; with a viewport that is the view's culling
+    # region, re-rendered whenever it moves.
+    def __init__(self, canvas, scene, view, scheduler=None):
+        self.canvas = canvas
+        self.scene = scene
+        self.view = view
+        self.scheduler = scheduler
+        if view.viewport is not None:
+            self.region, self.zoom = view.region, view.viewport.zoom
+        else:
+            self.region, self.zoom = (0, 0, int(canvas.cget("width")), int(canvas.cget("height"))), 1.0
+        self._caches = {}
+        self._dirty = {"below", "above"}
+        self._items = {}
+        self._photos = {}
+        self.renders = 0
+        # While paused (e.g. during a document load) invalidations only
+        # accumulate; resume() rebuilds once.
+        self.paused = False
+        view.set_live_layer(scene.active_layer)
+        scene.subscribe(self._on_scene_change)
+
+    def _on_scene_change(self, event, record):
+        if event == "layers":
+            if self.view.live_layer != self.scene.active_layer:
+                self.view.set_live_layer(self.scene.active_layer)
+            self._show_live(self.scene.layer(self.scene.active_layer).visible)
+            self.invalidate("below", "above")
+        elif event == "clear":
+            for item in self._items.values():
+                self.canvas.delete(item)
+            self._items.clear()
+            self._photos.clear()
+            self._caches.clear()
+            self._dirty.clear()
+            self.view.ceiling = None
+            self.view.live_layer = self.scene.active_layer
+        else:
+            # Active-layer edits only drop the stale cache; it is re-rendered
+            # when some other layer becomes active.
+            layers = record.layers if event == "transform" else (record.layer,)
+            for layer_id in layers:
+                self._caches.pop(layer_id, None)
+                if layer_id != self.scene.active_layer:
+                    self.invalidate(self.side_of(layer_id))
+
+    @property
+    def width(self):
+        return max(1, math.ceil((self.region[2] - self.region[0]) * self.zoom))
+
+    @property
+    def height(self):
+        return max(1, math.ceil((self.region[3] - self.region[1]) * self.zoom))
+
+    def set_region(self, region, zoom):
+        self.region, self.zoom = region, zoom
+        self._caches.clear()
+        self.invalidate("below", "above")
+
+    def side_of(self, layer_id):
+        scene = self.scene
+        if scene.layer_position(layer_id) < scene.layer_position(scene.active_layer):
+            return "below"
+        return "above"
+
+    def invalidate(self, *sides):
+        self._dirty.update(sides)
+        if self.paused:
+            return
+        if self.scheduler is None:
+            self.flush()
+        else:
+            self.scheduler.request("layers", self.flush)
+
+    def resume(self):
+        self.paused = False
+        self.invalidate("below", "above")
+
+    def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        scene = self.scene
+        order = scene.layers()
+        position = scene.layer_position(scene.active_layer)
+        if "below" in dirty:
+            self._upload("below", self.composite([layer for layer in order[:position] if layer.visible]))
+        if "above" in dirty:
+            self._upload("above", self.composite([layer for layer in order[position + 1:] if layer.visible]))
+
+    def layer_pixels(self, layer_id):
+        pixels = self._caches.get(layer_id)
+        if pixels is None:
+            from raster import rasterize, snapshot_records
+
+            self.renders += 1
+            bbox = self.region if self.view.viewport is not None else None
+            snapshot = snapshot_records(self.scene, bbox, layers=(layer_id,))
+            x0, y0 = self.region[:2]
+            pixels = rasterize(snapshot, x0, y0, self.width, self.height, self.zoom, background=None, channels=4)
+            self._caches[layer_id] = pixels
+        return pixels
+
+    def composite(self, layers):
+        layers = [layer for layer in layers if layer.opacity > 0]
+        if not layers:
+            return None
+        if len(layers) == 1 and layers[0].opacity >= 1:
+            return self.layer_pixels(layers[0].id)
+        # Source-over in premultiplied floats, bottom layer first.
+        import numpy as np
+
+        color = np.zeros((self.height, self.width, 3), dtype=np.float32)
+        alpha = np.zeros((self.height, self.width, 1), dtype=np.float32)
+        for layer in layers:
+            pixels = self.layer_pixels(layer.id)
+            a = pixels[..., 3:4] * np.float32(layer.opacity / 255)
+            color = pixels[..., :3] * a + color * (1 - a)
+            alpha = a + alpha * (1 - a)
+        out = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        covered = alpha[..., 0] > 0
+        out[covered, :3] = np.clip(color[covered] / alpha[covered], 0, 255).astype(np.uint8)
+        out[..., 3] = np.round(alpha[..., 0] * 255).astype(np.uint8)
+        return out
+
+    def _upload(self, side, pixels):
+        item = self._items.get(side)
+        if pixels is None:
+            if item is not None:
+                self.canvas.itemconfig(item, state='hidden')
+            return
+        from raster import encode_png
+
+        data = base64.b64encode(encode_png(pixels, 1)).decode("ascii")
+        photo = self._photos.get(side)
+        if photo is not None:
+            photo.configure(data=data, format="png")
+        elif hasattr(self.canvas, "tk"):
+            photo = self._photos[side] = tk.PhotoImage(master=self.canvas, data=data, format="png")
+        x, y = self.view.to_screen(*self.region[:2])
+        if item is not None:
+            self.canvas.coords(item, x, y)
+            self.canvas.itemconfig(item, state='normal')
+            return
+        item = self.canvas.create_image(x, y, image=photo, anchor="nw", tags=("layer_cache",))
+        self._items[side] = item
+        if side == "below":
+            self.canvas.tag_lower(item)
+            self.canvas.tag_lower("raster")
+        else:
+            if self.canvas.find_withtag("movable"):
+                self.canvas.tag_raise(item, "movable")
+            self.view.ceiling = item
+
+    def _show_live(self, visible):
+        self.canvas.itemconfig("movable", state='normal' if visible else 'hidden')
+
+
+def _clear_selection(app):
+    app.view.set_selection(set())
+    app.canvas.selected_item = None
+
+def add_layer(app):
+    _clear_selection(app)
+    return app.scene.add_layer()
+
+def remove_active_layer(app):
+    _clear_selection(app)
+    return app.scene.remove_layer(app.scene.active_layer)
+
+def select_layer(app, layer_id):
+    _clear_selection(app)
+    app.scene.set_active_layer(layer_id)
+
+def shift_active_layer(app, delta):
+    scene = app.scene
+    scene.move_layer(scene.active_layer, scene.layer_position(scene.active_layer) + delta)
+
+def toggle_layer_visible(app):
+    layer = app.scene.layer(app.scene.active_layer)
+    app.scene.set_layer(layer.id, visible=not layer.visible)
+
+def toggle_layer_locked(app):
+    layer = app.scene.layer(app.scene.active_layer)
+    if not layer.locked:
+        _clear_selection(app)
+    app.scene.set_layer(layer.id, locked=not layer.locked)
+
+def set_layer_opacity(app, opacity):
+    layer = app.scene.layer(app.scene.active_layer)
+    if layer.opacity != opacity:
+        app.scene.set_layer(layer.id, opacity=opacity)
+
+def layer_label(layer):
+    flags = ("" if layer.visible else "🚫") + ("🔒" if layer.locked else "")
+    opacity = "" if layer.opacity >= 1 else f" {int(layer.opacity * 100)}%"
+    return f"{flags}{layer.name}{opacity}"
@@ -1,15 +1,18 @@
 def set_mode_pencil(app):
     if app.canvas.selection_mode:
         app.canvas.disable_selection_mode()
+    app.canvas.bind("<Button-1>", app.mouse_down)
     app.canvas.bind("<B1-Motion>", app.paint)
     app.canvas.bind("<ButtonRelease-1>", app.reset)
     app.eraser_mode = False
     app.fill_mode = False
     app.shape_mode = False
-    app.current_line_points = []
-    app.current_line_item = None
+    app.current_stroke = None
 
 def set_mode_eraser(app):
+    app.canvas.bind("<Button-1>", app.mouse_down)
+    app.canvas.bind("<B1-Motion>", app.paint)
+    app.canvas.bind("<ButtonRelease-1>", app.reset)
     app.eraser_mode = True
     app.fill_mode = False
     app.shape_mode = False
@@ -27,10 +30,10 @@ def use_pencil(app):
     app.eraser_mode = False
     app.fill_mode = False
     app.shape_mode = False
+    app.canvas.bind("<Button-1>", app.mouse_down)
     app.canvas.bind("<B1-Motion>", app.paint)
     app.canvas.bind("<ButtonRelease-1>", app.reset)
-    app.current_line_points = []
-    app.current_line_item = None
+    app.current_stroke = None
 
 def use_eraser(app):
     if app.canvas.selection_mode:
@@ -0,0 +1,307 @@
+# File: profiler.py
+
+# Latency and Tcl traffic per interaction event. Handlers are wrapped with
+# @timed(name); while no Profiler is enabled the wrapper only checks one
+# global and calls straight through.
+
+import functools
+import json
+import math
+import time
+
+from viewport import SCREEN_TAG
+
+HUD_TAG = "perf_hud"
+HUD_INTERVAL = 500  # ms between overlay refreshes
+HUD_EVENTS = ("on_click", "on_drag", "on_hover", "mouse_down", "paint", "reset", "finalize_shape_creation", "frame")
+# Histogram buckets: upper bounds growing by a quarter octave from 10 us
+# to about 10 s, so a percentile is read to within ~19%.
+BUCKET_BASE = 1e-5
+BUCKET_STEP = 2 ** 0.25
+BUCKETS = 80
+PERCENTILES = (50, 95, 99)
+STARTUP_HOTSPOTS = 15
+
+_active = None
+
+
+def timed(name):
+    def wrap(func):
+        @functools.wraps(func)
+        def handler(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+            return profiler.measure(name, func, args, kwargs)
+        return handler
+    return wrap
+
+
+def bucket_bound(index):
+    return BUCKET_BASE * BUCKET_STEP ** index
+
+def bucket_index(seconds):
+    if seconds <= BUCKET_BASE:
+        return 0
+    return min(BUCKETS - 1, math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_STEP)))
+
+
+class EventStats:
+    __slots__ = ("count", "total", "max", "buckets", "calls", "max_calls", "items")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+        self.calls = 0
+        self.max_calls = 0
+        self.items = 0
+
+    def add(self, seconds, calls, items):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bucket_index(seconds)] += 1
+        self.calls += calls
+        self.max_calls = max(self.max_calls, calls)
+        self.items = items
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile sample,
+        # capped at the slowest sample actually seen.
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bucket_bound(index), self.max)
+        return self.max
+
+    def summary(self):
+        summary = {"count": self.count}
+        for p in PERCENTILES:
+            summary[f"p{p}_ms"] = self.percentile(p) * 1000
+        summary.update({
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "calls_mean": self.calls / self.count if self.count else 0.0,
+            "calls_max": self.max_calls,
+            "items": self.items,
+            "histogram": [[bucket_bound(i) * 1000, n] for i, n in enumerate(self.buckets) if n],
+        })
+        return summary
+
+
+class CountingTk:
+    # Stands in for a widget's Tcl interpreter and counts the commands sent
+    # through it; a batched script counts once, as it is one round trip.
+    def __init__(self, tk):
+        self._tk = tk
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return self._tk.call(*args)
+
+    def eval(self, script):
+        self.calls += 1
+        return self._tk.eval(script)
+
+    def __getattr__(self, name):
+        return getattr(self._tk, name)
+
+
+class Profiler:
+    def __init__(self, canvas, items=None):
+        self.canvas = canvas
+        self.items = items
+        self.events = {}
+        self.started = None
+        self._counter = None
+
+    @property
+    def enabled(self):
+        return _active is self
+
+    def enable(self):
+        global _active
+        if _active is not None and _active is not self:
+            _active.disable()
+        if self.started is None:
+            self.started = time.time()
+        # The headless canvas counts its own calls; a Tk one is counted by
+        # swapping in a CountingTk while profiling.
+        if not hasattr(self.canvas, "calls") and self._counter is None:
+            self._counter = CountingTk(self.canvas.tk)
+            self.canvas.tk = self._counter
+        _active = self
+
+    def disable(self):
+        global _active
+        if self._counter is not None:
+            self.canvas.tk = self._counter._tk
+            self._counter = None
+        if _active is self:
+            _active = None
+
+    def reset(self):
+        self.events = {}
+        self.started = time.time() if self.enabled else None
+
+    def _calls(self):
+        if self._counter is not None:
+            return self._counter.calls
+        return getattr(self.canvas, "calls", 0)
+
+    def measure(self, name, func, args, kwargs):
+        calls = self._calls()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = self.events.get(name)
+            if stats is None:
+                stats = self.events[name] = EventStats()
+            stats.add(elapsed, self._calls() - calls, self.items() if self.items else 0)
+
+    def stats(self, name=None):
+        if name is not None:
+            stats = self.events.get(name)
+            return stats.summary() if stats else None
+        return {name: stats.summary() for name, stats in sorted(self.events.items())}
+
+    def report(self):
+        import platform
+
+        return {
+            "meta": {
+                "python": platform.python_version(), "platform": platform.platform(),
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)) if self.started else None,
+                "seconds": time.time() - self.started if self.started else 0.0,
+            },
+            "events": self.stats(),
+        }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class StartupProfile:
+    # Wall-clock phases from `started` (taken before drawing_app's imports)
+    # to the first drawn frame, plus the costliest calls made after the
+    # imports. For the imports themselves, run with `python -X importtime`.
+    def __init__(self, started, hotspots=STARTUP_HOTSPOTS):
+        import cProfile
+
+        self.started = started
+        self.hotspots = hotspots
+        self._last = time.perf_counter()
+        self.phases = [("imports", (self._last - started) * 1000)]
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last) * 1000))
+        self._last = now
+
+    def report(self):
+        import pstats
+        import sys
+
+        rows = sorted(pstats.Stats(self._profile).stats.items(), key=lambda item: -item[1][3])
+        return {
+            "total_ms": (self._last - self.started) * 1000,
+            "phases": dict(self.phases),
+            "modules": len(sys.modules),
+            "hotspots": [
+                {"function": f"{path}:{line}({func})", "calls": calls, "cumulative_ms": cumulative * 1000}
+                for (path, line, func), (_, calls, _, cumulative, _) in rows[:self.hotspots]
+            ],
+        }
+
+    def finish(self, path=None):
+        self._profile.disable()
+        report = self.report()
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            return report
+        print(f"startup {report['total_ms']:.1f} ms, {report['modules']} modules loaded")
+        for phase, ms in report["phases"].items():
+            print(f"  {phase:<12} {ms:8.1f} ms")
+        for row in report["hotspots"]:
+            print(f"  {row['cumulative_ms']:8.1f} ms {row['calls']:6d}x  {row['function']}")
+        return report
+
+
+def hud_lines(profiler):
+    lines = [f"{'event':<12}{'n':>6}{'p50':>8}{'p95':>8}{'p99':>8}{'tcl':>6}"]
+    items = 0
+    for name in HUD_EVENTS:
+        stats = profiler.events.get(name)
+        if stats is None:
+            continue
+        items = max(items, stats.items)
+        p50, p95, p99 = (stats.percentile(p) * 1000 for p in PERCENTILES)
+        lines.append(f"{name[:12]:<12}{stats.count:>6}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}{stats.calls / stats.count:>6.1f}")
+    lines.append(f"items {items}  (ms, tcl calls per event)")
+    return lines
+
+
+class PerfHud:
+    # Text overlay in the canvas corner, redrawn every HUD_INTERVAL ms while
+    # shown. Its own canvas calls run outside any timed handler.
+    def __init__(self, canvas, profiler, interval=HUD_INTERVAL):
+        self.canvas = canvas
+        self.profiler = profiler
+        self.interval = interval
+        self.visible = False
+        # Whether show() turned the profiler on, so hide() turns it off
+        # again (but leaves it running if --profile started it).
+        self._enabled_profiler = False
+        self._after_id = None
+
+    def toggle(self):
+        if self.visible:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        if not self.profiler.enabled:
+            self.profiler.enable()
+            self._enabled_profiler = True
+        self.visible = True
+        self.refresh()
+
+    def hide(self):
+        self.visible = False
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
+        self.canvas.delete(HUD_TAG)
+        if self._enabled_profiler:
+            self.profiler.disable()
+            self._enabled_profiler = False
+
+    def refresh(self):
+        self._after_id = None
+        if not self.visible:
+            return
+        self.canvas.delete(HUD_TAG)
+        lines = hud_lines(self.profiler)
+        x, y = 8, 8
+        self.canvas.create_rectangle(
+            x - 4, y - 4, x + 7 * max(len(line) for line in lines) + 4, y + 14 * len(lines) + 4,
+            fill="black", outline="", tags=(HUD_TAG, SCREEN_TAG)
+        )
+        self.canvas.create_text(
+            x, y, text="\n".join(lines), anchor="nw", fill="lime", font=("TkFixedFont", 9), tags=(HUD_TAG, SCREEN_TAG)
+        )
+        self._after_id = self.canvas.after(self.interval, self.refresh)
@@ -0,0 +1,312 @@
+# File: raster.py
+
+import struct
+import zlib
+
+import numpy as np
+
+NAMED_COLORS = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0),
+    "green": (0, 128, 0), "lime": (0, 255, 0), "blue": (0, 0, 255),
+    "yellow": (255, 255, 0), "cyan": (0, 255, 255), "magenta": (255, 0, 255),
+    "gray": (128, 128, 128), "grey": (128, 128, 128), "orange": (255, 165, 0),
+    "purple": (128, 0, 128), "brown": (165, 42, 42), "pink": (255, 192, 203),
+}
+
+def parse_color(color, default=(0, 0, 0)):
+    if not color:
+        return None
+    color = color.strip().lower()
+    if color.startswith("#"):
+        digits = color[1:]
+        if len(digits) == 3:
+            return tuple(int(d * 2, 16) for d in digits)
+        if len(digits) == 6:
+            return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        if len(digits) == 12:
+            return tuple(int(digits[i:i + 4], 16) >> 8 for i in (0, 4, 8))
+        return default
+    return NAMED_COLORS.get(color, default)
+
+
+class Bitmap:
+    # 1-bit coverage mask, packed eight pixels per byte.
+    __slots__ = ("width", "height", "bits")
+
+    def __init__(self, width, height, bits):
+        self.width = width
+        self.height = height
+        self.bits = bits
+
+    @classmethod
+    def from_mask(cls, mask):
+        height, width = mask.shape
+        return cls(width, height, np.packbits(mask, axis=None).tobytes())
+
+    def to_mask(self):
+        flat = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8), count=self.width * self.height)
+        return flat.reshape(self.height, self.width).astype(bool)
+
+    def contains(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        index = y * self.width + x
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+
+def new_buffer(width, height, background=(255, 255, 255), channels=3):
+    buf = np.zeros((height, width, channels), dtype=np.uint8)
+    if background is not None:
+        buf[..., :3] = background
+        if channels == 4:
+            buf[..., 3] = 255
+    return buf
+
+
+class RasterTarget:
+    # A window onto a pixel buffer: (ox, oy) is the document coordinate of
+    # pixel (0, 0) and `scale` maps document units to pixels.
+    __slots__ = ("buf", "ox", "oy", "scale")
+
+    def __init__(self, buf, ox, oy, scale):
+        self.buf = buf
+        self.ox = ox
+        self.oy = oy
+        self.scale = scale
+
+    def to_pixels(self, coords):
+        xy = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        return (xy[:, 0] - self.ox) * self.scale, (xy[:, 1] - self.oy) * self.scale
+
+    def clip(self, x1, y1, x2, y2):
+        h, w = self.buf.shape[:2]
+        return (
+            max(int(np.floor(x1)), 0), max(int(np.floor(y1)), 0),
+            min(int(np.ceil(x2)) + 1, w), min(int(np.ceil(y2)) + 1, h),
+        )
+
+    def paint(self, mask, x1, y1, rgb):
+        region = self.buf[y1:y1 + mask.shape[0], x1:x1 + mask.shape[1]]
+        region[mask, :3] = rgb
+        if region.shape[2] == 4:
+            region[mask, 3] = 255
+
+
+def _polygon_mask(target, xs, ys):
+    x1, y1, x2, y2 = target.clip(xs.min(), ys.min(), xs.max(), ys.max())
+    if x1 >= x2 or y1 >= y2:
+        return None, 0, 0
+    ex1, ey1 = xs, ys
+    ex2, ey2 = np.roll(xs, -1), np.roll(ys, -1)
+    mask = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+    px = np.arange(x1, x2) + 0.5
+    for row, py in enumerate(np.arange(y1, y2) + 0.5):
+        crossing = (ey1 > py) != (ey2 > py)
+        if not crossing.any():
+            continue
+        cx = ex1[crossing] + (py - ey1[crossing]) * (ex2[crossing] - ex1[crossing]) / (ey2[crossing] - ey1[crossing])
+        cx.sort()
+        for a, b in zip(cx[::2], cx[1::2]):
+            mask[row, (px >= a) & (px < b)] = True
+    return mask, x1, y1
+
+def _stroke_mask(target, xs, ys, width, closed):
+    half = max(width * target.scale, 1) / 2
+    x1, y1, x2, y2 = target.clip(xs.min() - half, ys.min() - half, xs.max() + half, ys.max() + half)
+    if x1 >= x2 or y1 >= y2:
+        return None, 0, 0
+    mask = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+    if closed:
+        xs = np.append(xs, xs[0])
+        ys = np.append(ys, ys[0])
+    if len(xs) == 1:
+        xs = np.append(xs, xs[0])
+        ys = np.append(ys, ys[0])
+    for i in range(len(xs) - 1):
+        ax, ay, bx, by = xs[i], ys[i], xs[i + 1], ys[i + 1]
+        sx1, sy1, sx2, sy2 = target.clip(min(ax, bx) - half, min(ay, by) - half, max(ax, bx) + half, max(ay, by) + half)
+        if sx1 >= sx2 or sy1 >= sy2:
+            continue
+        px = np.arange(sx1, sx2) + 0.5
+        py = (np.arange(sy1, sy2) + 0.5)[:, None]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            t = 0.0
+        else:
+            t = np.clip(((px - ax) * dx + (py - ay) * dy) / length_sq, 0, 1)
+        dist_sq = (ax + t * dx - px) ** 2 + (ay + t * dy - py) ** 2
+        mask[sy1 - y1:sy2 - y1, sx1 - x1:sx2 - x1] |= dist_sq <= half * half
+    return mask, x1, y1
+
+def _ellipse_mask(target, xs, ys, inset=0.0):
+    cx, cy = (xs[0] + xs[1]) / 2, (ys[0] + ys[1]) / 2
+    rx, ry = abs(xs[1] - xs[0]) / 2 - inset, abs(ys[1] - ys[0]) / 2 - inset
+    if rx <= 0 or ry <= 0:
+        return None, 0, 0
+    x1, y1, x2, y2 = target.clip(cx - rx, cy - ry, cx + rx, cy + ry)
+    if x1 >= x2 or y1 >= y2:
+        return None, 0, 0
+    px = (np.arange(x1, x2) + 0.5 - cx) / rx
+    py = ((np.arange(y1, y2) + 0.5 - cy) / ry)[:, None]
+    return px * px + py * py <= 1, x1, y1
+
+def draw_record(target, kind, coords, fill, outline, width, data=None):
+    xs, ys = target.to_pixels(coords)
+    if len(xs) == 0:
+        return
+    fill_rgb = parse_color(fill)
+    outline_rgb = parse_color(outline)
+    line_width = max(width, 1)
+
+    if kind == "image":
+        if data is None or fill_rgb is None:
+            return
+        mask = data.to_mask()
+        if target.scale != 1:
+            rows = (np.arange(int(mask.shape[0] * target.scale)) / target.scale).astype(int)
+            cols = (np.arange(int(mask.shape[1] * target.scale)) / target.scale).astype(int)
+            mask = mask[rows][:, cols]
+        x1, y1 = int(round(xs[0])), int(round(ys[0]))
+        h, w = target.buf.shape[:2]
+        cx1, cy1 = max(x1, 0), max(y1, 0)
+        cx2, cy2 = min(x1 + mask.shape[1], w), min(y1 + mask.shape[0], h)
+        if cx1 < cx2 and cy1 < cy2:
+            target.paint(mask[cy1 - y1:cy2 - y1, cx1 - x1:cx2 - x1], cx1, cy1, fill_rgb)
+        return
+
+    if kind == "line":
+        if fill_rgb is not None:
+            mask, x1, y1 = _stroke_mask(target, xs, ys, line_width, closed=False)
+            if mask is not None:
+                target.paint(mask, x1, y1, fill_rgb)
+        return
+
+    if kind == "rectangle":
+        xs = np.array([xs.min(), xs.max(), xs.max(), xs.min()])
+        ys = np.array([ys.min(), ys.min(), ys.max(), ys.max()])
+
+    if fill_rgb is not None:
+        if kind == "oval":
+            mask, x1, y1 = _ellipse_mask(target, xs, ys)
+        else:
+            mask, x1, y1 = _polygon_mask(target, xs, ys)
+        if mask is not None:
+            target.paint(mask, x1, y1, fill_rgb)
+    if outline_rgb is not None:
+        if kind == "oval":
+            outer, ox1, oy1 = _ellipse_mask(target, xs, ys, -line_width * target.scale / 2)
+            inner, ix1, iy1 = _ellipse_mask(target, xs, ys, line_width * target.scale / 2)
+            if outer is not None:
+                if inner is not None:
+                    outer[iy1 - oy1:iy1 - oy1 + inner.shape[0], ix1 - ox1:ix1 - ox1 + inner.shape[1]] &= ~inner
+                target.paint(outer, ox1, oy1, outline_rgb)
+        else:
+            mask, x1, y1 = _stroke_mask(target, xs, ys, line_width, closed=True)
+            if mask is not None:
+                target.paint(mask, x1, y1, outline_rgb)
+
+def rasterize(records, x0, y0, width, height, scale=1.0, background=(255, 255, 255), channels=3, base=None):
+    # `records` yields (kind, coords, fill, outline, width, data) tuples in
+    # stacking order; see snapshot_records. `base`, when given, is drawn
+    # into instead of a fresh background-filled buffer.
+    buf = base if base is not None else new_buffer(width, height, background, channels)
+    target = RasterTarget(buf, x0, y0, scale)
+    for record in records:
+        draw_record(target, *record)
+    return buf
+
+def snapshot_records(scene, bbox=None, layers=None):
+    # Plain tuples with copied coordinates, safe to hand to another thread
+    # or process while the scene keeps changing. `layers` restricts the
+    # snapshot to records on those layer ids.
+    if bbox is None:
+        shape_ids = sorted(record.id for record in scene)
+    else:
+        shape_ids = scene.shapes_in(*bbox)
+    snapshot = []
+    for shape_id in shape_ids:
+        record = scene.get(shape_id)
+        if layers is not None and record.layer not in layers:
+            continue
+        kind, coords = record.drawn()
+        snapshot.append((kind, list(coords), record.fill, record.outline, record.width, record.data))
+    return snapshot
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def _png_chunk(tag, data):
+    body = tag + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xffffffff)
+
+def _png_header(width, height, channels):
+    color_type = {3: 2, 4: 6}[channels]
+    return _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+
+def _png_rows(pixels):
+    height, width, channels = pixels.shape
+    raw = np.empty((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = pixels.reshape(height, width * channels)
+    return raw.tobytes()
+
+def encode_png(pixels, compression=6):
+    height, width, channels = pixels.shape
+    return (
+        PNG_SIGNATURE
+        + _png_header(width, height, channels)
+        + _png_chunk(b"IDAT", zlib.compress(_png_rows(pixels), compression))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+class PngWriter:
+    # Writes a PNG band by band, so the whole image never has to be in
+    # memory at once.
+    IDAT_SIZE = 1 << 16
+
+    def __init__(self, f, width, height, channels=3, compression=6):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._compressor = zlib.compressobj(compression)
+        self._pending = []
+        self._pending_size = 0
+        f.write(PNG_SIGNATURE + _png_header(width, height, channels))
+
+    def write_rows(self, pixels):
+        if pixels.shape[1] != self.width:
+            raise ValueError(f"band is {pixels.shape[1]} pixels wide, expected {self.width}")
+        self.rows += pixels.shape[0]
+        self._emit(self._compressor.compress(_png_rows(pixels)))
+
+    def _emit(self, data, final=False):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= self.IDAT_SIZE or (final and self._pending):
+            self.f.write(_png_chunk(b"IDAT", b"".join(self._pending)))
+            self._pending = []
+            self._pending_size = 0
+
+    def close(self):
+        if self.rows != self.height:
+            raise ValueError(f"wrote {self.rows} of {self.height} rows")
+        self._emit(self._compressor.flush(), final=True)
+        self.f.write(_png_chunk(b"IEND", b""))
+
+def mask_to_rgba(mask, rgb):
+    pixels = np.zeros(mask.shape + (4,), dtype=np.uint8)
+    pixels[mask, :3] = rgb
+    pixels[mask, 3] = 255
+    return pixels
+
+def resample(pixels, zoom):
+    # Nearest-neighbour scaling of a mask or pixel array for on-screen zoom.
+    if zoom == 1:
+        return pixels
+    height, width = pixels.shape[:2]
+    rows = np.minimum((np.arange(max(1, round(height * zoom))) / zoom).astype(np.intp), height - 1)
+    cols = np.minimum((np.arange(max(1, round(width * zoom))) / zoom).astype(np.intp), width - 1)
+    return pixels[rows[:, None], cols]
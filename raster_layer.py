@@ -0,0 +1,356 @@
+# File: raster_layer.py
+
+import base64
+import math
+import tkinter as tk
+
+import numpy as np
+
+from raster import RasterTarget, draw_record, encode_png, parse_color, resample
+from undo_utils import ENTRY_OVERHEAD, record_nbytes, restore_records
+from viewport import SCREEN_TAG
+
+TILE_SIZE = 256
+# The framebuffer grows to follow painting across the unbounded canvas,
+# up to this many pixels a side (256 MiB of RGBA).
+MAX_RASTER_SIDE = 8192
+BOUNDS_FLASH_MS = 1500
+
+
+class RasterLayer:
+    # RGBA framebuffer under the vector items. Drawing marks the tiles it
+    # touched; flush() re-uploads only those tiles to their PhotoImages.
+    # Pixels are in document coordinates, pixels[0, 0] being document point
+    # `origin`; with a viewport, tiles are placed and scaled through it.
+    # Tiles are keyed by document position, so growing the buffer (always
+    # by whole tiles) leaves existing tiles, items and undo entries valid.
+    def __init__(self, canvas, width, height, tile_size=TILE_SIZE, scheduler=None, viewport=None):
+        self.canvas = canvas
+        self.tile_size = tile_size
+        self.scheduler = scheduler
+        self.viewport = viewport
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        self.origin = (0, 0)
+        self.dirty = set()
+        self._items = {}
+        self._photos = {}
+        self._bounds_item = None
+        self.uploads = 0
+
+    @property
+    def width(self):
+        return self.pixels.shape[1]
+
+    @property
+    def height(self):
+        return self.pixels.shape[0]
+
+    def extent(self):
+        ox, oy = self.origin
+        return ox, oy, ox + self.width, oy + self.height
+
+    def tiles_in(self, x1, y1, x2, y2):
+        size = self.tile_size
+        ox, oy, ex, ey = self.extent()
+        tx1 = max(math.floor(x1) // size, ox // size)
+        ty1 = max(math.floor(y1) // size, oy // size)
+        tx2 = min(math.ceil(x2) // size, (ex - 1) // size)
+        ty2 = min(math.ceil(y2) // size, (ey - 1) // size)
+        return [(tx, ty) for ty in range(ty1, ty2 + 1) for tx in range(tx1, tx2 + 1)]
+
+    def tile_view(self, tile):
+        size = self.tile_size
+        tx, ty = tile
+        x, y = tx * size - self.origin[0], ty * size - self.origin[1]
+        return self.pixels[y:y + size, x:x + size]
+
+    def grow(self, x1, y1, x2, y2):
+        # Widens the buffer by whole tiles to cover (x1, y1, x2, y2). Past
+        # MAX_RASTER_SIDE it stays as it is, painting is clipped to it and
+        # its edge is flashed on the canvas; returns False then.
+        ox, oy, ex, ey = self.extent()
+        if x1 >= ox and y1 >= oy and x2 <= ex and y2 <= ey:
+            return True
+        size = self.tile_size
+        nx1 = min(ox, math.floor(x1) // size * size)
+        ny1 = min(oy, math.floor(y1) // size * size)
+        nx2 = max(ex, -(-math.ceil(x2) // size) * size)
+        ny2 = max(ey, -(-math.ceil(y2) // size) * size)
+        if nx2 - nx1 > MAX_RASTER_SIDE or ny2 - ny1 > MAX_RASTER_SIDE:
+            self.show_bounds()
+            return False
+        pixels = np.zeros((ny2 - ny1, nx2 - nx1, 4), dtype=np.uint8)
+        pixels[oy - ny1:ey - ny1, ox - nx1:ex - nx1] = self.pixels
+        self.pixels = pixels
+        self.origin = (nx1, ny1)
+        return True
+
+    def show_bounds(self):
+        x1, y1, x2, y2 = self.extent()
+        if self.viewport is not None:
+            x1, y1 = self.viewport.to_screen(x1, y1)
+            x2, y2 = self.viewport.to_screen(x2, y2)
+        if self._bounds_item is not None:
+            self.canvas.delete(self._bounds_item)
+        item = self._bounds_item = self.canvas.create_rectangle(
+            x1, y1, x2, y2, outline="red", dash=(6, 4), width=2, tags=("raster_bounds", SCREEN_TAG)
+        )
+        self.canvas.after(BOUNDS_FLASH_MS, lambda: self._hide_bounds(item))
+
+    def _hide_bounds(self, item):
+        self.canvas.delete(item)
+        if self._bounds_item == item:
+            self._bounds_item = None
+
+    def mark_dirty(self, x1, y1, x2, y2):
+        self.dirty.update(self.tiles_in(x1, y1, x2, y2))
+        if self.scheduler is not None:
+            self.scheduler.request("raster", self.flush)
+
+    def draw(self, kind, coords, fill, outline="", width=1, data=None):
+        xs = coords[::2]
+        ys = coords[1::2]
+        pad = width / 2 + 1
+        self.grow(min(xs), min(ys), max(xs), max(ys))
+        draw_record(RasterTarget(self.pixels, *self.origin, 1.0), kind, coords, fill, outline, width, data)
+        self.mark_dirty(min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def erase_circle(self, cx, cy, radius):
+        ox, oy, ex, ey = self.extent()
+        x1 = max(math.floor(cx - radius), ox)
+        y1 = max(math.floor(cy - radius), oy)
+        x2 = min(math.floor(cx + radius) + 1, ex)
+        y2 = min(math.floor(cy + radius) + 1, ey)
+        if x1 >= x2 or y1 >= y2:
+            return False
+        px = np.arange(x1, x2) + 0.5 - cx
+        py = (np.arange(y1, y2) + 0.5 - cy)[:, None]
+        inside = px * px + py * py <= radius * radius
+        region = self.pixels[y1 - oy:y2 - oy, x1 - ox:x2 - ox, 3]
+        if not region[inside].any():
+            return False
+        region[inside] = 0
+        self.mark_dirty(x1, y1, x2, y2)
+        return True
+
+    def fill_bitmap(self, bbox, bitmap, color):
+        rgb = parse_color(color)
+        x1, y1 = int(bbox[0]), int(bbox[1])
+        mask = bitmap.to_mask()
+        if rgb is not None:
+            self.grow(x1, y1, x1 + mask.shape[1], y1 + mask.shape[0])
+        ox, oy, ex, ey = self.extent()
+        cx1, cy1 = max(x1, ox), max(y1, oy)
+        cx2 = min(x1 + mask.shape[1], ex)
+        cy2 = min(y1 + mask.shape[0], ey)
+        if rgb is None or cx1 >= cx2 or cy1 >= cy2:
+            return
+        clipped = mask[cy1 - y1:cy2 - y1, cx1 - x1:cx2 - x1]
+        region = self.pixels[cy1 - oy:cy2 - oy, cx1 - ox:cx2 - ox]
+        region[clipped] = rgb + (255,)
+        self.mark_dirty(cx1, cy1, cx2, cy2)
+
+    def composite_rgb(self, x, y, width, height, background=(255, 255, 255)):
+        # The layer blended over the canvas background, as flood fill sees it.
+        out = np.empty((height, width, 3), dtype=np.uint8)
+        out[:] = background
+        ox, oy, ex, ey = self.extent()
+        x1, y1 = max(x, ox), max(y, oy)
+        x2, y2 = min(x + width, ex), min(y + height, ey)
+        if x1 < x2 and y1 < y2:
+            src = self.pixels[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+            alpha = src[..., 3:4].astype(np.uint16)
+            dst = out[y1 - y:y2 - y, x1 - x:x2 - x]
+            dst[:] = ((src[..., :3] * alpha + dst * (255 - alpha)) // 255).astype(np.uint8)
+        return out
+
+    def load(self, origin, pixels):
+        # Pastes saved pixels whose top-left is document point `origin`.
+        ox, oy = origin
+        height, width = pixels.shape[:2]
+        self.grow(ox, oy, ox + width, oy + height)
+        bx, by, ex, ey = self.extent()
+        x1, y1 = max(ox, bx), max(oy, by)
+        x2, y2 = min(ox + width, ex), min(oy + height, ey)
+        if x1 < x2 and y1 < y2:
+            self.pixels[y1 - by:y2 - by, x1 - bx:x2 - bx] = pixels[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+            self.mark_dirty(x1, y1, x2, y2)
+
+    def snapshot_tiles(self, tiles):
+        return {tile: self.tile_view(tile).copy() for tile in tiles}
+
+    def restore_tiles(self, saved):
+        for tile, pixels in saved.items():
+            self.tile_view(tile)[:] = pixels
+            self.dirty.add(tile)
+        if self.scheduler is not None:
+            self.scheduler.request("raster", self.flush)
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, set()
+        for tile in dirty:
+            self._upload(tile)
+
+    def _upload(self, tile):
+        pixels = self.tile_view(tile)
+        item = self._items.get(tile)
+        if not pixels[..., 3].any():
+            if item is not None:
+                self.canvas.itemconfig(item, state='hidden')
+            return
+        self.uploads += 1
+        zoom = 1.0 if self.viewport is None else self.viewport.zoom
+        data = base64.b64encode(encode_png(resample(pixels, zoom), 1)).decode("ascii")
+        photo = self._photos.get(tile)
+        if photo is None:
+            if hasattr(self.canvas, "tk"):
+                photo = tk.PhotoImage(master=self.canvas, data=data, format="png")
+            self._photos[tile] = photo
+        elif photo is not None:
+            photo.configure(data=data, format="png")
+        if item is None:
+            tx, ty = tile
+            x, y = tx * self.tile_size, ty * self.tile_size
+            if self.viewport is not None:
+                x, y = self.viewport.to_screen(x, y)
+            item = self.canvas.create_image(x, y, image=photo, anchor="nw", tags=("raster",))
+            self.canvas.tag_lower(item)
+            self._items[tile] = item
+        else:
+            self.canvas.itemconfig(item, state='normal')
+
+    def rescale(self):
+        # After a zoom every tile image is re-made at the new size.
+        for item in self._items.values():
+            self.canvas.delete(item)
+        self._items.clear()
+        self._photos.clear()
+        self.mark_dirty(*self.extent())
+
+    def clear(self):
+        self.pixels[:] = 0
+        for item in self._items.values():
+            self.canvas.delete(item)
+        self._items.clear()
+        self._photos.clear()
+        self.dirty.clear()
+
+
+class RasterAction:
+    # Undo entry holding the pre-edit pixels of every tile an operation
+    # touched; capture() is called before each edit, so a whole drag
+    # coalesces into one entry. Undo keeps the post-edit tiles for redo.
+    def __init__(self, layer):
+        self.layer = layer
+        self.before = {}
+        self.after = {}
+
+    def __bool__(self):
+        return bool(self.before)
+
+    def capture(self, x1, y1, x2, y2):
+        # Only tiles the buffer has; callers grow() it first to paint
+        # beyond its edge.
+        tiles = [tile for tile in self.layer.tiles_in(x1, y1, x2, y2) if tile not in self.before]
+        self.before.update(self.layer.snapshot_tiles(tiles))
+
+    def nbytes(self):
+        tiles = list(self.before.values()) + list(self.after.values())
+        return ENTRY_OVERHEAD + sum(pixels.nbytes for pixels in tiles)
+
+    def undo(self, app):
+        self.after = self.layer.snapshot_tiles(self.before)
+        self.layer.restore_tiles(self.before)
+
+    def redo(self, app):
+        self.layer.restore_tiles(self.after)
+        self.after = {}
+
+
+def enable_raster_layer(app):
+    if app.raster_layer is None:
+        width = int(app.canvas.cget("width"))
+        height = int(app.canvas.cget("height"))
+        app.raster_layer = RasterLayer(app.canvas, width, height, scheduler=app.scheduler, viewport=app.view.viewport)
+    return app.raster_layer
+
+def rasterize_stroke(app, points, color, width):
+    layer = app.raster_layer
+    xs = points[::2]
+    ys = points[1::2]
+    pad = width / 2 + 1
+    layer.grow(min(xs), min(ys), max(xs), max(ys))
+    action = RasterAction(layer)
+    action.capture(min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+    layer.draw("line", points, color, "", width)
+    app.undo_stack.push(action)
+    return action
+
+def rasterize_fill(app, bbox, bitmap, color):
+    app.raster_layer.grow(*bbox)
+    action = RasterAction(app.raster_layer)
+    action.capture(*bbox)
+    app.raster_layer.fill_bitmap(bbox, bitmap, color)
+    app.undo_stack.push(action)
+    return action
+
+
+class FlattenAction:
+    def __init__(self, records, raster_action):
+        self.records = records
+        self.raster_action = raster_action
+
+    def nbytes(self):
+        return sum(record_nbytes(record) for record in self.records) + self.raster_action.nbytes()
+
+    def undo(self, app):
+        self.raster_action.undo(app)
+        restore_records(app, self.records)
+
+    def redo(self, app):
+        self.raster_action.redo(app)
+        for record in self.records:
+            app.scene.remove(record.id)
+
+def flatten_blocker(scene):
+    # Why the active layer cannot be flattened, or None. The raster layer is
+    # composited under every vector layer, so only the bottom layer keeps
+    # its place in the stacking; the pixels carry no visibility, lock or
+    # opacity, so the layer must be editable and opaque.
+    layer = scene.layer(scene.active_layer)
+    if not scene.is_editable():
+        return "The active layer is hidden or locked."
+    if layer.id != scene.layers()[0].id:
+        return "Only the bottom layer can be flattened: the raster layer is drawn under all the others."
+    if layer.opacity < 1:
+        return "A layer with reduced opacity cannot be flattened."
+    return None
+
+def flatten_shapes(app, shape_ids=None):
+    # Burn the active layer's records (or those of `shape_ids` on it) into
+    # the raster layer and drop them from the scene, so redraw cost no
+    # longer grows with their item count.
+    scene = app.scene
+    if flatten_blocker(scene) is not None:
+        return None
+    if shape_ids is None:
+        shape_ids = sorted(record.id for record in scene)
+    shape_ids = [shape_id for shape_id in shape_ids if scene.get(shape_id).layer == scene.active_layer]
+    if not shape_ids:
+        return None
+    layer = enable_raster_layer(app)
+    raster_action = RasterAction(layer)
+    records = []
+    for shape_id in shape_ids:
+        record = app.scene.get(shape_id)
+        x1, y1, x2, y2 = record.bbox()
+        pad = record.width / 2 + 1
+        layer.grow(x1, y1, x2, y2)
+        raster_action.capture(x1 - pad, y1 - pad, x2 + pad, y2 + pad)
+        layer.draw(*record.drawn(), record.fill, record.outline, record.width, record.data)
+        records.append(record)
+    for record in records:
+        app.scene.remove(record.id)
+    action = FlattenAction(records, raster_action)
+    app.undo_stack.push(action)
+    return action
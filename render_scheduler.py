@@ -0,0 +1,84 @@
+# File: render_scheduler.py
+
+import time
+
+from profiler import timed
+
+TARGET_FPS = 60
+# Callbacks may request more work while a frame is flushing (a drag moves
+# shapes, which dirties the view); run a few passes so that lands in the
+# same frame instead of the next one.
+MAX_PASSES = 4
+
+
+class RenderScheduler:
+    def __init__(self, widget, fps=TARGET_FPS):
+        self.widget = widget
+        self._pending = {}
+        self._after_id = None
+        self._flushing = False
+        self._last_flush = 0.0
+        self.frames = 0
+        self.set_fps(fps)
+
+    def set_fps(self, fps):
+        if fps <= 0:
+            raise ValueError("Target FPS must be positive")
+        self.fps = fps
+        self.frame_interval = 1.0 / fps
+
+    def request(self, key, callback):
+        # Later requests for the same key replace earlier ones, so only the
+        # latest pointer state is rendered.
+        self._pending[key] = callback
+        if not self._flushing:
+            self._schedule()
+
+    def cancel(self, key):
+        self._pending.pop(key, None)
+        if not self._pending:
+            self._cancel_frame()
+
+    def pending(self, key=None):
+        if key is None:
+            return bool(self._pending)
+        return key in self._pending
+
+    def flush_now(self):
+        self._cancel_frame()
+        self.flush()
+
+    @timed("frame")
+    def flush(self):
+        self._flushing = True
+        try:
+            for _ in range(MAX_PASSES):
+                if not self._pending:
+                    break
+                pending, self._pending = self._pending, {}
+                for callback in pending.values():
+                    callback()
+        finally:
+            self._flushing = False
+            self._last_flush = time.perf_counter()
+            self.frames += 1
+        if self._pending:
+            self._schedule()
+
+    def _schedule(self):
+        if self._after_id is not None:
+            return
+        delay = self._last_flush + self.frame_interval - time.perf_counter()
+        if delay > 0:
+            self._after_id = self.widget.after(int(delay * 1000) or 1, self._on_frame)
+        else:
+            self._after_id = self.widget.after_idle(self._on_frame)
+
+    def _cancel_frame(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _on_frame(self):
+        self._after_id = None
+        self.flush()
@@ -0,0 +1,411 @@
+# File: scene_model.py
+
+import math
+from array import array
+
+from spatial_index import GridIndex, record_contains
+
+OVAL_SEGMENTS = 64
+# Kinds stored as two corners; once rotated they carry a record matrix.
+BOX_KINDS = ("rectangle", "oval")
+
+
+class ShapeRecord:
+    __slots__ = ("id", "kind", "coords", "fill", "outline", "width", "dash", "group", "data", "layer", "matrix", "_bbox")
+
+    def __init__(self, id, kind, coords, fill="", outline="black", width=1, dash=None, group=None, data=None, layer=0,
+                 matrix=None):
+        self.id = id
+        self.kind = kind
+        self.coords = coords
+        self.fill = fill
+        self.outline = outline
+        self.width = width
+        self.dash = dash
+        self.group = group
+        # Raster payload for "image" records (a raster.Bitmap); None otherwise.
+        self.data = data
+        self.layer = layer
+        # Rotated or sheared rectangles and ovals can't be expressed by their
+        # two corners alone; they keep the box in `coords` and the affine
+        # (a, b, c, d, e, f) that places it here. Pasted lines and polygons
+        # share the source's coords and are placed by a translation here.
+        # None for everything else.
+        self.matrix = matrix
+        self._bbox = None
+
+    def bbox(self):
+        if self._bbox is None:
+            if self.matrix is None or self.kind not in BOX_KINDS:
+                coords = self.drawn()[1]
+                xs = coords[::2]
+                ys = coords[1::2]
+                self._bbox = (min(xs), min(ys), max(xs), max(ys))
+            else:
+                a, b, c, d, e, f = self.matrix
+                x1, y1, x2, y2 = self.coords[:4]
+                cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+                rx, ry = abs(x2 - x1) / 2, abs(y2 - y1) / 2
+                if self.kind == "oval":
+                    hx, hy = math.hypot(a * rx, c * ry), math.hypot(b * rx, d * ry)
+                else:
+                    hx, hy = abs(a * rx) + abs(c * ry), abs(b * rx) + abs(d * ry)
+                px, py = a * cx + c * cy + e, b * cx + d * cy + f
+                self._bbox = (px - hx, py - hy, px + hx, py + hy)
+        return self._bbox
+
+    def outline_points(self, segments=OVAL_SEGMENTS):
+        # The transformed box or ellipse as a polygon, for drawing surfaces
+        # that can't rotate rectangles or ovals.
+        x1, y1, x2, y2 = self.coords[:4]
+        if self.kind == "oval":
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            rx, ry = (x2 - x1) / 2, (y2 - y1) / 2
+            step = 2 * math.pi / segments
+            points = [(cx + rx * math.cos(i * step), cy + ry * math.sin(i * step)) for i in range(segments)]
+        else:
+            points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        a, b, c, d, e, f = self.matrix or (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+        coords = []
+        for x, y in points:
+            coords.extend((a * x + c * y + e, b * x + d * y + f))
+        return coords
+
+    def drawn(self):
+        # The kind and document-space coords to draw: placed rectangles and
+        # ovals become polygons, placed lines and polygons keep their kind.
+        if self.matrix is None:
+            return self.kind, self.coords
+        if self.kind in BOX_KINDS:
+            return "polygon", self.outline_points()
+        a, b, c, d, e, f = self.matrix
+        coords = self.coords
+        placed = array('d', coords)
+        for i in range(0, len(coords), 2):
+            x, y = coords[i], coords[i + 1]
+            placed[i] = a * x + c * y + e
+            placed[i + 1] = b * x + d * y + f
+        return self.kind, placed
+
+    def style(self):
+        return {"fill": self.fill, "outline": self.outline, "width": self.width, "dash": self.dash}
+
+
+class Layer:
+    __slots__ = ("id", "name", "visible", "locked", "opacity")
+
+    def __init__(self, id, name, visible=True, locked=False, opacity=1.0):
+        self.id = id
+        self.name = name
+        self.visible = visible
+        self.locked = locked
+        self.opacity = opacity
+
+
+class TransformBatch:
+    # Stands in for the record in a "transform" event: many records changed
+    # geometry at once. `delta`, when given, is the one matrix that took all
+    # of them from their old geometry to the new.
+    __slots__ = ("shape_ids", "groups", "layers", "delta")
+
+    def __init__(self, shape_ids, groups, layers, delta=None):
+        self.shape_ids = shape_ids
+        self.groups = groups
+        self.layers = layers
+        self.delta = delta
+
+
+class Scene:
+    def __init__(self):
+        self._records = {}
+        self._groups = {}
+        self._next_id = 1
+        self._listeners = []
+        self._index = GridIndex()
+        # Ids whose index entries lag behind bulk geometry changes; brought
+        # up to date by the next query rather than on every drag frame.
+        self._stale = set()
+        self._reset_layers()
+
+    @property
+    def index(self):
+        if self._stale:
+            stale, self._stale = self._stale, set()
+            for shape_id in stale:
+                record = self._records.get(shape_id)
+                if record is not None:
+                    self._index.update(shape_id, record.bbox())
+        return self._index
+
+    def _reset_layers(self):
+        # Bottom-to-top stacking order; new records go into active_layer.
+        self._layers = [Layer(0, "Layer 1")]
+        self._next_layer_id = 1
+        self.active_layer = 0
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event, record):
+        for listener in self._listeners:
+            listener(event, record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, shape_id):
+        return shape_id in self._records
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def get(self, shape_id):
+        return self._records.get(shape_id)
+
+    def add(self, kind, coords, group=None, fill="", outline="black", width=1, dash=None, data=None, layer=None):
+        shape_id = self._next_id
+        self._next_id += 1
+        if group is None:
+            group = f"group_{shape_id}"
+        if layer is None:
+            layer = self.active_layer
+        return self._insert(ShapeRecord(shape_id, kind, array('d', coords), fill, outline, width, dash, group, data, layer))
+
+    def add_copy(self, source, dx=0.0, dy=0.0, group=None, layer=None):
+        # A copy of `source` moved by (dx, dy). Lines and polygons share the
+        # source's coords, placed by a matrix, until an edit gives them their
+        # own; bitmaps are always shared.
+        shape_id = self._next_id
+        self._next_id += 1
+        if group is None:
+            group = f"group_{shape_id}"
+        if layer is None:
+            layer = self.active_layer
+        a, b, c, d, e, f = source.matrix or (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+        matrix = None if source.matrix is None and not (dx or dy) else (a, b, c, d, e + dx, f + dy)
+        coords = source.coords
+        if source.kind not in ("line", "polygon") and source.matrix is None:
+            coords = array('d', coords)
+            for i in range(0, len(coords), 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+            matrix = None
+        return self._insert(ShapeRecord(
+            shape_id, source.kind, coords, source.fill, source.outline, source.width, source.dash, group,
+            source.data, layer, matrix,
+        ))
+
+    def _insert(self, record):
+        self._records[record.id] = record
+        self._groups.setdefault(record.group, []).append(record.id)
+        self._index.insert(record.id, record.bbox())
+        self._notify("add", record)
+        return record.id
+
+    def reserve_ids(self, next_id):
+        # Keep new shapes clear of ids a document loader has yet to restore.
+        self._next_id = max(self._next_id, next_id)
+
+    def restore(self, record):
+        # Re-insert a previously removed record under its original id so
+        # stacking order and group membership come back unchanged.
+        if self.layer(record.layer) is None:
+            record.layer = self.active_layer
+        self._records[record.id] = record
+        members = self._groups.setdefault(record.group, [])
+        members.append(record.id)
+        members.sort()
+        self._next_id = max(self._next_id, record.id + 1)
+        self._index.insert(record.id, record.bbox())
+        self._notify("add", record)
+        return record.id
+
+    def remove(self, shape_id):
+        record = self._records.pop(shape_id, None)
+        if record is None:
+            return None
+        self._index.remove(shape_id)
+        self._stale.discard(shape_id)
+        members = self._groups.get(record.group)
+        if members is not None:
+            members.remove(shape_id)
+            if not members:
+                del self._groups[record.group]
+        self._notify("remove", record)
+        return record
+
+    def clear(self):
+        self._records.clear()
+        self._groups.clear()
+        self._index.clear()
+        self._stale.clear()
+        self._reset_layers()
+        self._notify("clear", None)
+
+    def coords(self, shape_id):
+        return self._records[shape_id].coords
+
+    def set_coords(self, shape_id, coords, matrix=None):
+        record = self._records[shape_id]
+        record.coords = array('d', coords)
+        record.matrix = matrix
+        record._bbox = None
+        self._index.update(shape_id, record.bbox())
+        self._notify("update", record)
+
+    def set_geometry(self, changes, groups=(), delta=None):
+        # Bulk set_coords over (shape_id, coords, matrix) triples, announced
+        # as a single "transform" event.
+        shape_ids = []
+        layers = set()
+        for shape_id, coords, matrix in changes:
+            record = self._records[shape_id]
+            record.coords = array('d', coords)
+            record.matrix = matrix
+            record._bbox = None
+            shape_ids.append(shape_id)
+            layers.add(record.layer)
+        if shape_ids:
+            self._stale.update(shape_ids)
+            self._notify("transform", TransformBatch(shape_ids, tuple(groups), layers, delta))
+
+    def move(self, shape_id, dx, dy):
+        record = self._records[shape_id]
+        if record.matrix is not None:
+            a, b, c, d, e, f = record.matrix
+            record.matrix = (a, b, c, d, e + dx, f + dy)
+        else:
+            # Coords may be shared with pasted copies, so move a fresh array.
+            coords = array('d', record.coords)
+            for i in range(0, len(coords), 2):
+                coords[i] += dx
+                coords[i + 1] += dy
+            record.coords = coords
+        if record._bbox is not None:
+            x1, y1, x2, y2 = record._bbox
+            record._bbox = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+        self._index.update(shape_id, record.bbox())
+        self._notify("update", record)
+
+    def set_style(self, shape_id, **style):
+        record = self._records[shape_id]
+        for name, value in style.items():
+            setattr(record, name, value)
+        self._notify("style", record)
+
+    def shapes_in(self, x1, y1, x2, y2):
+        return sorted(self.index.query_rect(x1, y1, x2, y2))
+
+    def shapes_at(self, x, y, tolerance=0, layer=None):
+        records = self._records
+        return [
+            shape_id for shape_id in sorted(self.index.query_point(x, y, tolerance))
+            if (layer is None or records[shape_id].layer == layer)
+            and record_contains(records[shape_id], x, y, tolerance)
+        ]
+
+    def topmost_at(self, x, y, tolerance=0, layer=None):
+        hits = self.shapes_at(x, y, tolerance, layer)
+        return hits[-1] if hits else None
+
+    def groups(self):
+        return list(self._groups)
+
+    def group_members(self, group):
+        return list(self._groups.get(group, ()))
+
+    def has_group(self, group):
+        return group in self._groups
+
+    def move_group(self, group, dx, dy):
+        for shape_id in self._groups.get(group, ()):
+            self.move(shape_id, dx, dy)
+
+    def remove_group(self, group):
+        return [self.remove(shape_id) for shape_id in self.group_members(group)]
+
+    def group_bbox(self, group):
+        members = self._groups.get(group)
+        if not members:
+            return None
+        boxes = [self._records[shape_id].bbox() for shape_id in members]
+        return (
+            min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes),
+        )
+
+    # Layers. Structural changes are announced as a "layers" event with the
+    # affected Layer in place of a record.
+    def layers(self):
+        return list(self._layers)
+
+    def layer(self, layer_id):
+        for layer in self._layers:
+            if layer.id == layer_id:
+                return layer
+        return None
+
+    def layer_position(self, layer_id):
+        for position, layer in enumerate(self._layers):
+            if layer.id == layer_id:
+                return position
+        raise KeyError(layer_id)
+
+    def layer_members(self, layer_id):
+        return sorted(record.id for record in self._records.values() if record.layer == layer_id)
+
+    def set_layers(self, layers, active_layer):
+        self._layers = list(layers)
+        self._next_layer_id = max(layer.id for layer in self._layers) + 1
+        self.active_layer = active_layer
+        self._notify("layers", self.layer(active_layer))
+
+    def add_layer(self, name=None):
+        layer = Layer(self._next_layer_id, name or f"Layer {self._next_layer_id + 1}")
+        self._next_layer_id += 1
+        self._layers.insert(self.layer_position(self.active_layer) + 1, layer)
+        self.active_layer = layer.id
+        self._notify("layers", layer)
+        return layer.id
+
+    def remove_layer(self, layer_id):
+        if len(self._layers) == 1:
+            return False
+        position = self.layer_position(layer_id)
+        for shape_id in self.layer_members(layer_id):
+            self.remove(shape_id)
+        layer = self._layers.pop(position)
+        if self.active_layer == layer_id:
+            self.active_layer = self._layers[max(position - 1, 0)].id
+        self._notify("layers", layer)
+        return True
+
+    def move_layer(self, layer_id, position):
+        layer = self._layers.pop(self.layer_position(layer_id))
+        self._layers.insert(max(0, min(position, len(self._layers))), layer)
+        self._notify("layers", layer)
+
+    def set_active_layer(self, layer_id):
+        layer = self.layer(layer_id)
+        if layer is None or layer_id == self.active_layer:
+            return
+        self.active_layer = layer_id
+        self._notify("layers", layer)
+
+    def set_layer(self, layer_id, **props):
+        layer = self.layer(layer_id)
+        for name, value in props.items():
+            setattr(layer, name, value)
+        self._notify("layers", layer)
+
+    def is_editable(self, layer_id=None):
+        layer = self.layer(self.active_layer if layer_id is None else layer_id)
+        return layer is not None and layer.visible and not layer.locked
+
+
+def bbox_corners(bbox):
+    x1, y1, x2, y2 = bbox
+    return [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
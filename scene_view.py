@@ -0,0 +1,765 @@
+# File: scene_view.py
+
+import base64
+import tkinter as tk
+from bisect import bisect_left
+
+from scene_model import BOX_KINDS, bbox_corners
+from spatial_index import GridIndex
+from strokes import simplify
+from viewport import SCREEN_TAG, contains, lod_level
+
+HANDLE_RADIUS = 5
+SELECTED_WIDTH = 3
+SELECTED_DASH = (2, 2)
+# Carried by every item (and hidden decoration) of a multi-selection, so the
+# whole selection moves or scales with one canvas call.
+SELECTED_TAG = "selected"
+# Each tag lookup scans every canvas item, so only a few groups are moved
+# by their own tags; more than that are synced item by item.
+TAG_MOVE_GROUPS = 8
+# Zoomed out, shapes smaller than this many pixels are not drawn at all and
+# strokes/polygons with more than LOD_POINTS points are simplified to within
+# LOD_TOLERANCE pixels.
+LOD_MIN_PIXELS = 1.0
+LOD_POINTS = 8
+LOD_TOLERANCE = 0.5
+
+
+def _tcl_word(value):
+    if isinstance(value, (tuple, list)):
+        return "{" + " ".join(_tcl_word(part) for part in value) + "}"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "{" + str(value) + "}"
+
+
+class CanvasBatch:
+    # Queues canvas commands and hands them to Tcl as one script, instead of
+    # one interpreter round trip per item. Canvases without an interpreter
+    # (the headless stand-in) get the calls directly.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._script = [] if hasattr(canvas, "tk") else None
+        self._path = str(canvas)
+
+    def coords(self, item, coords):
+        if self._script is None:
+            self.canvas.coords(item, *coords)
+        else:
+            self._script.append(f"{self._path} coords {item} " + " ".join(repr(float(v)) for v in coords))
+
+    def itemconfig(self, tag_or_id, **options):
+        if self._script is None:
+            self.canvas.itemconfig(tag_or_id, **options)
+        else:
+            words = [self._path, "itemconfigure", _tcl_word(tag_or_id)]
+            for name, value in options.items():
+                words.append(f"-{name} {_tcl_word(value)}")
+            self._script.append(" ".join(words))
+
+    def _each(self, items, command):
+        self._script.append(f"foreach i {{{' '.join(str(item) for item in items)}}} {{{self._path} {command}}}")
+
+    def itemconfig_items(self, items, **options):
+        if not items:
+            return
+        if self._script is None:
+            for item in items:
+                self.canvas.itemconfig(item, **options)
+        else:
+            self._each(items, "itemconfigure $i " + " ".join(f"-{name} {_tcl_word(value)}" for name, value in options.items()))
+
+    def addtag_items(self, tag, items):
+        if not items:
+            return
+        if self._script is None:
+            for item in items:
+                self.canvas.addtag_withtag(tag, item)
+        else:
+            self._each(items, f"addtag {_tcl_word(tag)} withtag $i")
+
+    def dtag_items(self, items, tag):
+        if not items:
+            return
+        if self._script is None:
+            for item in items:
+                self.canvas.dtag(item, tag)
+        else:
+            self._each(items, f"dtag $i {_tcl_word(tag)}")
+
+    def delete(self, items):
+        if not items:
+            return
+        if self._script is None:
+            self.canvas.delete(*items)
+        else:
+            self._script.append(f"{self._path} delete " + " ".join(str(item) for item in items))
+
+    def send(self):
+        if self._script:
+            script, self._script = "\n".join(self._script), []
+            self.canvas.tk.eval(script)
+
+
+class SceneView:
+    def __init__(self, canvas, scene, scheduler=None, viewport=None):
+        self.canvas = canvas
+        self.scene = scene
+        self.scheduler = scheduler
+        # With a viewport, items are drawn in window pixels and only records
+        # inside `region` (the viewport plus a margin) have canvas items.
+        self.viewport = viewport
+        self.region = viewport.region() if viewport is not None else None
+        self._stale_region = False
+        # Simplified coords per shape for the current level of detail.
+        self._lod = {}
+        self._dirty_shapes = set()
+        self._dirty_styles = set()
+        self._dirty_groups = set()
+        # Items already unlinked from their records, deleted on the next flush.
+        self._doomed = []
+        self._items = {}
+        self._shapes = {}
+        # Ids with live items in stacking order, for placing restored records.
+        self._order = []
+        # Rotated rectangles and ovals, drawn as polygon items.
+        self._outlined = set()
+        self._photos = {}
+        self.bbox_rects = {}
+        self.handles = {}
+        self.highlighted = set()
+        # With more than one group selected, per-group decorations are hidden
+        # (and only resynced once deselected) in favour of one selection box.
+        self.multi = False
+        self._stale_decorations = set()
+        self._selection_box = None
+        self._selection_bbox = None
+        self._selection_dirty = False
+        # With a layer compositor attached, only records on live_layer get
+        # canvas items and new items are stacked under `ceiling`.
+        self.live_layer = None
+        self.ceiling = None
+        # Only handles of highlighted groups are indexed for hover lookups.
+        self.handle_index = GridIndex(cell_size=32)
+        canvas.scene = scene
+        canvas.view = self
+        scene.subscribe(self._on_scene_change)
+
+    def item_for(self, shape_id):
+        return self._items.get(shape_id)
+
+    def shape_for(self, item):
+        return self._shapes.get(item)
+
+    @property
+    def zoom(self):
+        return 1.0 if self.viewport is None else self.viewport.zoom
+
+    def to_document(self, x, y):
+        # Window pixels (event.x, event.y) to document coordinates.
+        return (x, y) if self.viewport is None else self.viewport.to_document(x, y)
+
+    def to_screen(self, x, y):
+        return (x, y) if self.viewport is None else self.viewport.to_screen(x, y)
+
+    def item_count(self):
+        # Shape items plus decorations: a box and four handles per group.
+        return len(self._items) + 5 * len(self.bbox_rects) + (self._selection_box is not None)
+
+    def is_live(self, record):
+        return self.live_layer is None or record.layer == self.live_layer
+
+    def _wanted(self, record):
+        # Live records inside the region, unless too small to see.
+        if not self.is_live(record):
+            return False
+        if self.region is None:
+            return True
+        x1, y1, x2, y2 = record.bbox()
+        rx1, ry1, rx2, ry2 = self.region
+        if x1 > rx2 or x2 < rx1 or y1 > ry2 or y2 < ry1:
+            return False
+        zoom = self.viewport.zoom
+        return zoom >= 1 or max(x2 - x1, y2 - y1) * zoom >= LOD_MIN_PIXELS
+
+    def _item_coords(self, record):
+        # Canvas item kind and window coords, simplified when zoomed out.
+        kind, coords = record.drawn()
+        if self.viewport is None:
+            return kind, coords
+        level = lod_level(self.viewport.zoom)
+        if level and kind in ("line", "polygon") and len(coords) > 2 * LOD_POINTS:
+            cached = self._lod.get(record.id)
+            if cached is not None and cached[0] == level and cached[1] is record.coords and cached[2] is record.matrix:
+                coords = cached[3]
+            else:
+                coords = simplify(coords, LOD_TOLERANCE * 2 ** level)
+                self._lod[record.id] = (level, record.coords, record.matrix, coords)
+        return kind, self.viewport.screen_coords(coords)
+
+    def _screen_bbox(self, bbox):
+        return bbox if self.viewport is None else self.viewport.screen_bbox(bbox)
+
+    def _handle_boxes(self, bbox):
+        # Per corner: the handle's box in document space, for hover lookups,
+        # and on screen, where it keeps its size at any zoom.
+        r = HANDLE_RADIUS / self.zoom
+        for cx, cy in bbox_corners(bbox):
+            sx, sy = (cx, cy) if self.viewport is None else self.viewport.to_screen(cx, cy)
+            yield (
+                (cx - r, cy - r, cx + r, cy + r),
+                (sx - HANDLE_RADIUS, sy - HANDLE_RADIUS, sx + HANDLE_RADIUS, sy + HANDLE_RADIUS),
+            )
+
+    def _width(self, width):
+        return width if self.zoom == 1 else width * self.zoom
+
+    def _request_flush(self):
+        self.scheduler.request("view", self.flush)
+
+    def _on_scene_change(self, event, record):
+        if event == "add":
+            if self._wanted(record):
+                self._create_item(record)
+            self._selection_moved(record.group)
+        elif event == "update":
+            self._lod.pop(record.id, None)
+            self._mark_dirty((record.id,))
+            self._selection_moved(record.group)
+        elif event == "transform":
+            self._on_transform(record)
+        elif event == "style" and record.id in self._items:
+            # Shapes without an item pick up their style when one is made.
+            if self.scheduler is None:
+                batch = CanvasBatch(self.canvas)
+                self._sync_style(record.id, batch)
+                batch.send()
+            else:
+                self._dirty_styles.add(record.id)
+                self._request_flush()
+        elif event == "remove":
+            self._lod.pop(record.id, None)
+            self._delete_item(record.id)
+            selected = record.group in self.highlighted
+            if not self.scene.has_group(record.group):
+                self.remove_decorations(record.group)
+                self.highlighted.discard(record.group)
+            if selected:
+                self._selection_moved()
+        elif event == "clear":
+            self._drop_items()
+            self._lod.clear()
+
+    def _delete_item(self, shape_id):
+        item = self._items.pop(shape_id, None)
+        if item is None:
+            return
+        del self._order[bisect_left(self._order, shape_id)]
+        self._shapes.pop(item, None)
+        self._photos.pop(shape_id, None)
+        self._outlined.discard(shape_id)
+        if self.scheduler is None:
+            self.canvas.delete(item)
+        else:
+            # Deleting many shapes costs one canvas call per frame.
+            self._doomed.append(item)
+            self._request_flush()
+
+    def _drop_items(self):
+        for group in list(self.bbox_rects):
+            self.remove_decorations(group)
+        items = list(self._items.values()) + self._doomed
+        if items:
+            self.canvas.delete(*items)
+        self._items.clear()
+        self._shapes.clear()
+        self._photos.clear()
+        self._outlined.clear()
+        self._doomed.clear()
+        self._dirty_shapes.clear()
+        self._dirty_styles.clear()
+        self._dirty_groups.clear()
+        self._stale_decorations.clear()
+        self.highlighted.clear()
+        self.multi = False
+        self._selection_bbox = None
+        batch = CanvasBatch(self.canvas)
+        self._sync_selection_box(batch)
+        batch.send()
+        self.handle_index.clear()
+        self._order.clear()
+
+    def set_live_layer(self, layer_id):
+        # Swap the live items over to another layer; cost is proportional to
+        # that layer, not to the whole drawing.
+        self._drop_items()
+        self.live_layer = layer_id
+        groups = []
+        if self.region is None:
+            shape_ids = self.scene.layer_members(layer_id)
+        else:
+            shape_ids = self.scene.shapes_in(*self.region)
+        for shape_id in shape_ids:
+            record = self.scene.get(shape_id)
+            if not self._wanted(record):
+                continue
+            self._create_item(record)
+            if record.group not in groups:
+                groups.append(record.group)
+        for group in groups:
+            self.create_decorations(group)
+
+    def _mark_dirty(self, shape_ids):
+        if self.scheduler is None:
+            batch = CanvasBatch(self.canvas)
+            for shape_id in shape_ids:
+                self._sync_coords(shape_id, batch)
+            batch.send()
+        else:
+            self._dirty_shapes.update(shape_ids)
+            self._request_flush()
+
+    def _on_transform(self, batch):
+        delta = batch.delta
+        upright = delta is not None and delta[1] == 0 and delta[2] == 0
+        moved = False
+        selection = self.multi and set(batch.groups) == self.highlighted
+        if upright and (selection or 0 < len(batch.groups) <= TAG_MOVE_GROUPS):
+            # Whole groups under a scale + translate: let Tk move the items
+            # by tag rather than rewriting each one's coordinates.
+            # Scaling about the document origin's window position keeps
+            # window = (document - origin) * zoom.
+            a, _, _, d, e, f = delta
+            zoom = self.zoom
+            ox, oy = self._screen_bbox((0, 0, 0, 0))[:2]
+            for tag in (SELECTED_TAG,) if selection else batch.groups:
+                if a != 1 or d != 1:
+                    self.canvas.scale(tag, ox, oy, a, d)
+                if e or f:
+                    self.canvas.move(tag, e * zoom, f * zoom)
+            # The hidden decorations carry the selection tag too, so a plain
+            # move keeps them exact.
+            moved = selection and a == 1 and d == 1
+            if self.region is not None and not self._items.keys() >= set(batch.shape_ids) and any(
+                _overlaps(self.region, self.scene.group_bbox(group)) for group in batch.groups
+            ):
+                # Culled members may have moved into the region.
+                self._request_recull()
+        else:
+            self._mark_dirty(batch.shape_ids)
+        for group in batch.groups:
+            if self.multi and group in self.highlighted:
+                if not moved:
+                    self._stale_decorations.add(group)
+            else:
+                self.update_decorations(group)
+        if upright and self._selection_bbox is not None and set(batch.groups) == self.highlighted:
+            a, _, _, d, e, f = delta
+            x1, y1, x2, y2 = self._selection_bbox
+            xs = sorted((a * x1 + e, a * x2 + e))
+            ys = sorted((d * y1 + f, d * y2 + f))
+            self._selection_bbox = (xs[0], ys[0], xs[1], ys[1])
+            if self.multi:
+                self._update_selection_box()
+        elif not self.highlighted.isdisjoint(batch.groups) or not batch.groups:
+            self._selection_moved()
+
+    def _selection_moved(self, group=None):
+        if group is None or group in self.highlighted:
+            self._selection_bbox = None
+            if self.multi:
+                self._update_selection_box()
+
+    def _sync_coords(self, shape_id, batch):
+        item = self._items.get(shape_id)
+        record = self.scene.get(shape_id)
+        if item is None:
+            # Culled until now; it may have moved into the region.
+            if record is not None and self.region is not None and self._wanted(record):
+                self._create_item(record)
+            return
+        if (record.matrix is not None and record.kind in BOX_KINDS) != (shape_id in self._outlined):
+            # Tk can't turn an oval item into a polygon; swap the item.
+            self._delete_item(shape_id)
+            self._create_item(record)
+            return
+        if record.kind == "image":
+            batch.coords(item, self._screen(record.coords[:2]))
+        else:
+            batch.coords(item, self._item_coords(record)[1])
+
+    def _sync_style(self, shape_id, batch):
+        item = self._items.get(shape_id)
+        if item is None:
+            return
+        record = self.scene.get(shape_id)
+        if record.kind == "image":
+            photo = _bitmap_photo(self.canvas, record, self.zoom)
+            if photo is not None:
+                self._photos[shape_id] = photo
+                self.canvas.itemconfig(item, image=photo)
+            return
+        batch.itemconfig(item, **self._style(record))
+
+    def _screen(self, coords):
+        return coords if self.viewport is None else self.viewport.screen_coords(coords)
+
+    def _style(self, record):
+        style = _item_style(record, self.zoom)
+        if style and record.group in self.highlighted:
+            style.update(width=SELECTED_WIDTH, dash=SELECTED_DASH)
+        return style
+
+    def flush(self):
+        dirty_shapes, self._dirty_shapes = self._dirty_shapes, set()
+        dirty_styles, self._dirty_styles = self._dirty_styles, set()
+        dirty_groups, self._dirty_groups = self._dirty_groups, set()
+        doomed, self._doomed = self._doomed, []
+        batch = CanvasBatch(self.canvas)
+        for shape_id in dirty_shapes:
+            self._sync_coords(shape_id, batch)
+        for shape_id in dirty_styles:
+            self._sync_style(shape_id, batch)
+        for group in dirty_groups:
+            self._sync_decorations(group, batch)
+        if self._selection_dirty:
+            self._sync_selection_box(batch)
+        batch.delete(doomed)
+        batch.send()
+        if self._stale_region:
+            self._recull()
+
+    # Viewport changes. Panning moves every item with one canvas call and
+    # re-culls only once the window leaves the region; zooming recreates the
+    # visible items.
+    def set_view(self, zoom, x, y):
+        # Returns True when the region changed.
+        viewport = self.viewport
+        if zoom != viewport.zoom:
+            viewport.zoom, viewport.x, viewport.y = zoom, x, y
+            self._rebuild()
+            return True
+        dx, dy = (viewport.x - x) * zoom, (viewport.y - y) * zoom
+        viewport.x, viewport.y = x, y
+        if dx or dy:
+            self.canvas.move("all", dx, dy)
+            self.canvas.move(SCREEN_TAG, -dx, -dy)
+        if contains(self.region, viewport.visible_bbox()):
+            return False
+        self._recull()
+        return True
+
+    def _request_recull(self):
+        if self.scheduler is None:
+            self._recull()
+        else:
+            self._stale_region = True
+            self._request_flush()
+
+    def _recull(self):
+        # Cost follows what lies in the region, not the drawing's size.
+        self._stale_region = False
+        self.region = self.viewport.region()
+        scene = self.scene
+        wanted = [shape_id for shape_id in scene.shapes_in(*self.region) if self._wanted(scene.get(shape_id))]
+        keep = set(wanted)
+        gone = []
+        for shape_id in [shape_id for shape_id in self._items if shape_id not in keep]:
+            item = self._items.pop(shape_id)
+            self._shapes.pop(item, None)
+            self._photos.pop(shape_id, None)
+            self._outlined.discard(shape_id)
+            self._lod.pop(shape_id, None)
+            gone.append(item)
+        if gone:
+            self.canvas.delete(*gone)
+            self._order = [shape_id for shape_id in self._order if shape_id in self._items]
+        for shape_id in wanted:
+            if shape_id not in self._items:
+                self._create_item(scene.get(shape_id))
+
+    def _rebuild(self):
+        decorated = list(self.bbox_rects)
+        items = list(self._items.values()) + self._doomed
+        for group in decorated:
+            items.extend(self._decoration_items(group))
+        if self._selection_box is not None:
+            rect, handles = self._selection_box
+            items.extend([rect, *handles])
+            self._selection_box = None
+        if items:
+            self.canvas.delete(*items)
+        for collection in (
+            self._items, self._shapes, self._photos, self._outlined, self._lod, self._doomed, self._order,
+            self._dirty_shapes, self._dirty_styles, self._dirty_groups, self._stale_decorations,
+            self.bbox_rects, self.handles,
+        ):
+            collection.clear()
+        self.handle_index.clear()
+        self._recull()
+        for group in decorated:
+            if self.scene.has_group(group):
+                self.create_decorations(group)
+        batch = CanvasBatch(self.canvas)
+        self._sync_selection_box(batch)
+        batch.send()
+
+    def _create_item(self, record):
+        tags = (record.group, "movable")
+        if self.multi and record.group in self.highlighted:
+            tags += (SELECTED_TAG,)
+        if record.kind == "image":
+            photo = _bitmap_photo(self.canvas, record, self.zoom)
+            item = self.canvas.create_image(*self._screen(record.coords[:2]), image=photo, anchor="nw", tags=tags)
+            self._photos[record.id] = photo
+        else:
+            kind, coords = self._item_coords(record)
+            if kind != record.kind:
+                self._outlined.add(record.id)
+            create = getattr(self.canvas, f"create_{kind}")
+            item = create(list(coords), tags=tags, **self._style(record))
+        self._items[record.id] = item
+        self._shapes[item] = record.id
+        position = bisect_left(self._order, record.id)
+        self._order.insert(position, record.id)
+        if position + 1 < len(self._order):
+            # Restored records go back under everything created after them.
+            self.canvas.tag_lower(item, self._items[self._order[position + 1]])
+        elif self.ceiling is not None:
+            self.canvas.tag_lower(item, self.ceiling)
+
+    # Selection decorations (bbox rectangle + corner handles) are view-only
+    # items; they never live in the scene.
+    def create_decorations(self, group):
+        bbox = self.scene.group_bbox(group)
+        if bbox is None:
+            return
+        if self.live_layer is not None:
+            first = self.scene.get(self.scene.group_members(group)[0])
+            if not self.is_live(first):
+                return
+        self.remove_decorations(group)
+        selected = group in self.highlighted
+        tags = (f"decor_{group}",)
+        if selected and self.multi:
+            tags += (SELECTED_TAG,)
+        self.bbox_rects[group] = self.canvas.create_rectangle(
+            *self._screen_bbox(bbox), outline="blue", dash=(3, 3), tags=tags,
+            state='normal' if selected and not self.multi else 'hidden'
+        )
+        handles = []
+        for _, box in self._handle_boxes(bbox):
+            handle = self.canvas.create_oval(
+                *box, fill="blue", outline="black", tags=(f"handle_{group}",) + tags,
+                state='hidden' if selected and self.multi else 'normal'
+            )
+            handles.append(handle)
+        self.handles[group] = handles
+        if selected and not self.multi:
+            self._index_handles(group, True)
+
+    def update_decorations(self, group):
+        if self.multi and group in self.highlighted:
+            self._stale_decorations.add(group)
+        elif self.scheduler is None:
+            batch = CanvasBatch(self.canvas)
+            self._sync_decorations(group, batch)
+            batch.send()
+        else:
+            self._dirty_groups.add(group)
+            self._request_flush()
+
+    def _sync_decorations(self, group, batch):
+        self._stale_decorations.discard(group)
+        bbox = self.scene.group_bbox(group)
+        if bbox is None:
+            return
+        rect = self.bbox_rects.get(group)
+        if rect is not None:
+            batch.coords(rect, self._screen_bbox(bbox))
+        indexed = group in self.highlighted and not self.multi
+        for handle, (box, screen) in zip(self.handles.get(group, ()), self._handle_boxes(bbox)):
+            batch.coords(handle, screen)
+            if indexed:
+                self.handle_index.update(handle, box)
+
+    def remove_decorations(self, group):
+        self._stale_decorations.discard(group)
+        items = []
+        rect = self.bbox_rects.pop(group, None)
+        if rect is not None:
+            items.append(rect)
+        for handle in self.handles.pop(group, ()):
+            self.handle_index.remove(handle)
+            items.append(handle)
+        if not items:
+            return
+        if self.scheduler is None:
+            self.canvas.delete(*items)
+        else:
+            self._doomed.extend(items)
+            self._request_flush()
+
+    def _index_handles(self, group, indexed):
+        handles = self.handles.get(group, ())
+        if not indexed:
+            for handle in handles:
+                self.handle_index.remove(handle)
+            return
+        bbox = self.scene.group_bbox(group)
+        if bbox is None:
+            return
+        for handle, (box, _) in zip(handles, self._handle_boxes(bbox)):
+            self.handle_index.update(handle, box)
+
+    def handle_at(self, x, y):
+        hits = self.handle_index.query_point(x, y)
+        if not hits:
+            return None
+
+        def distance(handle):
+            x1, y1, x2, y2 = self.handle_index.bbox(handle)
+            return ((x1 + x2) / 2 - x) ** 2 + ((y1 + y2) / 2 - y) ** 2
+        return min(hits, key=distance)
+
+    def selection_bbox(self):
+        if self._selection_bbox is None:
+            boxes = [self.scene.group_bbox(group) for group in self.highlighted]
+            boxes = [box for box in boxes if box is not None]
+            if not boxes:
+                return None
+            self._selection_bbox = (
+                min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes),
+            )
+        return self._selection_bbox
+
+    def set_selection(self, groups):
+        # Tk resolves tags by scanning every item, so (de)highlighting goes
+        # by item id, collected across all groups into a few Tcl loops.
+        groups = {group for group in groups if self.scene.has_group(group)}
+        multi = len(groups) > 1
+        if multi != self.multi:
+            leaving, entering = self.highlighted, groups
+        else:
+            leaving, entering = self.highlighted - groups, groups - self.highlighted
+        batch = CanvasBatch(self.canvas)
+        tagged, untagged, shown, hidden = [], [], [], []
+        styles = {}
+        for group in leaving:
+            if self.multi:
+                untagged.extend(self._group_items(group))
+                untagged.extend(self._decoration_items(group))
+                if group in self._stale_decorations:
+                    self._sync_decorations(group, batch)
+                shown.extend(self.handles.get(group, ()))
+            else:
+                if group in self.bbox_rects:
+                    hidden.append(self.bbox_rects[group])
+                self._index_handles(group, False)
+            if group not in groups:
+                for record, item in self._styled_members(group):
+                    styles.setdefault((self._width(record.width), record.dash or ()), []).append(item)
+        for group in entering:
+            if group not in self.bbox_rects:
+                # Loaded documents skip decorations until first selected.
+                self.create_decorations(group)
+            elif group in self._stale_decorations and not multi:
+                self._sync_decorations(group, batch)
+            if multi:
+                tagged.extend(self._group_items(group))
+                tagged.extend(self._decoration_items(group))
+                hidden.extend(self.handles.get(group, ()))
+            else:
+                if group in self.bbox_rects:
+                    shown.append(self.bbox_rects[group])
+                self._index_handles(group, True)
+            styles.setdefault((SELECTED_WIDTH, SELECTED_DASH), []).extend(
+                item for _, item in self._styled_members(group)
+            )
+        batch.dtag_items(untagged, SELECTED_TAG)
+        batch.addtag_items(SELECTED_TAG, tagged)
+        batch.itemconfig_items(hidden, state='hidden')
+        batch.itemconfig_items(shown, state='normal')
+        for (width, dash), items in styles.items():
+            batch.itemconfig_items(items, width=width, dash=dash)
+        batch.send()
+        self.highlighted = groups
+        self.multi = multi
+        self._selection_bbox = None
+        self._update_selection_box()
+
+    def _group_items(self, group):
+        items = self._items
+        return [items[shape_id] for shape_id in self.scene.group_members(group) if shape_id in items]
+
+    def _decoration_items(self, group):
+        rect = self.bbox_rects.get(group)
+        return ([rect] if rect is not None else []) + list(self.handles.get(group, ()))
+
+    def _styled_members(self, group):
+        # Image items take no width/dash.
+        for shape_id in self.scene.group_members(group):
+            item = self._items.get(shape_id)
+            record = self.scene.get(shape_id)
+            if item is not None and record.kind != "image":
+                yield record, item
+
+    def _update_selection_box(self):
+        if self.scheduler is None:
+            batch = CanvasBatch(self.canvas)
+            self._sync_selection_box(batch)
+            batch.send()
+        else:
+            self._selection_dirty = True
+            self._request_flush()
+
+    def _sync_selection_box(self, batch):
+        # One box and set of corner handles around a multi-selection.
+        self._selection_dirty = False
+        bbox = self.selection_bbox() if self.multi else None
+        if bbox is None:
+            if self._selection_box is not None:
+                rect, handles = self._selection_box
+                for handle in handles:
+                    self.handle_index.remove(handle)
+                batch.delete([rect, *handles])
+                self._selection_box = None
+            return
+        if self._selection_box is None:
+            rect = self.canvas.create_rectangle(*self._screen_bbox(bbox), outline="blue", dash=(3, 3), tags=("selection_box",))
+            handles = [
+                self.canvas.create_oval(0, 0, 0, 0, fill="blue", outline="black", tags=("selection_box",))
+                for _ in range(4)
+            ]
+            self._selection_box = (rect, handles)
+        rect, handles = self._selection_box
+        batch.coords(rect, self._screen_bbox(bbox))
+        for handle, (box, screen) in zip(handles, self._handle_boxes(bbox)):
+            batch.coords(handle, screen)
+            self.handle_index.update(handle, box)
+
+
+def _overlaps(a, b):
+    return b is not None and a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def _bitmap_photo(canvas, record, zoom=1.0):
+    if not hasattr(canvas, "tk"):
+        return None
+    from raster import encode_png, mask_to_rgba, parse_color, resample
+
+    pixels = mask_to_rgba(resample(record.data.to_mask(), zoom), parse_color(record.fill))
+    return tk.PhotoImage(master=canvas, data=base64.b64encode(encode_png(pixels, 1)).decode("ascii"), format="png")
+
+def _item_style(record, zoom=1.0):
+    if record.kind == "image":
+        return {}
+    width = record.width if zoom == 1 else record.width * zoom
+    style = {"fill": record.fill, "width": width, "dash": record.dash or ()}
+    if record.kind == "line":
+        style["capstyle"] = "round"
+        style["joinstyle"] = "round"
+    else:
+        style["outline"] = record.outline
+    return style
@@ -1,45 +1,58 @@
+from undo_utils import RemoveCommand, RestyleCommand
 
 def update_bbox_and_handles(app, group_tag):
-    if group_tag not in app.canvas.bbox_corners:
+    if not app.scene.has_group(group_tag):
         return
+    app.view.update_decorations(group_tag)
 
-    coords = []
-    for item in app.canvas.find_withtag(group_tag):
-        if app.canvas.type(item) not in ("rectangle", "oval"):
-            coords = app.canvas.coords(item)
-            break
-
-    if not coords:
-        return
-
-    x_coords = coords[::2]
-    y_coords = coords[1::2]
-
-    corners = [
-        (min(x_coords), min(y_coords)),
-        (max(x_coords), min(y_coords)),
-        (max(x_coords), max(y_coords)),
-        (min(x_coords), max(y_coords)),
-    ]
-    app.canvas.bbox_corners[group_tag] = corners
-
-    if group_tag in app.canvas.bbox_handles:
-        for handle, (cx, cy) in zip(app.canvas.bbox_handles[group_tag], corners):
-            app.canvas.coords(handle, cx - 5, cy - 5, cx + 5, cy + 5)
-
-def tag_and_select_new_shape(app, item_id):
+def tag_and_select_new_shape(app, group_tag):
     if hasattr(app.canvas, 'tag_new_item'):
-        app.canvas.tag_new_item(item_id)
-    app.canvas.selected_item = item_id
+        app.canvas.tag_new_item(group_tag)
+    app.canvas.selected_item = group_tag
+
+def selected_groups(app):
+    # selected_item is the group last clicked; with several groups selected
+    # it is one of the view's highlighted groups.
+    group_tag = getattr(app.canvas, 'selected_item', None)
+    if not group_tag:
+        return []
+    if group_tag in app.view.highlighted:
+        return sorted(app.view.highlighted)
+    return [group_tag]
+
+def select_groups(app, groups, primary=None):
+    groups = [group for group in groups if app.scene.has_group(group)]
+    if primary not in groups:
+        primary = groups[-1] if groups else None
+    app.canvas.selected_item = primary
+    app.view.set_selection(set(groups))
 
 def delete_selected_item(app, event=None):
-    if hasattr(app.canvas, 'selected_item') and app.canvas.selected_item:
-        app.canvas.delete(app.canvas.selected_item)
-        app.canvas.selected_item = None
+    groups = selected_groups(app)
+    if groups:
+        records = [record for group in groups for record in app.scene.remove_group(group)]
+        app.undo_stack.push(RemoveCommand(records))
+        select_groups(app, ())
+
+def recolor_selection(app, color):
+    # Strokes, filled shapes and bitmaps take the colour as their fill;
+    # unfilled shapes as their outline.
+    changes = []
+    for group in selected_groups(app):
+        for shape_id in app.scene.group_members(group):
+            record = app.scene.get(shape_id)
+            option = "outline" if record.kind not in ("line", "image") and not record.fill else "fill"
+            if getattr(record, option) != color:
+                changes.append((shape_id, {option: getattr(record, option)}, {option: color}))
+    if changes:
+        command = RestyleCommand(changes)
+        command.redo(app)
+        app.undo_stack.push(command)
 
 def enable_selection_mode(app):
     if hasattr(app.canvas, 'enable_selection_mode'):
         app.canvas.enable_selection_mode()
 
 def clear_canvas(app):
-    app.canvas.delete("all")
\ No newline at end of file
+    app.scene.clear()
+    app.canvas.delete("all")
@@ -0,0 +1,3 @@
+# Drop a module in this package to add a shape: define a Shape subclass
+# with `kind` and `points()`, decorate it with @register_shape("Name"),
+# and it joins the toolbar's shape cycle on the next launch.
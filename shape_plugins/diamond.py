@@ -0,0 +1,17 @@
+# File: shape_plugins/diamond.py
+
+from shapes import Shape, register_shape
+
+@register_shape("Diamond")
+class Diamond(Shape):
+    __slots__ = ()
+    kind = "polygon"
+
+    def points(self, x1, y1, x2, y2):
+        center_x = (x1 + x2) / 2
+        center_y = (y1 + y2) / 2
+        return (
+            [center_x, y1, x1, center_y, center_x, y2, x2, center_y]
+            if self.reverse else
+            [center_x, y1, x2, center_y, center_x, y2, x1, center_y]
+        )
@@ -3,6 +3,200 @@
 import tkinter as tk
 import math
 
+from geometry_utils import (
+    IDENTITY, ROTATABLE_KINDS, GroupTransform, TransformCommand, rotate_matrix, scale_matrix, translate_matrix
+)
+from profiler import timed
+from scene_model import bbox_corners
+
+
+# Selection-mode event handlers; bound by setup_shape_selection and callable
+# with any event carrying .widget, .x, .y and .state. Pointer positions are
+# kept in document coordinates; tolerances are in window pixels.
+@timed("on_click")
+def on_click(event):
+    c = event.widget
+    x, y = c.view.to_document(event.x, event.y)
+    c.mode = "normal_move"
+    c.dragging = False
+    c.transform = None
+    c.drag_groups = []
+    c.start_drag = (x, y)
+    c.drag_origin = (x, y)
+
+    if not c.scene.is_editable():
+        return
+    extend = event.state & 0x0001  # Shift held
+    view = c.view
+
+    # Near a corner of the current selection: resize with Shift, else rotate
+    tolerance = 1 / view.zoom
+    corner = near_corner(view.selection_bbox(), x, y, 8 * tolerance)
+    if corner is not None:
+        c.mode = "resize" if extend else "rotate"
+    else:
+        shape_id = c.scene.topmost_at(x, y, 2 * tolerance, c.scene.active_layer)
+        if shape_id is None:
+            start_marquee(c, event, extend)
+            return
+
+        group_tag = c.scene.get(shape_id).group
+        if extend:
+            # Shift-click adds the group to the selection or takes it out
+            if group_tag in view.highlighted:
+                select(c, view.highlighted - {group_tag})
+            else:
+                select(c, view.highlighted | {group_tag}, group_tag)
+            c.mode = None
+            return
+        if group_tag in view.highlighted:
+            # Dragging any selected group moves the whole selection
+            c.selected_item = group_tag
+        else:
+            select(c, {group_tag}, group_tag)
+            corner = near_corner(view.selection_bbox(), x, y, 8 * tolerance)
+            if corner is not None:
+                c.mode = "rotate"
+    if corner is not None:
+        c.near_handle = corner
+
+    # Capture original dimensions
+    c.drag_groups = sorted(view.highlighted)
+    x1, y1, x2, y2 = view.selection_bbox()
+    c.old_width = x2 - x1
+    c.old_height = y2 - y1
+    c.resize_anchor = (x1, y1)
+    c.rotate_center = ((x1 + x2) / 2, (y1 + y2) / 2)
+
+def near_corner(bbox, x, y, tolerance=8):
+    if bbox is None:
+        return None
+    for (cx, cy) in bbox_corners(bbox):
+        if abs(x - cx) <= tolerance and abs(y - cy) <= tolerance:
+            return (cx, cy)
+    return None
+
+def select(c, groups, primary=None):
+    groups = {group for group in groups if c.scene.has_group(group)}
+    if primary not in groups:
+        primary = min(groups) if groups else None
+    c.selected_item = primary
+    c.view.set_selection(groups)
+
+def start_marquee(c, event, extend):
+    c.mode = "marquee"
+    c.marquee_base = set(c.view.highlighted) if extend else set()
+    if not extend:
+        select(c, ())
+    c.marquee = c.create_rectangle(event.x, event.y, event.x, event.y, outline="gray", dash=(4, 2))
+
+def finish_marquee(c):
+    c.delete(c.marquee)
+    c.marquee = None
+    (ox, oy), (x, y) = c.drag_origin, getattr(c, "drag_pointer", c.drag_origin)
+    x1, x2 = sorted((ox, x))
+    y1, y2 = sorted((oy, y))
+    layer = c.scene.active_layer
+    candidates = {
+        c.scene.get(shape_id).group for shape_id in c.scene.shapes_in(x1, y1, x2, y2)
+        if c.scene.get(shape_id).layer == layer
+    }
+    # Only groups lying wholly inside the band are picked up.
+    inside = set()
+    for group in candidates:
+        gx1, gy1, gx2, gy2 = c.scene.group_bbox(group)
+        if x1 <= gx1 and y1 <= gy1 and gx2 <= x2 and gy2 <= y2:
+            inside.add(group)
+    select(c, c.marquee_base | inside)
+
+@timed("on_drag")
+def on_drag(event):
+    c = event.widget
+    if c.mode != "marquee" and (not hasattr(c, "selected_item") or not c.selected_item):
+        return
+    # Only the latest pointer position matters; the scheduler applies it
+    # at most once per frame.
+    c.drag_pointer = c.view.to_document(event.x, event.y)
+    c.scheduler.request("drag", lambda: apply_drag(c))
+
+def apply_drag(c):
+    x, y = c.drag_pointer
+    ox, oy = c.drag_origin
+    if c.mode == "marquee":
+        c.coords(c.marquee, *c.view.to_screen(ox, oy), *c.view.to_screen(x, y))
+        return
+    groups = [group for group in c.drag_groups if c.scene.has_group(group)]
+    if not groups:
+        return
+
+    # Each frame builds the whole drag's matrix from where it started;
+    # the transform applies it to the geometry captured at that point.
+    if c.mode == "normal_move":
+        matrix = translate_matrix(x - ox, y - oy)
+
+    elif c.mode == "resize":
+        if not c.old_width or not c.old_height:
+            return
+
+        new_width = c.old_width + x - ox
+        new_height = c.old_height + y - oy
+
+        if new_width <= 0 or new_height <= 0:
+            return
+
+        ax, ay = c.resize_anchor
+        matrix = scale_matrix(new_width / c.old_width, new_height / c.old_height, ax, ay)
+
+    elif c.mode == "rotate":
+        cx, cy = c.rotate_center
+        angle = math.atan2(y - cy, x - cx) - math.atan2(oy - cy, ox - cx)
+        matrix = rotate_matrix(math.degrees(angle), cx, cy)
+
+    else:
+        return
+
+    if c.transform is None:
+        kinds = ROTATABLE_KINDS if c.mode == "rotate" else None
+        c.transform = GroupTransform(c.scene, groups, kinds)
+    c.transform.apply(c, matrix)
+    c.start_drag = (x, y)
+
+@timed("on_release")
+def on_release(event):
+    c = event.widget
+    if c.scheduler.pending("drag"):
+        c.scheduler.flush_now()
+    if c.mode == "marquee":
+        finish_marquee(c)
+    transform = getattr(c, "transform", None)
+    if transform is not None and transform.matrix != IDENTITY:
+        c.undo_stack.push(TransformCommand(transform.groups, transform.matrix, transform.kinds))
+    c.transform = None
+    c.mode = "normal_move"
+
+@timed("on_hover")
+def on_hover(event):
+    c = event.widget
+    handle = c.view.handle_at(*c.view.to_document(event.x, event.y))
+    if handle == c.hovered_handle:
+        return
+    try:
+        if c.hovered_handle is not None:
+            c.itemconfig(c.hovered_handle, fill="blue")
+        if handle is not None:
+            c.itemconfig(handle, fill="red")
+    except tk.TclError:
+        pass
+    c.hovered_handle = handle
+
+def create_handles_for_group(c, group_tag):
+    if not hasattr(c, "old_width"):
+        c.old_width = 100
+        c.old_height = 100
+
+    if c.scene.has_group(group_tag):
+        c.view.create_decorations(group_tag)
+
 
 def setup_shape_selection(canvas, root, toolbar):
     def activate_selection_mode():
@@ -25,187 +219,9 @@ def setup_shape_selection(canvas, root, toolbar):
         canvas.unbind("<ButtonRelease-3>")
         select_button.config(relief=tk.RAISED)
 
-    def on_click(event):
-        c = event.widget
-        c.mode = "normal_move"
-        c.dragging = False
-        c.start_drag = (event.x, event.y)
-
-        for item in c.find_withtag("movable"):
-            if c.type(item) == "rectangle":
-                c.itemconfig(item, state='hidden')
-            else:
-                c.itemconfig(item, width=1, dash=())
-
-        overlapping_items = c.find_overlapping(event.x-2, event.y-2, event.x+2, event.y+2)
-        if not overlapping_items:
-            return
-
-        movable_items = [item for item in overlapping_items if "movable" in c.gettags(item)]
-        if not movable_items:
-            return
-
-        item = movable_items[-1]
-        group_tag = None
-        for tag in c.gettags(item):
-            if tag.startswith("group_"):
-                group_tag = tag
-                break
-        if not group_tag:
-            return
-
-        c.selected_item = group_tag
-
-        for group_item in c.find_withtag(group_tag):
-            if c.type(group_item) == "rectangle":
-                c.itemconfig(group_item, state='normal')
-            else:
-                c.itemconfig(group_item, width=3, dash=(2, 2))
-
-        # Detect if cursor is near a corner to resize/rotate
-        corners = c.bbox_corners.get(group_tag, [])
-        for (cx, cy) in corners:
-            if abs(event.x - cx) <= 8 and abs(event.y - cy) <= 8:
-                c.near_handle = (cx, cy)
-                if event.state & 0x0001:  # Shift held
-                    c.mode = "resize"
-                else:
-                    c.mode = "rotate"
-                break
-
-        # Capture original dimensions
-        if group_tag:
-            coords = None
-            for item in c.find_withtag(group_tag):
-                if c.type(item) not in ("rectangle", "oval"):
-                    coords = c.coords(item)
-                    break
-            if coords:
-                x_coords = coords[::2]
-                y_coords = coords[1::2]
-                c.old_width = max(x_coords) - min(x_coords)
-                c.old_height = max(y_coords) - min(y_coords)
-                c.original_shape_coords = coords
-
-
-    def on_drag(event):
-        c = event.widget
-        if not hasattr(c, "selected_item") or not c.selected_item:
-            return
-        group_tag = c.selected_item
-        dx = event.x - c.start_drag[0]
-        dy = event.y - c.start_drag[1]
-
-        if c.mode == "normal_move":
-            for item in c.find_withtag(group_tag):
-                c.move(item, dx, dy)
-            if group_tag in c.bbox_corners:
-                c.bbox_corners[group_tag] = [(x+dx, y+dy) for (x, y) in c.bbox_corners[group_tag]]
-
-        elif c.mode == "resize":
-            if not hasattr(c, "original_shape_coords") or not hasattr(c, "old_width") or not hasattr(c, "old_height"):
-                return
-
-            new_width = c.old_width + dx
-            new_height = c.old_height + dy
-
-            if new_width <= 0 or new_height <= 0:
-                return
-
-            new_coords = []
-            for i in range(0, len(c.original_shape_coords), 2):
-                rel_x = (c.original_shape_coords[i] - c.original_shape_coords[0]) / c.old_width
-                rel_y = (c.original_shape_coords[i+1] - c.original_shape_coords[1]) / c.old_height
-                new_x = c.original_shape_coords[0] + rel_x * new_width
-                new_y = c.original_shape_coords[1] + rel_y * new_height
-                new_coords.extend([new_x, new_y])
-
-            for item in c.find_withtag(group_tag):
-                if c.type(item) != "rectangle":
-                    c.coords(item, *new_coords)
-                else:
-                    x_coords = new_coords[::2]
-                    y_coords = new_coords[1::2]
-                    c.coords(item, min(x_coords), min(y_coords), max(x_coords), max(y_coords))
-
-            c.bbox_corners[group_tag] = [
-                (min(x_coords), min(y_coords)),
-                (max(x_coords), min(y_coords)),
-                (max(x_coords), max(y_coords)),
-                (min(x_coords), max(y_coords)),
-            ]
-
-        elif c.mode == "rotate":
-            corners = c.bbox_corners.get(group_tag)
-            if corners:
-                (x1, y1) = corners[0]
-                (x3, y3) = corners[2]
-                cx = (x1 + x3) / 2
-                cy = (y1 + y3) / 2
-
-                angle = math.degrees(math.atan2(event.y - cy, event.x - cx))
-                for item in c.find_withtag(group_tag):
-                    if c.type(item) != "rectangle":
-                        rotate_item(c, item, cx, cy, angle)
-
-        c.start_drag = (event.x, event.y)
-
-
-    def on_release(event):
-        c = event.widget
-        c.mode = "normal_move"
-
-    def rotate_item(c, item, cx, cy, angle):
-        coords = c.coords(item)
-        new_coords = []
-        radians = math.radians(angle)
-        cos_val = math.cos(radians)
-        sin_val = math.sin(radians)
-        for i in range(0, len(coords), 2):
-            x = coords[i]
-            y = coords[i + 1]
-            dx = x - cx
-            dy = y - cy
-            new_x = cx + dx * cos_val - dy * sin_val
-            new_y = cy + dx * sin_val + dy * cos_val
-            new_coords.extend([new_x, new_y])
-        c.coords(item, *new_coords)
-
-    def on_hover(event):
-        c = event.widget
-        for handles in getattr(c, 'bbox_handles', {}).values():
-            for handle in handles:
-                try:
-                    coords = c.coords(handle)
-                    if len(coords) == 4:
-                        x1, y1, x2, y2 = coords
-                        if x1 <= event.x <= x2 and y1 <= event.y <= y2:
-                            c.itemconfig(handle, fill="red")
-                        else:
-                            c.itemconfig(handle, fill="blue")
-                except tk.TclError:
-                    pass
-
-    def create_handles_for_group(c, group_tag):
-        if not hasattr(c, "bbox_handles"):
-            c.bbox_handles = {}
-
-        if not hasattr(c, "old_width"):
-            c.old_width = 100
-            c.old_height = 100
-
-        if group_tag in c.bbox_corners:
-            corners = c.bbox_corners[group_tag]
-            handles = []
-            for (x, y) in corners:
-                handle = c.create_oval(x - 4, y - 4, x + 4, y + 4, fill="blue", outline="")
-                c.addtag_withtag(group_tag, handle)
-                handles.append(handle)
-            c.bbox_handles[group_tag] = handles
-
-    canvas.tag_new_item = lambda item: (
-        setattr(canvas, "selected_item", f"group_{item}"),
-        create_handles_for_group(canvas, f"group_{item}")
+    canvas.tag_new_item = lambda group_tag: (
+        setattr(canvas, "selected_item", group_tag),
+        create_handles_for_group(canvas, group_tag)
     )
 
     canvas.bind("<Motion>", on_hover)
@@ -214,5 +230,6 @@ def setup_shape_selection(canvas, root, toolbar):
     select_button.pack(side=tk.LEFT, padx=5)
 
     canvas.selection_mode = False
+    canvas.hovered_handle = None
     canvas.enable_selection_mode = activate_selection_mode
     canvas.disable_selection_mode = deactivate_selection_mode
@@ -1,73 +1,119 @@
 # File: shapes.py
+import importlib
 import math
+import pkgutil
+from functools import lru_cache
+
+SHAPE_REGISTRY = {}
+_CYCLE = []
+
+def register_shape(name, cycle=True):
+    # Class decorator: makes a shape available to get_shape/shape_for. Shapes
+    # with cycle=True also appear in the toolbar's shape button cycle.
+    def decorator(cls):
+        cls.name = name
+        SHAPE_REGISTRY[name] = cls
+        if cycle and name not in _CYCLE:
+            _CYCLE.append(name)
+        shape_for.cache_clear()
+        return cls
+    return decorator
+
+def shape_names():
+    return list(_CYCLE)
+
+@lru_cache(maxsize=256)
+def shape_for(name, reverse=False, sides=None):
+    # Shape objects hold no per-drawing state, so one shared instance per
+    # (name, reverse, sides) serves every preview and finalize call.
+    cls = SHAPE_REGISTRY[name]
+    if sides is None:
+        return cls(reverse)
+    return cls(sides, reverse)
+
+@lru_cache(maxsize=64)
+def unit_polygon(sides, reverse=False):
+    angle_step = 2 * math.pi / sides
+    table = []
+    for i in range(sides):
+        theta = -i * angle_step if reverse else i * angle_step
+        table.extend([math.cos(theta), math.sin(theta)])
+    return tuple(table)
+
+def load_shape_plugins(package="shape_plugins"):
+    try:
+        module = importlib.import_module(package)
+    except ImportError:
+        return []
+    loaded = []
+    for info in pkgutil.iter_modules(module.__path__):
+        loaded.append(importlib.import_module(f"{package}.{info.name}"))
+    return loaded
 
 class Shape:
-    def draw(self, canvas, x1, y1, x2, y2, color, preview):
-        raise NotImplementedError("Draw method not implemented")
+    __slots__ = ("reverse",)
+    kind = None
+    name = None
+
+    def __init__(self, reverse=False):
+        self.reverse = reverse
+
+    def points(self, x1, y1, x2, y2):
+        raise NotImplementedError("Points method not implemented")
 
-class Circle(Shape):
     def draw(self, canvas, x1, y1, x2, y2, color, preview):
-        return canvas.create_oval(
-            x1, y1, x2, y2,
+        create = getattr(canvas, f"create_{self.kind}")
+        return create(
+            self.points(x1, y1, x2, y2),
             fill=color if not preview else "",
             outline=color,
             dash=(4, 2) if preview else None
         )
 
+@register_shape("Circle")
+class Circle(Shape):
+    __slots__ = ()
+    kind = "oval"
+
+    def points(self, x1, y1, x2, y2):
+        return [x1, y1, x2, y2]
+
+@register_shape("Triangle")
 class Triangle(Shape):
-    def __init__(self, reverse=False):
-        self.reverse = reverse
+    __slots__ = ()
+    kind = "polygon"
 
-    def draw(self, canvas, x1, y1, x2, y2, color, preview):
+    def points(self, x1, y1, x2, y2):
         center_x = (x1 + x2) / 2
-        points = (
+        return (
             [center_x, y1, x2, y2, x1, y2]
             if self.reverse else
             [center_x, y1, x1, y2, x2, y2]
         )
-        return canvas.create_polygon(
-            points,
-            fill=color if not preview else "",
-            outline=color,
-            dash=(4, 2) if preview else None
-        )
 
+@register_shape("Square")
 class Square(Shape):
-    def __init__(self, reverse=False):
-        self.reverse = reverse
+    __slots__ = ()
+    kind = "rectangle"
 
-    def draw(self, canvas, x1, y1, x2, y2, color, preview):
-        coords = (x2, y2, x1, y1) if self.reverse else (x1, y1, x2, y2)
-        return canvas.create_rectangle(
-            *coords,
-            fill=color if not preview else "",
-            outline=color,
-            dash=(4, 2) if preview else None
-        )
+    def points(self, x1, y1, x2, y2):
+        return [x2, y2, x1, y1] if self.reverse else [x1, y1, x2, y2]
 
+@register_shape("Polygon", cycle=False)
 class PolygonShape(Shape):
+    __slots__ = ("sides",)
+    kind = "polygon"
+
     def __init__(self, sides, reverse=False):
+        super().__init__(reverse)
         self.sides = sides
-        self.reverse = reverse
 
-    def draw(self, canvas, x1, y1, x2, y2, color, preview):
+    def points(self, x1, y1, x2, y2):
         center_x = (x1 + x2) / 2
         center_y = (y1 + y2) / 2
-        width = abs(x2 - x1)
-        height = abs(y2 - y1)
-        radius = min(width, height) / 2
-        angle_step = 2 * math.pi / self.sides
-
-        points = []
-        for i in range(self.sides):
-            theta = -i * angle_step if self.reverse else i * angle_step
-            px = center_x + radius * math.cos(theta)
-            py = center_y + radius * math.sin(theta)
-            points.extend([px, py])
-
-        return canvas.create_polygon(
-            points,
-            fill=color if not preview else "",
-            outline=color,
-            dash=(4, 2) if preview else None
-        )
+        radius = min(abs(x2 - x1), abs(y2 - y1)) / 2
+        table = unit_polygon(self.sides, self.reverse)
+        points = [0.0] * len(table)
+        points[::2] = [center_x + radius * ux for ux in table[::2]]
+        points[1::2] = [center_y + radius * uy for uy in table[1::2]]
+        return points
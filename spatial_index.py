@@ -0,0 +1,192 @@
+# File: spatial_index.py
+
+import math
+
+CELL_SIZE = 64
+# Items spanning more cells than this go to a small list that is scanned
+# linearly instead of being stamped into every cell they cover.
+MAX_CELLS_PER_ITEM = 256
+
+
+class GridIndex:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._spans = {}
+        self._boxes = {}
+        self._oversize = set()
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def bbox(self, key):
+        return self._boxes.get(key)
+
+    def _span(self, bbox):
+        size = self.cell_size
+        x1, y1, x2, y2 = bbox
+        return (
+            math.floor(x1 / size), math.floor(y1 / size),
+            math.floor(x2 / size), math.floor(y2 / size),
+        )
+
+    def insert(self, key, bbox):
+        span = self._span(bbox)
+        self._boxes[key] = bbox
+        self._spans[key] = span
+        cx1, cy1, cx2, cy2 = span
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > MAX_CELLS_PER_ITEM:
+            self._oversize.add(key)
+            return
+        cells = self._cells
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    cells[(cx, cy)] = {key}
+                else:
+                    bucket.add(key)
+
+    def remove(self, key):
+        span = self._spans.pop(key, None)
+        if span is None:
+            return
+        del self._boxes[key]
+        if key in self._oversize:
+            self._oversize.discard(key)
+            return
+        cells = self._cells
+        cx1, cy1, cx2, cy2 = span
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def update(self, key, bbox):
+        if key in self._spans and self._span(bbox) == self._spans[key] and key not in self._oversize:
+            self._boxes[key] = bbox
+            return
+        self.remove(key)
+        self.insert(key, bbox)
+
+    def clear(self):
+        self._cells.clear()
+        self._spans.clear()
+        self._boxes.clear()
+        self._oversize.clear()
+
+    def query_rect(self, x1, y1, x2, y2):
+        cx1, cy1, cx2, cy2 = self._span((x1, y1, x2, y2))
+        candidates = set(self._oversize)
+        cells = self._cells
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(cells):
+            for (cx, cy), bucket in cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    candidates.update(bucket)
+        else:
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    bucket = cells.get((cx, cy))
+                    if bucket:
+                        candidates.update(bucket)
+        boxes = self._boxes
+        return {
+            key for key in candidates
+            if boxes[key][0] <= x2 and boxes[key][2] >= x1 and boxes[key][1] <= y2 and boxes[key][3] >= y1
+        }
+
+    def query_point(self, x, y, tolerance=0):
+        return self.query_rect(x - tolerance, y - tolerance, x + tolerance, y + tolerance)
+
+
+def _segment_distance_sq(px, py, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        t = 0
+    else:
+        t = max(0, min(1, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+    ex = x1 + t * dx - px
+    ey = y1 + t * dy - py
+    return ex * ex + ey * ey
+
+def _point_in_polygon(x, y, coords):
+    inside = False
+    n = len(coords)
+    j = n - 2
+    for i in range(0, n, 2):
+        xi, yi = coords[i], coords[i + 1]
+        xj, yj = coords[j], coords[j + 1]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def _near_outline(x, y, coords, tolerance, closed):
+    limit = tolerance * tolerance
+    n = len(coords)
+    end = n if closed else max(n - 2, 1)
+    for i in range(0, end, 2):
+        j = (i + 2) % n
+        if _segment_distance_sq(x, y, coords[i], coords[i + 1], coords[j], coords[j + 1]) <= limit:
+            return True
+    return False
+
+def _unmap_point(matrix, x, y):
+    a, b, c, d, e, f = matrix
+    det = a * d - b * c
+    if det == 0:
+        return x, y
+    x -= e
+    y -= f
+    return (d * x - c * y) / det, (a * y - b * x) / det
+
+def record_contains(record, x, y, tolerance=0):
+    reach = tolerance + record.width / 2
+    x1, y1, x2, y2 = record.bbox()
+    if x < x1 - reach or x > x2 + reach or y < y1 - reach or y > y2 + reach:
+        return False
+    kind = record.kind
+    coords = record.coords
+    filled = bool(record.fill)
+    if record.matrix is not None:
+        # Test in the shape's own frame, where it is an upright box.
+        x, y = _unmap_point(record.matrix, x, y)
+        x1, x2 = sorted(coords[0:4:2])
+        y1, y2 = sorted(coords[1:4:2])
+    if kind == "image":
+        return record.data is not None and record.data.contains(int(x - x1), int(y - y1))
+    if kind == "rectangle":
+        if filled:
+            return True
+        return not (x1 + reach < x < x2 - reach and y1 + reach < y < y2 - reach)
+    if kind == "oval":
+        rx = (x2 - x1) / 2 + reach
+        ry = (y2 - y1) / 2 + reach
+        if rx <= 0 or ry <= 0:
+            return False
+        nx = (x - (x1 + x2) / 2) / rx
+        ny = (y - (y1 + y2) / 2) / ry
+        if nx * nx + ny * ny > 1:
+            return False
+        if filled:
+            return True
+        inner_rx = rx - 2 * reach
+        inner_ry = ry - 2 * reach
+        if inner_rx <= 0 or inner_ry <= 0:
+            return True
+        nx = (x - (x1 + x2) / 2) / inner_rx
+        ny = (y - (y1 + y2) / 2) / inner_ry
+        return nx * nx + ny * ny >= 1
+    if kind == "polygon":
+        if filled and _point_in_polygon(x, y, coords):
+            return True
+        return _near_outline(x, y, coords, reach, closed=True)
+    return _near_outline(x, y, coords, reach, closed=False)
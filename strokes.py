@@ -0,0 +1,117 @@
+# File: strokes.py
+
+from array import array
+
+from undo_utils import AddCommand
+
+
+class StrokeBuilder:
+    __slots__ = ("canvas", "color", "width", "viewport", "points", "item", "_sent")
+
+    def __init__(self, canvas, color, width, viewport=None):
+        self.canvas = canvas
+        self.color = color
+        self.width = width
+        # Points are in document coordinates; the live line is drawn through
+        # the viewport, when there is one.
+        self.viewport = viewport
+        self.points = array('d')
+        self.item = None
+        self._sent = 0
+
+    def __len__(self):
+        return len(self.points) // 2
+
+    def add_point(self, x, y):
+        points = self.points
+        if points and points[-2] == x and points[-1] == y:
+            return
+        points.append(x)
+        points.append(y)
+
+    def flush(self):
+        # Only points added since the last flush are sent to Tk; the live
+        # line grows through canvas insert instead of a full coords() resend.
+        points = self.points
+        if len(points) < 4 or self._sent == len(points):
+            return
+        viewport = self.viewport
+        if self.item is None:
+            self.item = self.canvas.create_line(
+                self._screen(points), fill=self.color,
+                width=self.width if viewport is None else self.width * viewport.zoom,
+                capstyle="round", joinstyle="round"
+            )
+        else:
+            self.canvas.insert(self.item, "end", self._screen(points[self._sent:]))
+        self._sent = len(points)
+
+    def _screen(self, points):
+        if self.viewport is None:
+            return points.tolist()
+        return self.viewport.screen_coords(points)
+
+    def finish(self, tolerance):
+        if self.item is not None:
+            self.canvas.delete(self.item)
+            self.item = None
+        return simplify(self.points, tolerance)
+
+
+def stroke_tolerance(brush_size):
+    return max(0.5, brush_size / 2)
+
+def _segment_distance_sq(px, py, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        ex, ey = px - x1, py - y1
+    else:
+        t = max(0, min(1, ((px - x1) * dx + (py - y1) * dy) / length_sq))
+        ex, ey = x1 + t * dx - px, y1 + t * dy - py
+    return ex * ex + ey * ey
+
+def simplify(points, tolerance):
+    # Ramer-Douglas-Peucker with an explicit stack so long strokes do not
+    # hit the recursion limit.
+    count = len(points) // 2
+    if count < 3:
+        return array('d', points)
+    keep = bytearray(count)
+    keep[0] = keep[count - 1] = 1
+    limit = tolerance * tolerance
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[2 * first], points[2 * first + 1]
+        x2, y2 = points[2 * last], points[2 * last + 1]
+        worst, worst_index = limit, -1
+        for i in range(first + 1, last):
+            d = _segment_distance_sq(points[2 * i], points[2 * i + 1], x1, y1, x2, y2)
+            if d > worst:
+                worst, worst_index = d, i
+        if worst_index != -1:
+            keep[worst_index] = 1
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    simplified = array('d')
+    for i in range(count):
+        if keep[i]:
+            simplified.append(points[2 * i])
+            simplified.append(points[2 * i + 1])
+    return simplified
+
+def finalize_stroke(app, stroke):
+    points = stroke.finish(stroke_tolerance(stroke.width))
+    if len(points) < 4:
+        return None
+    if app.raster_layer is not None:
+        from raster_layer import rasterize_stroke
+
+        rasterize_stroke(app, points, stroke.color, stroke.width)
+        return None
+    shape_id = app.scene.add("line", points, fill=stroke.color, width=stroke.width)
+    group_tag = app.scene.get(shape_id).group
+    app.undo_stack.push(AddCommand.for_group(app.scene, group_tag))
+    return group_tag
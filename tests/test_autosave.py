@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from autosave import Autosave, Journal, enable_autosave
+from benchmarks.headless_canvas import HeadlessCanvas
+from document import open_document, save_document
+from geometry_utils import TransformCommand, translate_matrix
+from layers import LayerCompositor
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import AddCommand, RemoveCommand, UndoStack, undo
+
+
+def make_app():
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    view = SceneView(canvas, scene)
+    app = types.SimpleNamespace(
+        canvas=canvas, scene=scene, view=view, raster_layer=None, document_loader=None, document_path=None,
+        undo_stack=UndoStack(),
+    )
+    app.compositor = LayerCompositor(canvas, scene, view)
+    app.clear_canvas = scene.clear
+    return app
+
+def contents(scene):
+    return sorted(
+        (record.id, record.kind, list(record.drawn()[1]), record.fill, record.width, record.group, record.layer)
+        for record in scene
+    )
+
+
+class TestAutosave(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "autosave.journal")
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def session(self, compact_bytes=1 << 20):
+        app = make_app()
+        journal = Journal(self.path, fsync_interval=0.01, compact_bytes=compact_bytes)
+        self.assertTrue(journal.lock())
+        journal.read()
+        journal.start()
+        return app, Autosave(app, journal)
+
+    def edit(self, app):
+        scene = app.scene
+        a = scene.add("polygon", [0, 0, 10, 0, 5, 10], fill="red", width=3)
+        b = scene.add("line", [0, 0, 5.5, 5.5, 9, 2])
+        scene.add_copy(scene.get(b), 20, 20)
+        app.undo_stack.push(AddCommand([scene.get(a)]))
+        command = TransformCommand([scene.get(a).group], translate_matrix(7, 3))
+        command.redo(app)
+        app.undo_stack.push(command)
+        scene.set_style(b, fill="blue")
+        scene.add_layer("Ink")
+        c = scene.add("rectangle", [1, 1, 4, 4])
+        command = RemoveCommand([scene.remove(c)])
+        app.undo_stack.push(command)
+        undo(app)
+
+    def recovered(self, path=None):
+        app = make_app()
+        autosave, recovered = enable_autosave(app, self.dir)
+        self.addCleanup(autosave.close)
+        self.assertTrue(recovered)
+        self.assertEqual(autosave.journal.path, path or self.path)
+        return app
+
+    def test_replays_edits_after_a_crash(self):
+        app, autosave = self.session()
+        self.edit(app)
+        autosave.flush()
+        # No close(): the process "crashed" with the journal as it is, and
+        # its lock went with it.
+        autosave.journal.release()
+        recovered = self.recovered()
+        self.assertEqual(contents(recovered.scene), contents(app.scene))
+        self.assertEqual([layer.name for layer in recovered.scene.layers()], ["Layer 1", "Ink"])
+        self.assertEqual(recovered.scene.active_layer, app.scene.active_layer)
+        autosave.journal.close()
+
+    def test_torn_tail_and_compaction(self):
+        app, autosave = self.session(compact_bytes=200)
+        self.edit(app)
+        autosave.flush()
+        self.assertGreater(autosave.journal.compactions, 0)
+        app.scene.add("oval", [0, 0, 8, 8], fill="green")
+        autosave.flush()
+        autosave.journal.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\x40\x00\x00\x00torn")
+        self.assertEqual(contents(self.recovered().scene), contents(app.scene))
+
+    def test_opened_document_is_journaled_by_path(self):
+        source = Scene()
+        for i in range(50):
+            source.add("rectangle", [i, i, i + 5, i + 5], fill="red")
+        document_path = os.path.join(self.dir, "drawing.mare")
+        save_document(source, document_path)
+
+        app, autosave = self.session()
+        open_document(app, document_path)
+        app.canvas.run_pending()
+        app.scene.move(3, 100, 0)
+        app.scene.remove(7)
+        autosave.flush()
+        self.assertEqual(len(autosave.journal.state.records), 1)
+        self.assertEqual(autosave.journal.state.deleted, {7})
+
+        autosave.journal.release()
+        recovered = self.recovered()
+        self.assertEqual(recovered.document_path, document_path)
+        self.assertEqual(contents(recovered.scene), contents(app.scene))
+        autosave.journal.close()
+
+    def test_clean_exit_leaves_nothing_to_recover(self):
+        app, autosave = self.session()
+        self.edit(app)
+        autosave.close(discard=True)
+        autosave, recovered = enable_autosave(make_app(), self.dir)
+        autosave.close(discard=True)
+        self.assertFalse(recovered)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_running_instances_keep_separate_journals(self):
+        app, first = self.session()
+        self.edit(app)
+        first.flush()
+        other = make_app()
+        second, recovered = enable_autosave(other, self.dir)
+        self.assertFalse(recovered)
+        self.assertNotEqual(second.journal.path, first.journal.path)
+        other.scene.add("oval", [0, 0, 8, 8], fill="green")
+        # The first instance exiting cleanly leaves the second's journal be.
+        first.close(discard=True)
+        second.flush()
+        second.journal.release()
+        recovered = self.recovered(second.journal.path)
+        self.assertEqual(contents(recovered.scene), contents(other.scene))
+        second.journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from batch_render import find_documents, render_batch
+from document import save_document
+from scene_model import Scene
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestBatchRender(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.dir.name, "docs")
+        self.out = os.path.join(self.dir.name, "out")
+        os.mkdir(self.source)
+        for name, width in (("a", 40), ("b", 400)):
+            scene = Scene()
+            scene.add("rectangle", [0, 0, width, 20], fill="red")
+            save_document(scene, os.path.join(self.source, f"{name}.mare"))
+        with open(os.path.join(self.source, "broken.mare"), "wb") as f:
+            f.write(b"nope")
+        with open(os.path.join(self.source, "notes.txt"), "w") as f:
+            f.write("ignored")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_renders_each_document_and_reports_failures(self):
+        paths = find_documents(self.source)
+        self.assertEqual([os.path.basename(path) for path in paths], ["a.mare", "b.mare", "broken.mare"])
+        lines = []
+        failures = render_batch(paths, self.out, max_size=100, workers=1, report=lines.append)
+        self.assertEqual(failures, 1)
+        self.assertEqual(sorted(os.listdir(self.out)), ["a.png", "b.png"])
+        self.assertIn("[2/3] b.mare  100x5  ", lines[1])
+        self.assertIn("FAILED", lines[2])
+
+        lines.clear()
+        render_batch(paths[:2], self.out, workers=1, skip_existing=True, report=lines.append)
+        self.assertEqual(lines, ["skipping 2 up-to-date file(s)"])
+
+    def test_command_line_entry_point(self):
+        result = subprocess.run(
+            [sys.executable, "-m", "drawing_app", "render", os.path.join(self.source, "a.mare"), self.out, "--format", "svg"],
+            cwd=ROOT, capture_output=True, text=True, timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("a.mare", result.stdout)
+        self.assertTrue(os.path.exists(os.path.join(self.out, "a.svg")))
+
+
+if __name__ == "__main__":
+    unittest.main()
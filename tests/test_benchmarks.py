@@ -0,0 +1,34 @@
+import contextlib
+import copy
+import io
+import unittest
+
+from benchmarks import bench_preview
+from benchmarks.bench_suite import BENCHES, compare, run_suite
+
+
+class TestBenchSuite(unittest.TestCase):
+    def test_small_run_and_compare(self):
+        results = run_suite(sizes=(300,), samples=5, startup=False, report=lambda line: None)
+        metrics = results["sizes"]["300"]
+        for name in list(BENCHES) + ["open"]:
+            self.assertGreaterEqual(metrics[name]["median_ms"], 0)
+        self.assertEqual(compare(results, results, report=lambda line: None), 0)
+
+        faster = copy.deepcopy(results)
+        faster["sizes"]["300"]["drag"]["median_ms"] = metrics["drag"]["median_ms"] / 2
+        lines = []
+        self.assertEqual(compare(results, faster, report=lines.append), 1)
+        self.assertTrue(any("REGRESSION" in line and "drag" in line for line in lines))
+
+
+class TestBenchPreview(unittest.TestCase):
+    def test_runs(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            bench_preview.main(["--sides", "8", "--updates", "50"])
+        self.assertIn("after:", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
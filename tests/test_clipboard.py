@@ -0,0 +1,127 @@
+import os
+import tempfile
+import tkinter as tk
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from clipboard import copy_selection, cut_selection, duplicate_selection, parse_svg, paste
+from document import load_scene, save_document
+from geometry_utils import transform_groups, translate_matrix
+from scene_model import Scene
+from scene_view import SceneView
+from selection_helpers import select_groups
+from undo_utils import UndoStack, undo
+
+
+class TextRoot:
+    # Just the system-clipboard calls of a Tk root.
+    def __init__(self):
+        self.text = None
+
+    def clipboard_get(self):
+        if self.text is None:
+            raise tk.TclError("CLIPBOARD selection doesn't exist")
+        return self.text
+
+    def clipboard_clear(self):
+        self.text = None
+
+    def clipboard_append(self, text):
+        self.text = (self.text or "") + text
+
+
+def make_app():
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    return types.SimpleNamespace(
+        canvas=canvas, scene=scene, view=SceneView(canvas, scene), undo_stack=UndoStack(), root=TextRoot(),
+        clipboard=None,
+    )
+
+
+class TestClipboard(unittest.TestCase):
+    def test_pastes_share_geometry_until_edited(self):
+        app = make_app()
+        stroke = app.scene.add("line", [float(i % 97) for i in range(20000)], fill="blue", width=2)
+        source = app.scene.get(stroke)
+        select_groups(app, [source.group])
+        copy_selection(app)
+        pasted = [paste(app)[0] for _ in range(200)]
+        self.assertEqual(len(app.scene), 201)
+        self.assertTrue(all(record.coords is source.coords for record in pasted))
+        last = pasted[-1]
+        self.assertEqual(last.bbox(), (4000, 4000, 4096, 4096))
+        self.assertEqual(list(app.canvas.coords(app.view.item_for(last.id))[:4]), [4000, 4001, 4002, 4003])
+
+        # Editing one copy gives it coords of its own and leaves the rest.
+        transform_groups(app, [last.group], translate_matrix(5, 0))
+        self.assertIsNot(last.coords, source.coords)
+        self.assertIsNone(last.matrix)
+        self.assertEqual(list(last.coords[:2]), [4005, 4001])
+        app.scene.move(stroke, 1, 1)
+        self.assertEqual(pasted[0].bbox(), (20, 20, 116, 116))
+        self.assertEqual(app.scene.shapes_at(4050, 4050, 1)[-1], pasted[-2].id)
+
+    def test_cut_paste_and_undo(self):
+        app = make_app()
+        app.scene.add("rectangle", [0, 0, 10, 10], fill="red", group="a")
+        app.scene.add("oval", [20, 0, 30, 10], group="a")
+        select_groups(app, ["a"])
+        cut_selection(app)
+        self.assertEqual(len(app.scene), 0)
+        records = paste(app)
+        self.assertEqual([record.kind for record in records], ["rectangle", "oval"])
+        self.assertEqual(list(records[0].coords), [20, 20, 30, 30])
+        self.assertEqual(len({record.group for record in records}), 1)
+        self.assertEqual(app.view.highlighted, {records[0].group})
+        undo(app)
+        self.assertEqual(len(app.scene), 0)
+
+        app.scene.add("polygon", [0, 0, 10, 0, 5, 10])
+        select_groups(app, app.scene.groups())
+        self.assertEqual(len(duplicate_selection(app)), 1)
+        self.assertEqual(len(app.scene), 2)
+
+    def test_system_clipboard_svg(self):
+        app = make_app()
+        app.scene.add("rectangle", [0, 0, 10, 10], fill="red")
+        app.scene.add("line", [0, 0, 5, 5, 10, 0], fill="blue", width=3)
+        select_groups(app, app.scene.groups())
+        copy_selection(app)
+        self.assertIn("<svg", app.root.text)
+        records = parse_svg(app.root.text)
+        self.assertEqual([(record.kind, record.fill) for record in records], [("rectangle", "#ff0000"), ("line", "#0000ff")])
+        self.assertEqual(list(records[1].coords), [0, 0, 5, 5, 10, 0])
+
+        app.root.text = (
+            '<svg xmlns="http://www.w3.org/2000/svg"><g><circle cx="50" cy="50" r="10" style="fill:none;stroke:green"/>'
+            '<path d="M0 0L1 1"/><polygon points="0,0 10,0 5,8" fill="orange"/></g></svg>'
+        )
+        pasted = paste(app)
+        self.assertEqual([record.kind for record in pasted], ["oval", "polygon"])
+        self.assertEqual(list(pasted[0].coords), [40, 40, 60, 60])
+        self.assertEqual((pasted[0].fill, pasted[0].outline), ("", "green"))
+        self.assertEqual(paste(app)[0].bbox(), (60, 60, 80, 80))
+
+    def test_shared_coords_saved_once(self):
+        app = make_app()
+        stroke = app.scene.add("line", [0, 0, 10, 10, 20, 0])
+        select_groups(app, [app.scene.get(stroke).group])
+        copy_selection(app)
+        paste(app)
+        paste(app)
+        handle, path = tempfile.mkstemp(suffix=".mare")
+        os.close(handle)
+        try:
+            save_document(app.scene, path)
+            loaded, _ = load_scene(path)
+        finally:
+            os.remove(path)
+        records = sorted(loaded, key=lambda record: record.id)
+        self.assertIs(records[1].coords, records[2].coords)
+        self.assertEqual(records[2].bbox(), (40, 40, 60, 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
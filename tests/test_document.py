@@ -0,0 +1,163 @@
+import os
+import tempfile
+import types
+import unittest
+
+import numpy as np
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from document import RECORD_DTYPE, Document, DocumentError, DocumentLoader, load_scene, open_document, save_document
+from eraser import SegmentIndex
+from layers import LayerCompositor
+from raster import Bitmap
+from scene_model import Scene
+from scene_view import SceneView
+
+
+def make_app():
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    view = SceneView(canvas, scene)
+    app = types.SimpleNamespace(canvas=canvas, scene=scene, view=view, raster_layer=None, document_loader=None)
+    app.segment_index = SegmentIndex(scene)
+    app.compositor = LayerCompositor(canvas, scene, view)
+    return app
+
+
+class TestDocument(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".mare")
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def load(self, scene):
+        save_document(scene, self.path)
+        app = make_app()
+        document = Document(self.path)
+        app.scene.set_layers(document.layers(), document.active_layer)
+        loader = DocumentLoader(app, document, batch=2, time_slice=0)
+        app.document_loader = loader
+        loader.start()
+        app.canvas.run_pending()
+        return app
+
+    def test_round_trip(self):
+        scene = Scene()
+        scene.add("polygon", [0, 0, 10, 0, 5, 10], fill="red", outline="blue", width=3, dash=(4, 2))
+        scene.add("line", [0, 0, 5.5, 5.5], group="strokes", fill="black")
+        scene.add("line", [9, 9, 20, 20], group="strokes", fill="black")
+        scene.add_layer("Ink")
+        mask = np.zeros((3, 5), dtype=bool)
+        mask[1, 2] = True
+        scene.add("image", [40, 40, 45, 43], fill="green", outline="", data=Bitmap.from_mask(mask))
+
+        app = self.load(scene)
+        loaded = app.scene
+        self.assertEqual(len(loaded), 4)
+        self.assertIsNone(app.document_loader)
+        polygon = loaded.get(1)
+        self.assertEqual((polygon.kind, polygon.fill, polygon.outline, polygon.width, polygon.dash),
+                         ("polygon", "red", "blue", 3, (4, 2)))
+        self.assertEqual(polygon.group, "group_1")
+        self.assertEqual(loaded.group_members("strokes"), [2, 3])
+        self.assertEqual(list(loaded.coords(2)), [0, 0, 5.5, 5.5])
+        self.assertEqual([layer.name for layer in loaded.layers()], ["Layer 1", "Ink"])
+        self.assertEqual(loaded.get(4).layer, loaded.active_layer)
+        self.assertTrue(loaded.get(4).data.contains(2, 1))
+        self.assertEqual(loaded.add("oval", [0, 0, 1, 1]), 5)
+
+    def test_load_order_puts_visible_first(self):
+        scene = Scene()
+        scene.add("oval", [500, 500, 510, 510])
+        scene.add("oval", [0, 0, 10, 10])
+        save_document(scene, self.path)
+        document = Document(self.path)
+        try:
+            self.assertEqual(list(document.load_order((0, 0, 100, 100))), [1, 0])
+        finally:
+            document.close()
+
+    def test_stacking_survives_out_of_order_load(self):
+        scene = Scene()
+        scene.add("rectangle", [0, 0, 900, 900], fill="white")
+        scene.add("oval", [10, 10, 20, 20], fill="red")
+        scene.add("rectangle", [850, 850, 2000, 2000], fill="blue")
+        save_document(scene, self.path)
+        app = make_app()
+        loader = DocumentLoader(app, Document(self.path), bbox=(800, 800, 1000, 1000), batch=1, time_slice=0)
+        self.assertEqual(list(loader.order), [0, 2, 1])
+        loader.start()
+        app.canvas.run_pending()
+        items = [app.view.item_for(shape_id) for shape_id in (1, 2, 3)]
+        self.assertEqual(list(app.canvas.find_all()), items)
+
+    def test_load_scene_without_tk(self):
+        scene = Scene()
+        scene.add("oval", [0, 0, 10, 10], fill="red")
+        hidden = scene.add_layer("Hidden")
+        scene.set_layer(hidden, visible=False)
+        scene.add("line", [0, 0, 5, 5], group="strokes")
+        save_document(scene, self.path)
+        loaded, raster = load_scene(self.path)
+        self.assertIsNone(raster)
+        self.assertEqual(sorted(record.id for record in loaded), [1, 2])
+        self.assertEqual(loaded.get(2).layer, hidden)
+        self.assertFalse(loaded.layer(hidden).visible)
+        self.assertEqual(loaded.add("oval", [0, 0, 1, 1]), 3)
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a drawing")
+        with self.assertRaises(DocumentError):
+            Document(self.path)
+
+    def test_rejects_truncated_files(self):
+        scene = Scene()
+        for i in range(40):
+            scene.add("polygon", [i, 0, i + 10, 0, i + 5, 10], fill="red", group="strokes")
+        save_document(scene, self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for size in (400, len(data) - 50, len(data) - 1):
+            with open(self.path, "wb") as f:
+                f.write(data[:size])
+            with self.assertRaises(DocumentError):
+                Document(self.path)
+
+    def corrupt(self, section, offset, value):
+        document = Document(self.path)
+        start = document._spans[section][0]
+        document.close()
+        with open(self.path, "r+b") as f:
+            f.seek(start + offset)
+            f.write(value)
+
+    def test_rejects_bad_kinds_and_string_indexes(self):
+        scene = Scene()
+        scene.add("oval", [0, 0, 10, 10], fill="red", group="strokes")
+        group_offset = RECORD_DTYPE.fields["group"][1]
+        for offset, value in ((RECORD_DTYPE.fields["kind"][1], b"\x63"), (group_offset, b"\xff\xff\0\0")):
+            save_document(scene, self.path)
+            self.corrupt("records", offset, value)
+            with self.assertRaises(DocumentError):
+                Document(self.path)
+
+    def test_damaged_document_leaves_the_drawing_alone(self):
+        scene = Scene()
+        scene.add("oval", [0, 0, 10, 10], fill="red")
+        pixels = np.full((4, 4, 4), 255, dtype=np.uint8)
+        save_document(scene, self.path, types.SimpleNamespace(pixels=pixels, origin=(0, 0)))
+        self.corrupt("raster", 16, b"garbage")
+        app = make_app()
+        app.clear_canvas = self.fail
+        app.scene.add("line", [0, 0, 5, 5])
+        with self.assertRaises(DocumentError):
+            open_document(app, self.path)
+        self.assertEqual(len(app.scene), 1)
+        self.assertIsNone(app.document_loader)
+
+
+if __name__ == "__main__":
+    unittest.main()
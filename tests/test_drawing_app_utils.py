@@ -5,7 +5,7 @@ from drawing_app import DrawingApp
 
 # Import utils directly
 from color_utils import rgb_to_hex, set_color_from_rgb
-from undo_utils import undo_last_action
+from undo_utils import UndoStack, undo
 from geometry_utils import rotate_selected_shape, crop_selected_area
 
 class DummyCanvas(tk.Canvas):
@@ -29,21 +29,23 @@ class TestColorUtils(unittest.TestCase):
 class TestUndoUtils(unittest.TestCase):
     def test_undo_empty_stack(self):
         canvas = DummyCanvas()
-        app = type("App", (object,), {"canvas": canvas, "undo_stack": []})
-        undo_last_action(app)  # Should not raise error
+        app = type("App", (object,), {"canvas": canvas, "undo_stack": UndoStack()})
+        undo(app)  # Should not raise error
 
 class TestGeometryUtils(unittest.TestCase):
     def setUp(self):
         self.root = tk.Tk()
         self.app = DrawingApp(self.root)
-        self.app.canvas.selected_item = self.app.canvas.create_polygon(100, 100, 150, 100, 125, 150, fill="blue")
+        shape_id = self.app.scene.add("polygon", [100, 100, 150, 100, 125, 150], fill="blue")
+        self.shape_id = shape_id
+        self.app.canvas.selected_item = self.app.scene.get(shape_id).group
 
     def tearDown(self):
         self.root.destroy()
 
     def test_rotate_selected_shape(self):
         rotate_selected_shape(self.app, 90)
-        coords = self.app.canvas.coords(self.app.canvas.selected_item)
+        coords = self.app.scene.coords(self.shape_id)
         self.assertEqual(len(coords), 6)  # Triangle
 
     def test_crop_selected_area(self):
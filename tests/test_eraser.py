@@ -0,0 +1,67 @@
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from eraser import EraseSession, SegmentIndex, finalize_erase, split_polyline
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import UndoStack, redo, undo
+
+
+def make_app():
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    app = types.SimpleNamespace(canvas=canvas, scene=scene, view=SceneView(canvas, scene), undo_stack=UndoStack(), raster_layer=None)
+    app.segment_index = SegmentIndex(scene)
+    return app
+
+
+class TestSplitPolyline(unittest.TestCase):
+    def test_circle_in_middle_splits_line(self):
+        runs = split_polyline([0, 0, 100, 0], [0], 50, 0, 10)
+        self.assertEqual(runs, [[0, 0, 40, 0], [60, 0, 100, 0]])
+
+    def test_miss_returns_none(self):
+        self.assertIsNone(split_polyline([0, 0, 100, 0], [0], 50, 50, 10))
+
+    def test_erasing_an_end_keeps_the_rest(self):
+        runs = split_polyline([0, 0, 50, 0, 100, 0], [0, 1], 100, 0, 10)
+        self.assertEqual(runs, [[0, 0, 50, 0, 90, 0]])
+
+
+class TestEraseSession(unittest.TestCase):
+    def test_drag_splits_strokes_removes_shapes_and_undoes_once(self):
+        app = make_app()
+        stroke = app.scene.add("line", [0, 50, 200, 50], fill="black", width=2)
+        circle = app.scene.add("oval", [90, 90, 110, 110], fill="red")
+        untouched = app.scene.add("line", [0, 300, 200, 300], fill="black", width=2)
+
+        session = EraseSession(app, 5)
+        for y in range(40, 120, 3):
+            session.add_point(100, y)
+        action = finalize_erase(app, session)
+
+        self.assertNotIn(stroke, app.scene)
+        self.assertNotIn(circle, app.scene)
+        self.assertIn(untouched, app.scene)
+        pieces = [record for record in app.scene if record.kind == "line" and record.id != untouched]
+        self.assertEqual(len(pieces), 2)
+        self.assertIs(app.undo_stack.top(), action)
+
+        undo(app)
+        self.assertEqual(sorted(record.id for record in app.scene), [stroke, circle, untouched])
+        self.assertEqual(list(app.scene.coords(stroke)), [0, 50, 200, 50])
+
+        redo(app)
+        self.assertEqual(sorted(record.id for record in app.scene), sorted([untouched] + [p.id for p in pieces]))
+
+    def test_segment_index_follows_moves(self):
+        app = make_app()
+        stroke = app.scene.add("line", [0, 0, 100, 0], width=2)
+        app.scene.move(stroke, 0, 500)
+        self.assertEqual(app.segment_index.segments_near(50, 0, 5), {})
+        self.assertEqual(app.segment_index.segments_near(50, 500, 5), {stroke: [0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
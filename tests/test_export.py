@@ -0,0 +1,125 @@
+import os
+import struct
+import tempfile
+import threading
+import unittest
+import zlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from export import ExportCancelled, TileRenderer, export_png, export_snapshot, export_svg
+from raster import Bitmap
+from scene_model import Scene
+
+
+def read_png(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 8
+    idat = b""
+    while offset < len(data):
+        length, tag = struct.unpack(">I4s", data[offset:offset + 8])
+        body = data[offset + 8:offset + 8 + length]
+        if tag == b"IHDR":
+            width, height = struct.unpack(">II", body[:8])
+        elif tag == b"IDAT":
+            idat += body
+        offset += 12 + length
+    raw = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width * 3 + 1)
+    return raw[:, 1:].reshape(height, width, 3)
+
+
+def make_scene():
+    scene = Scene()
+    scene.add("rectangle", [10, 10, 120, 60], fill="red", outline="black", width=2)
+    scene.add("line", [0, 100, 150, 140], fill="blue", width=4)
+    scene.add("oval", [60, 40, 140, 90], fill="", outline="green", width=3)
+    top = scene.add_layer()
+    scene.set_layer(top, opacity=0.5)
+    scene.add("polygon", [20, 20, 80, 20, 50, 70], fill="yellow", outline="")
+    mask = np.zeros((5, 6), dtype=bool)
+    mask[1:4, 2:5] = True
+    scene.add("image", [100, 100, 106, 105], fill="purple", outline="", data=Bitmap.from_mask(mask))
+    return scene
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_snapshot_skips_hidden_layers(self):
+        scene = make_scene()
+        scene.set_layer(scene.active_layer, visible=False)
+        snapshot = export_snapshot(scene)
+        self.assertEqual(len(snapshot.layers), 1)
+        self.assertEqual(len(snapshot.layers[0][1]), 3)
+        self.assertEqual(snapshot.bbox, (0, 0, 153, 143))
+
+    def test_tiles_match_a_single_render(self):
+        snapshot = export_snapshot(make_scene())
+        width, height = snapshot.bbox[2:]
+        path = os.path.join(self.dir.name, "out.png")
+        self.assertEqual(export_png(snapshot, path, tile=32, workers=1), (width, height))
+        pixels = read_png(path)
+        np.testing.assert_array_equal(pixels, TileRenderer(snapshot).render(0, 0, width, height))
+        self.assertEqual(tuple(pixels[30, 30]), (255, 127, 0))
+
+    def test_worker_pool_matches_in_process(self):
+        snapshot = export_snapshot(make_scene())
+        local = os.path.join(self.dir.name, "local.png")
+        pooled = os.path.join(self.dir.name, "pooled.png")
+        export_png(snapshot, local, scale=2, tile=64, workers=1)
+        export_png(snapshot, pooled, scale=2, tile=64, workers=2)
+        np.testing.assert_array_equal(read_png(local), read_png(pooled))
+
+    def test_cancel_stops_between_bands_and_leaves_no_file(self):
+        snapshot = export_snapshot(make_scene())
+        path = os.path.join(self.dir.name, "out.png")
+        cancelled = threading.Event()
+        progress = []
+
+        def report(fraction):
+            progress.append(fraction)
+            cancelled.set()
+
+        with self.assertRaises(ExportCancelled):
+            export_png(snapshot, path, tile=32, workers=1, cancelled=cancelled, progress=report)
+        self.assertEqual(len(progress), 1)
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_content_at_negative_coordinates_is_kept(self):
+        scene = Scene()
+        scene.add("rectangle", [-100, -100, -20, -20], fill="red", outline="")
+        scene.add("oval", [10, 10, 60, 60], fill="blue", outline="")
+        snapshot = export_snapshot(scene)
+        self.assertEqual(snapshot.bbox, (-100, -100, 62, 62))
+        path = os.path.join(self.dir.name, "out.png")
+        self.assertEqual(export_png(snapshot, path, tile=64, workers=1), (162, 162))
+        pixels = read_png(path)
+        self.assertEqual(tuple(pixels[40, 40]), (255, 0, 0))
+        self.assertEqual(tuple(pixels[135, 135]), (0, 0, 255))
+
+        svg_path = os.path.join(self.dir.name, "out.svg")
+        export_svg(snapshot, svg_path)
+        self.assertEqual(ET.parse(svg_path).getroot().get("viewBox"), "-100 -100 162 162")
+
+    def test_svg_elements(self):
+        path = os.path.join(self.dir.name, "out.svg")
+        export_svg(export_snapshot(make_scene()), path)
+        root = ET.parse(path).getroot()
+        ns = "{http://www.w3.org/2000/svg}"
+        groups = root.findall(f"{ns}g")
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(groups[1].get("opacity"), "0.5")
+        self.assertEqual([child.tag[len(ns):] for child in groups[0]], ["rect", "polyline", "ellipse"])
+        self.assertEqual(groups[0][0].get("fill"), "#ff0000")
+        self.assertEqual(groups[0][2].get("fill"), "none")
+        self.assertTrue(groups[1][1].get("href").startswith("data:image/png;base64,"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+import numpy as np
+
+from flood_fill import fill_region, span_fill
+from raster import Bitmap, rasterize
+
+
+class TestSpanFill(unittest.TestCase):
+    def test_fill_stops_at_walls(self):
+        similar = np.ones((10, 10), dtype=bool)
+        similar[:, 5] = False
+        mask = span_fill(similar, 1, 1)
+        self.assertTrue(mask[:, :5].all())
+        self.assertFalse(mask[:, 5:].any())
+
+    def test_fill_follows_a_winding_path(self):
+        similar = np.zeros((5, 7), dtype=bool)
+        similar[0, :] = True
+        similar[:, 6] = True
+        similar[4, :] = True
+        mask = span_fill(similar, 0, 4)
+        self.assertEqual(mask.sum(), similar.sum())
+
+    def test_seed_on_a_wall_fills_nothing(self):
+        similar = np.ones((4, 4), dtype=bool)
+        similar[2, 2] = False
+        self.assertFalse(span_fill(similar, 2, 2).any())
+
+
+class TestFillRegion(unittest.TestCase):
+    def test_fill_inside_outlined_square(self):
+        snapshot = [("rectangle", [10, 10, 50, 50], "", "black", 1, None)]
+        bbox, bitmap = fill_region(snapshot, (0, 0, 100, 100), 30, 30)
+        self.assertTrue(10 <= bbox[0] < 13 and 47 < bbox[2] <= 51)
+        self.assertTrue(bitmap.contains(15, 15))
+
+    def test_fill_outside_shape_covers_background(self):
+        snapshot = [("oval", [20, 20, 40, 40], "red", "red", 1, None)]
+        bbox, bitmap = fill_region(snapshot, (0, 0, 60, 60), 1, 1)
+        self.assertEqual(bbox, (0, 0, 60, 60))
+        self.assertFalse(bitmap.contains(30, 30))
+
+    def test_previous_fill_is_rasterized(self):
+        mask = np.ones((5, 5), dtype=bool)
+        pixels = rasterize([("image", [2, 2, 7, 7], "#00ff00", "", 1, Bitmap.from_mask(mask))], 0, 0, 10, 10)
+        self.assertEqual(tuple(pixels[4, 4]), (0, 255, 0))
+        self.assertEqual(tuple(pixels[0, 0]), (255, 255, 255))
+
+    def test_800x600_budget(self):
+        snapshot = [("line", [0, 300, 800, 300], "black", "", 2, None)]
+        fill_region(snapshot, (0, 0, 800, 600), 400, 100)
+        start = time.perf_counter()
+        fill_region(snapshot, (0, 0, 800, 600), 400, 100)
+        self.assertLess(time.perf_counter() - start, 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
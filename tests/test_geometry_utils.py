@@ -0,0 +1,125 @@
+import os
+import tempfile
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from document import load_scene, save_document
+from geometry_utils import (
+    ROTATABLE_KINDS, GroupTransform, TransformCommand, apply_matrix, rotate_matrix, scale_matrix,
+    transform_groups, translate_matrix
+)
+from raster import Bitmap, snapshot_records
+from scene_model import Scene
+from scene_view import SceneView
+
+
+def make_app():
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    return types.SimpleNamespace(canvas=canvas, scene=scene, view=SceneView(canvas, scene))
+
+
+class TestGeometry(unittest.TestCase):
+    def assertCoordsAlmostEqual(self, got, want):
+        self.assertEqual(len(got), len(want))
+        for a, b in zip(got, want):
+            self.assertAlmostEqual(a, b)
+
+    def test_apply_matrix(self):
+        coords = apply_matrix([0, 0, 10, 0], rotate_matrix(90, 5, 0))
+        self.assertCoordsAlmostEqual(coords, [5, -5, 5, 5])
+
+    def test_rotated_oval_keeps_its_box(self):
+        app = make_app()
+        shape_id = app.scene.add("oval", [0, 0, 40, 20], fill="red")
+        group = app.scene.get(shape_id).group
+        transform_groups(app, [group], rotate_matrix(90, 20, 10), ROTATABLE_KINDS)
+        record = app.scene.get(shape_id)
+        self.assertEqual(list(record.coords), [0, 0, 40, 20])
+        self.assertIsNotNone(record.matrix)
+        self.assertCoordsAlmostEqual(record.bbox(), (10, -10, 30, 30))
+        self.assertEqual(app.scene.topmost_at(20, -5), shape_id)
+        self.assertIsNone(app.scene.topmost_at(2, 10))
+        self.assertEqual(app.canvas.type(app.view.item_for(shape_id)), "polygon")
+
+        transform_groups(app, [group], rotate_matrix(-90, 20, 10), ROTATABLE_KINDS)
+        self.assertIsNone(record.matrix)
+        self.assertCoordsAlmostEqual(record.coords, [0, 0, 40, 20])
+        self.assertEqual(app.canvas.type(app.view.item_for(shape_id)), "oval")
+
+    def test_half_turn_folds_back_into_corners(self):
+        app = make_app()
+        shape_id = app.scene.add("rectangle", [0, 0, 40, 20])
+        transform_groups(app, [app.scene.get(shape_id).group], rotate_matrix(180, 0, 0), ROTATABLE_KINDS)
+        record = app.scene.get(shape_id)
+        self.assertIsNone(record.matrix)
+        self.assertCoordsAlmostEqual(record.coords, [-40, -20, 0, 0])
+
+    def test_frames_apply_to_the_original_geometry(self):
+        app = make_app()
+        app.scene.add("polygon", [0, 0, 10, 0, 5, 10], group="g")
+        app.scene.add("oval", [0, 0, 10, 10], group="g")
+        transform = GroupTransform(app.scene, ["g"], ROTATABLE_KINDS)
+        for step in range(1, 200):
+            transform.apply(app, rotate_matrix(step * 7.3, 5, 5))
+        transform.apply(app, rotate_matrix(0, 5, 5))
+        self.assertEqual(list(app.scene.coords(1)), [0, 0, 10, 0, 5, 10])
+        self.assertIsNone(app.scene.get(2).matrix)
+
+    def test_undo_restores_rotated_oval(self):
+        app = make_app()
+        shape_id = app.scene.add("oval", [0, 0, 40, 20])
+        group = app.scene.get(shape_id).group
+        command = TransformCommand([group], rotate_matrix(30, 20, 10), ROTATABLE_KINDS)
+        command.redo(app)
+        app.scene.move(shape_id, 5, 5)
+        moved = app.scene.get(shape_id).matrix
+        self.assertCoordsAlmostEqual(moved[4:], [value + 5 for value in rotate_matrix(30, 20, 10)[4:]])
+        app.scene.move(shape_id, -5, -5)
+        command.undo(app)
+        self.assertIsNone(app.scene.get(shape_id).matrix)
+        self.assertCoordsAlmostEqual(app.scene.coords(shape_id), [0, 0, 40, 20])
+
+    def test_rotated_shapes_snapshot_and_save(self):
+        scene = Scene()
+        shape_id = scene.add("rectangle", [0, 0, 10, 10], fill="blue")
+        scene.set_coords(shape_id, [0, 0, 10, 10], rotate_matrix(45, 5, 5))
+        kind, coords = snapshot_records(scene)[0][:2]
+        self.assertEqual((kind, len(coords)), ("polygon", 8))
+        self.assertCoordsAlmostEqual(coords[:2], (5, 5 - 50 ** 0.5))
+
+        handle, path = tempfile.mkstemp(suffix=".mare")
+        os.close(handle)
+        try:
+            save_document(scene, path)
+            loaded, _ = load_scene(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(loaded.get(shape_id).matrix, rotate_matrix(45, 5, 5))
+        self.assertEqual(loaded.get(shape_id).bbox(), scene.get(shape_id).bbox())
+
+    def test_translation_moves_rotated_shape(self):
+        app = make_app()
+        shape_id = app.scene.add("oval", [0, 0, 40, 20])
+        group = app.scene.get(shape_id).group
+        transform_groups(app, [group], rotate_matrix(90, 20, 10), ROTATABLE_KINDS)
+        before = app.scene.get(shape_id).bbox()
+        transform_groups(app, [group], translate_matrix(100, 0))
+        after = app.scene.get(shape_id).bbox()
+        self.assertCoordsAlmostEqual(after, (before[0] + 100, before[1], before[2] + 100, before[3]))
+
+    def test_images_only_follow_moves(self):
+        app = make_app()
+        image_id = app.scene.add("image", [0, 0, 8, 8], fill="red", data=Bitmap(8, 8, bytes(8)), group="g")
+        rect_id = app.scene.add("rectangle", [0, 0, 8, 8], group="g")
+        transform = GroupTransform(app.scene, ["g"])
+        transform.apply(app, translate_matrix(5, 5))
+        self.assertEqual(list(app.scene.get(image_id).coords), [5, 5, 13, 13])
+        transform.apply(app, scale_matrix(2, 2))
+        self.assertEqual(list(app.scene.get(image_id).coords), [0, 0, 8, 8])
+        self.assertEqual(list(app.scene.get(rect_id).coords), [0, 0, 16, 16])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import time
+import types
+import unittest
+import weakref
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from flood_fill import start_fill
+from jobs import JobPool
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import UndoStack
+from viewport import Viewport
+
+
+class Payload:
+    pass
+
+
+def spin(job, payload):
+    while not job.cancelled.is_set():
+        time.sleep(0.001)
+
+def count(job, n):
+    for i in range(n):
+        job.report((i + 1) / n)
+    return n
+
+def fail(job):
+    raise ValueError("broken")
+
+
+class TestJobPool(unittest.TestCase):
+    def setUp(self):
+        self.canvas = HeadlessCanvas()
+        self.pool = JobPool(self.canvas)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_results_arrive_on_the_polling_thread(self):
+        seen = []
+        progress = []
+        self.pool.submit(
+            count, 1000,
+            on_done=lambda result: seen.append((result, threading.current_thread())),
+            on_progress=progress.append,
+        )
+        self.assertTrue(self.canvas._after)
+        self.assertTrue(self.pool.wait(5))
+        self.assertEqual(seen, [(1000, threading.current_thread())])
+        self.assertTrue(progress)
+        self.assertLessEqual(len(progress), 1000)
+        self.assertEqual(progress[-1], 1.0)
+        self.canvas.run_pending()
+        self.assertFalse(self.canvas._after)
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+        self.pool.submit(fail, on_done=self.fail, on_error=errors.append)
+        self.pool.wait(5)
+        self.assertIsInstance(errors[0], ValueError)
+
+    def test_cancelled_job_frees_its_inputs_and_delivers_nothing(self):
+        payload = Payload()
+        ref = weakref.ref(payload)
+        job = self.pool.submit(spin, payload, on_done=self.fail)
+        del payload
+        time.sleep(0.01)
+        job.cancel()
+        deadline = time.monotonic() + 1
+        while ref() is not None and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.assertIsNone(ref())
+        self.assertTrue(self.pool.wait(5))
+
+    def test_process_job(self):
+        results = []
+        self.pool.submit(pow, 2, 10, on_done=results.append, process=True)
+        self.assertTrue(self.pool.wait(60))
+        self.assertEqual(results, [1024])
+
+
+class TestFillJobs(unittest.TestCase):
+    def test_second_click_supersedes_the_first(self):
+        canvas = HeadlessCanvas(width=200, height=200)
+        scene = Scene()
+        app = types.SimpleNamespace(
+            canvas=canvas, scene=scene, view=SceneView(canvas, scene, viewport=Viewport(200, 200)),
+            raster_layer=None, fill_job=None, fill_tolerance=None, undo_stack=UndoStack(), jobs=JobPool(canvas),
+        )
+        self.addCleanup(app.jobs.shutdown)
+        scene.add("rectangle", [50, 50, 150, 150], outline="black", width=2)
+        app.current_color = "red"
+        first = start_fill(app, 10, 10)
+        app.current_color = "blue"
+        start_fill(app, 100, 100)
+        self.assertTrue(first.cancelled.is_set())
+        self.assertTrue(app.jobs.wait(5))
+        self.assertIsNone(app.fill_job)
+        fills = [record for record in scene if record.kind == "image"]
+        self.assertEqual([record.fill for record in fills], ["blue"])
+        self.assertEqual(len(app.undo_stack), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from eraser import EraseSession, SegmentIndex, finalize_erase
+from layers import LayerCompositor, select_layer, set_layer_opacity, toggle_layer_visible
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import UndoStack
+
+
+def make_app():
+    canvas = HeadlessCanvas(200, 200)
+    scene = Scene()
+    view = SceneView(canvas, scene)
+    app = types.SimpleNamespace(canvas=canvas, scene=scene, view=view, undo_stack=UndoStack(), raster_layer=None)
+    app.segment_index = SegmentIndex(scene)
+    app.compositor = LayerCompositor(canvas, scene, view)
+    return app
+
+
+class TestSceneLayers(unittest.TestCase):
+    def test_records_go_to_active_layer(self):
+        scene = Scene()
+        scene.add("rectangle", [0, 0, 10, 10], fill="red")
+        top = scene.add_layer()
+        shape_id = scene.add("rectangle", [0, 0, 10, 10])
+        self.assertEqual(scene.get(shape_id).layer, top)
+        self.assertEqual(scene.topmost_at(5, 5, layer=0), 1)
+
+    def test_remove_layer_drops_members_and_keeps_last(self):
+        scene = Scene()
+        top = scene.add_layer()
+        scene.add("oval", [0, 0, 10, 10])
+        self.assertTrue(scene.remove_layer(top))
+        self.assertEqual(len(scene), 0)
+        self.assertEqual(scene.active_layer, 0)
+        self.assertFalse(scene.remove_layer(0))
+
+
+class TestLayerCompositor(unittest.TestCase):
+    def test_only_active_layer_is_live(self):
+        app = make_app()
+        for i in range(20):
+            app.scene.add("rectangle", [i, i, i + 5, i + 5])
+        app.scene.add_layer()
+        app.scene.add("oval", [50, 50, 60, 60])
+        self.assertEqual(len(app.canvas.find_withtag("movable")), 1)
+        self.assertEqual(len(app.canvas.find_withtag("layer_cache")), 1)
+        select_layer(app, 0)
+        self.assertEqual(len(app.canvas.find_withtag("movable")), 20)
+
+    def test_active_edits_do_not_touch_caches(self):
+        app = make_app()
+        app.scene.add("rectangle", [0, 0, 50, 50], fill="red")
+        app.scene.add_layer()
+        renders, calls = app.compositor.renders, app.canvas.calls
+        shape_id = app.scene.add("oval", [60, 60, 90, 90], fill="blue")
+        app.scene.move(shape_id, 5, 5)
+        app.scene.remove(shape_id)
+        self.assertEqual(app.compositor.renders, renders)
+        self.assertEqual(app.canvas.calls - calls, 3)
+
+    def test_new_items_stack_under_layers_above(self):
+        app = make_app()
+        app.scene.add("rectangle", [0, 0, 50, 50], fill="red")
+        app.scene.add_layer()
+        app.scene.add("rectangle", [0, 0, 50, 50], fill="green")
+        select_layer(app, 0)
+        shape_id = app.scene.add("oval", [10, 10, 20, 20])
+        order = app.canvas.find_all()
+        self.assertLess(order.index(app.view.item_for(shape_id)), order.index(app.view.ceiling))
+
+    def test_opacity_and_visibility(self):
+        app = make_app()
+        app.scene.add("rectangle", [0, 0, 50, 50], fill="#ff0000", outline="")
+        app.scene.add_layer()
+        select_layer(app, 0)
+        set_layer_opacity(app, 0.5)
+        select_layer(app, 1)
+        pixels = app.compositor.composite(app.scene.layers()[:1])
+        self.assertEqual(tuple(pixels[25, 25]), (255, 0, 0, 128))
+        select_layer(app, 0)
+        toggle_layer_visible(app)
+        self.assertEqual(app.canvas.itemcget(app.view.item_for(1), "state"), "hidden")
+
+    def test_eraser_only_touches_active_layer(self):
+        app = make_app()
+        app.scene.add("line", [0, 50, 100, 50], fill="black", width=2)
+        app.scene.add_layer()
+        session = EraseSession(app, 10)
+        session.add_point(50, 50)
+        finalize_erase(app, session)
+        self.assertEqual(len(app.scene), 1)
+        self.assertEqual(len(app.undo_stack), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
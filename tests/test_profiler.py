@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import tkinter as tk
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from profiler import HUD_TAG, PerfHud, Profiler, bucket_bound, bucket_index, timed
+from scene_model import Scene
+from scene_view import SceneView
+from shape_selector import on_click, on_hover, on_release
+
+
+class TkCanvas:
+    # Just the interpreter a tk.Canvas would send its commands through.
+    def __init__(self):
+        self.tk = tk.Tcl()
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        canvas = HeadlessCanvas()
+        scene = Scene()
+        self.view = SceneView(canvas, scene)
+        self.canvas = canvas
+        canvas.undo_stack = None
+        canvas.scheduler = types.SimpleNamespace(pending=lambda key: False)
+        canvas.hovered_handle = None
+        for i in range(5):
+            scene.add("rectangle", [i * 20, 0, i * 20 + 10, 10], fill="red")
+        self.profiler = Profiler(canvas, self.view.item_count)
+        self.addCleanup(self.profiler.disable)
+
+    def event(self, x, y):
+        return types.SimpleNamespace(widget=self.canvas, x=x, y=y, state=0)
+
+    def test_records_only_while_enabled(self):
+        on_click(self.event(5, 5))
+        self.assertEqual(self.profiler.events, {})
+
+        self.profiler.enable()
+        for x in (5, 25, 300):
+            on_click(self.event(x, 5))
+            on_release(self.event(x, 5))
+        on_hover(self.event(1, 1))
+        stats = self.profiler.stats("on_click")
+        self.assertEqual(stats["count"], 3)
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertLessEqual(stats["p99_ms"], stats["max_ms"])
+        self.assertGreater(stats["calls_mean"], 0)
+        self.assertEqual(stats["items"], 5 + 5 * len(self.view.bbox_rects))
+        self.assertEqual(sum(n for _, n in stats["histogram"]), 3)
+        self.assertEqual(self.profiler.stats("on_hover")["count"], 1)
+
+        self.profiler.disable()
+        on_click(self.event(5, 5))
+        self.assertEqual(self.profiler.stats("on_click")["count"], 3)
+
+    def test_report_and_hud(self):
+        self.profiler.enable()
+        timed("work")(lambda: None)()
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            self.profiler.dump(path)
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            os.remove(path)
+        self.assertEqual(report["events"]["work"]["count"], 1)
+        self.assertIn("python", report["meta"])
+
+        hud = PerfHud(self.canvas, self.profiler)
+        hud.toggle()
+        self.assertEqual(len(self.canvas.find_withtag(HUD_TAG)), 2)
+        # One refresh redraws the overlay and queues the next.
+        _, (func, args) = self.canvas._after.popitem()
+        func(*args)
+        self.assertEqual(len(self.canvas.find_withtag(HUD_TAG)), 2)
+        self.assertEqual(len(self.canvas._after), 1)
+        hud.toggle()
+        self.assertFalse(self.canvas.find_withtag(HUD_TAG))
+        self.assertFalse(self.canvas._after)
+        # The profiler was already on (as with --profile), so it stays on.
+        self.assertTrue(self.profiler.enabled)
+
+    def test_hiding_the_hud_stops_the_profiler_it_started(self):
+        hud = PerfHud(self.canvas, self.profiler)
+        hud.show()
+        self.assertTrue(self.profiler.enabled)
+        hud.hide()
+        self.assertFalse(self.profiler.enabled)
+        on_click(self.event(5, 5))
+        self.assertEqual(self.profiler.events, {})
+
+    def test_counts_tcl_commands_of_a_tk_canvas(self):
+        canvas = TkCanvas()
+        interp = canvas.tk
+        profiler = Profiler(canvas)
+        profiler.enable()
+        self.assertIsNot(canvas.tk, interp)
+        timed("two")(lambda: (canvas.tk.call("set", "x", 1), canvas.tk.eval("set y 2")))()
+        self.assertEqual(profiler.stats("two")["calls_mean"], 2)
+        profiler.disable()
+        self.assertIs(canvas.tk, interp)
+
+    def test_buckets(self):
+        for seconds in (1e-6, 1e-4, 0.003, 0.25, 100):
+            index = bucket_index(seconds)
+            self.assertGreaterEqual(bucket_bound(index), min(seconds, bucket_bound(index)))
+            if index:
+                self.assertLess(bucket_bound(index - 1), seconds)
+
+
+if __name__ == "__main__":
+    unittest.main()
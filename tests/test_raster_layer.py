@@ -0,0 +1,150 @@
+import os
+import tempfile
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from eraser import EraseSession, SegmentIndex, finalize_erase
+from document import Document, save_document
+from export import export_snapshot
+from raster_layer import MAX_RASTER_SIDE, RasterLayer, flatten_shapes, rasterize_stroke
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import UndoStack, undo
+
+
+def make_app(width=512, height=512):
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    app = types.SimpleNamespace(canvas=canvas, scene=scene, view=SceneView(canvas, scene), undo_stack=UndoStack())
+    app.segment_index = SegmentIndex(scene)
+    app.raster_layer = RasterLayer(canvas, width, height, tile_size=128)
+    return app
+
+
+class TestRasterLayer(unittest.TestCase):
+    def test_only_touched_tiles_upload(self):
+        app = make_app()
+        layer = app.raster_layer
+        layer.draw("line", [10, 10, 60, 60], "red", "", 4)
+        self.assertEqual(layer.dirty, {(0, 0)})
+        layer.flush()
+        self.assertEqual(layer.uploads, 1)
+        self.assertEqual(layer.dirty, set())
+        self.assertEqual(tuple(layer.pixels[35, 35]), (255, 0, 0, 255))
+
+    def test_stroke_undo_restores_tiles(self):
+        app = make_app()
+        layer = app.raster_layer
+        rasterize_stroke(app, [100, 20, 300, 20], "blue", 6)
+        self.assertTrue(layer.pixels[20, 200, 3])
+        undo(app)
+        self.assertFalse(layer.pixels[..., 3].any())
+
+    def test_erase_drag_is_one_undo_entry(self):
+        app = make_app()
+        layer = app.raster_layer
+        layer.draw("rectangle", [0, 0, 200, 200], "black", "", 1)
+        before = layer.pixels.copy()
+        session = EraseSession(app, 10)
+        session.add_point(50, 50)
+        session.add_point(150, 50)
+        finalize_erase(app, session)
+        self.assertEqual(layer.pixels[50, 100, 3], 0)
+        self.assertEqual(len(app.undo_stack), 1)
+        undo(app)
+        self.assertTrue((layer.pixels == before).all())
+
+    def test_flatten_moves_shapes_into_layer(self):
+        app = make_app()
+        app.scene.add("rectangle", [20, 20, 80, 80], fill="green")
+        app.scene.add("oval", [200, 200, 260, 260], fill="red")
+        flatten_shapes(app)
+        self.assertEqual(len(list(app.scene)), 0)
+        self.assertEqual(app.canvas.item_count(), 0)
+        self.assertEqual(tuple(app.raster_layer.pixels[50, 50, :3]), (0, 128, 0))
+        undo(app)
+        self.assertEqual(len(list(app.scene)), 2)
+        self.assertFalse(app.raster_layer.pixels[..., 3].any())
+
+    def test_flatten_takes_only_the_active_editable_layer(self):
+        app = make_app()
+        scene = app.scene
+        bottom = scene.active_layer
+        kept = scene.add("rectangle", [20, 20, 80, 80], fill="green")
+        top = scene.add_layer("Top")
+        hidden = scene.add("oval", [100, 100, 160, 160], fill="red")
+        scene.set_layer(top, visible=False)
+        scene.set_active_layer(bottom)
+        scene.set_layer(bottom, locked=True)
+        self.assertIsNone(flatten_shapes(app))
+        self.assertFalse(app.raster_layer.pixels[..., 3].any())
+
+        scene.set_layer(bottom, locked=False)
+        flatten_shapes(app)
+        self.assertIsNone(scene.get(kept))
+        self.assertIsNotNone(scene.get(hidden))
+        self.assertFalse(app.raster_layer.pixels[130, 130, 3])
+
+    def test_flatten_keeps_layer_stacking(self):
+        app = make_app()
+        scene = app.scene
+        bottom = scene.active_layer
+        below = scene.add("rectangle", [20, 20, 100, 100], fill="green")
+        scene.add_layer("Top")
+        above = scene.add("rectangle", [60, 60, 140, 140], fill="red")
+        # The top layer would end up under the bottom one's shapes.
+        self.assertIsNone(flatten_shapes(app))
+        self.assertIsNotNone(scene.get(above))
+        self.assertFalse(app.raster_layer.pixels[..., 3].any())
+
+        scene.set_active_layer(bottom)
+        flatten_shapes(app)
+        app.raster_layer.flush()
+        self.assertIsNone(scene.get(below))
+        stacking = app.canvas.find_all()
+        raster = app.canvas.find_withtag("raster")
+        self.assertTrue(raster)
+        self.assertLess(max(stacking.index(item) for item in raster), stacking.index(app.view.item_for(above)))
+
+    def test_painting_outside_the_initial_extent_grows_the_buffer(self):
+        app = make_app()
+        layer = app.raster_layer
+        rasterize_stroke(app, [-300, -40, -100, -40], "red", 4)
+        rasterize_stroke(app, [700, 900, 800, 900], "blue", 4)
+        self.assertEqual(layer.origin, (-384, -128))
+        self.assertEqual(layer.extent(), (-384, -128, 896, 1024))
+        ox, oy = layer.origin
+        self.assertEqual(tuple(layer.pixels[-40 - oy, -200 - ox]), (255, 0, 0, 255))
+        self.assertEqual(tuple(layer.pixels[900 - oy, 750 - ox, :3]), (0, 0, 255))
+        self.assertIn((-2, -1), layer.dirty)
+
+        handle, path = tempfile.mkstemp(suffix=".mare")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        save_document(app.scene, path, layer)
+        document = Document(path)
+        origin, pixels = document.raster()
+        document.close()
+        self.assertEqual(origin, layer.origin)
+        snapshot = export_snapshot(app.scene, (origin, pixels))
+        self.assertEqual(snapshot.bbox[:2], (-302, -42))
+
+        undo(app)
+        undo(app)
+        self.assertFalse(layer.pixels[..., 3].any())
+
+    def test_growth_past_the_limit_is_clipped_and_shown(self):
+        app = make_app()
+        layer = app.raster_layer
+        self.assertFalse(layer.grow(0, 0, MAX_RASTER_SIDE + 1, 10))
+        layer.draw("line", [100, 100, MAX_RASTER_SIDE * 2, 100], "red", "", 2)
+        self.assertEqual(layer.extent(), (0, 0, 512, 512))
+        self.assertTrue(layer.pixels[100, 511, 3])
+        self.assertTrue(app.canvas.find_withtag("raster_bounds"))
+        app.canvas.run_pending()
+        self.assertFalse(app.canvas.find_withtag("raster_bounds"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from render_scheduler import RenderScheduler
+
+
+class ManualWidget:
+    def __init__(self):
+        self.callbacks = {}
+        self._next = 0
+
+    def _add(self, callback):
+        self._next += 1
+        after_id = f"after#{self._next}"
+        self.callbacks[after_id] = callback
+        return after_id
+
+    def after(self, ms, callback):
+        return self._add(callback)
+
+    def after_idle(self, callback):
+        return self._add(callback)
+
+    def after_cancel(self, after_id):
+        self.callbacks.pop(after_id, None)
+
+    def run(self):
+        callbacks, self.callbacks = self.callbacks, {}
+        for callback in callbacks.values():
+            callback()
+
+
+class TestRenderScheduler(unittest.TestCase):
+    def setUp(self):
+        self.widget = ManualWidget()
+        self.scheduler = RenderScheduler(self.widget, fps=60)
+
+    def test_requests_coalesce_to_latest(self):
+        seen = []
+        for x in range(100):
+            self.scheduler.request("drag", lambda x=x: seen.append(x))
+        self.assertEqual(len(self.widget.callbacks), 1)
+        self.widget.run()
+        self.assertEqual(seen, [99])
+        self.assertEqual(self.scheduler.frames, 1)
+
+    def test_work_requested_during_flush_runs_in_same_frame(self):
+        seen = []
+        self.scheduler.request("drag", lambda: self.scheduler.request("view", lambda: seen.append("view")))
+        self.widget.run()
+        self.assertEqual(seen, ["view"])
+        self.assertEqual(self.widget.callbacks, {})
+
+    def test_cancel_and_flush_now(self):
+        seen = []
+        self.scheduler.request("preview", lambda: seen.append("preview"))
+        self.scheduler.cancel("preview")
+        self.assertEqual(self.widget.callbacks, {})
+        self.scheduler.request("drag", lambda: seen.append("drag"))
+        self.scheduler.flush_now()
+        self.assertEqual(seen, ["drag"])
+        self.assertEqual(self.widget.callbacks, {})
+
+    def test_invalid_fps(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.set_fps(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
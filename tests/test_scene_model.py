@@ -0,0 +1,46 @@
+import unittest
+
+from scene_model import Scene, bbox_corners
+
+
+class TestScene(unittest.TestCase):
+    def setUp(self):
+        self.scene = Scene()
+        self.events = []
+        self.scene.subscribe(lambda event, record: self.events.append(event))
+
+    def test_add_assigns_group_and_notifies(self):
+        shape_id = self.scene.add("polygon", [0, 0, 10, 0, 5, 10], fill="red", outline="red")
+        record = self.scene.get(shape_id)
+        self.assertEqual(record.group, f"group_{shape_id}")
+        self.assertEqual(self.scene.group_members(record.group), [shape_id])
+        self.assertEqual(record.bbox(), (0, 0, 10, 10))
+        self.assertEqual(self.events, ["add"])
+
+    def test_move_group_updates_coords_and_bbox(self):
+        shape_id = self.scene.add("oval", [0, 0, 10, 10])
+        group = self.scene.get(shape_id).group
+        self.scene.move_group(group, 5, -5)
+        self.assertEqual(list(self.scene.coords(shape_id)), [5, -5, 15, 5])
+        self.assertEqual(self.scene.group_bbox(group), (5, -5, 15, 5))
+
+    def test_shared_group_bbox(self):
+        a = self.scene.add("oval", [0, 0, 10, 10], group="group_a")
+        self.scene.add("polygon", [20, 20, 30, 20, 25, 40], group="group_a")
+        self.assertEqual(self.scene.group_bbox("group_a"), (0, 0, 30, 40))
+        self.assertEqual(bbox_corners(self.scene.group_bbox("group_a"))[2], (30, 40))
+        self.scene.remove(a)
+        self.assertEqual(self.scene.group_bbox("group_a"), (20, 20, 30, 40))
+
+    def test_remove_group(self):
+        shape_id = self.scene.add("rectangle", [0, 0, 10, 10])
+        group = self.scene.get(shape_id).group
+        self.scene.remove_group(group)
+        self.assertEqual(len(self.scene), 0)
+        self.assertFalse(self.scene.has_group(group))
+        self.assertIsNone(self.scene.group_bbox(group))
+        self.assertEqual(self.events, ["add", "remove"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import tkinter as tk
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from geometry_utils import TransformCommand, rotate_selected_shape, transform_groups, translate_matrix
+from render_scheduler import RenderScheduler
+from scene_model import Scene
+from scene_view import SELECTED_TAG, CanvasBatch, SceneView
+from selection_helpers import delete_selected_item, recolor_selection, select_groups, selected_groups
+from undo_utils import UndoStack, undo
+
+
+def make_app(shapes=10, scheduler=False):
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    scheduler = RenderScheduler(canvas) if scheduler else None
+    app = types.SimpleNamespace(
+        canvas=canvas, scene=scene, view=SceneView(canvas, scene, scheduler), undo_stack=UndoStack()
+    )
+    for i in range(shapes):
+        scene.add("rectangle", [i * 20, 0, i * 20 + 10, 10], fill="red", group=f"g{i:03}")
+    return app
+
+
+class FakeTclCanvas:
+    # Records what a batched script would do to a canvas named .c.
+    def __init__(self):
+        self.tk = tk.Tcl()
+        self.tk.eval("proc .c args { lappend ::calls $args }")
+
+    def __str__(self):
+        return ".c"
+
+    def calls(self):
+        return [list(self.tk.splitlist(call)) for call in self.tk.splitlist(self.tk.eval("set ::calls"))]
+
+
+class TestSelection(unittest.TestCase):
+    def assertCoordsAlmostEqual(self, got, want):
+        self.assertEqual(len(got), len(want))
+        for a, b in zip(got, want):
+            self.assertAlmostEqual(a, b)
+
+    def test_batch_is_one_tcl_script(self):
+        canvas = FakeTclCanvas()
+        batch = CanvasBatch(canvas)
+        batch.coords(3, [1, 2.5, 3, 4])
+        batch.itemconfig("group 1", fill="", dash=(2, 2))
+        batch.addtag_items(SELECTED_TAG, [4, 5])
+        batch.delete([6, 7])
+        batch.send()
+        self.assertEqual(canvas.calls(), [
+            ["coords", "3", "1.0", "2.5", "3.0", "4.0"],
+            ["itemconfigure", "group 1", "-fill", "", "-dash", "2 2"],
+            ["addtag", "selected", "withtag", "4"],
+            ["addtag", "selected", "withtag", "5"],
+            ["delete", "6", "7"],
+        ])
+
+    def test_multi_selection_moves_by_tag(self):
+        app = make_app()
+        groups = [f"g{i:03}" for i in range(5)]
+        select_groups(app, groups)
+        self.assertTrue(app.view.multi)
+        self.assertEqual(selected_groups(app), groups)
+        self.assertEqual(len(app.canvas.find_withtag(SELECTED_TAG)), 5 * 6)
+        self.assertEqual(app.view.selection_bbox(), (0, 0, 90, 10))
+
+        calls = app.canvas.calls
+        transform_groups(app, groups, translate_matrix(5, 7))
+        self.assertEqual(app.canvas.calls - calls, 1 + 5)
+        for i in range(5):
+            item = app.view.item_for(i + 1)
+            self.assertEqual(app.canvas.coords(item), [i * 20 + 5, 7, i * 20 + 15, 17])
+        self.assertEqual(app.view.selection_bbox(), (5, 7, 95, 17))
+
+        select_groups(app, ["g000"])
+        self.assertFalse(app.canvas.find_withtag(SELECTED_TAG))
+        handle = app.view.handles["g000"][0]
+        self.assertEqual(app.canvas.coords(handle), [0, 2, 10, 12])
+
+    def test_rotation_and_undo_cover_the_selection(self):
+        app = make_app()
+        select_groups(app, ["g000", "g001"])
+        rotate_selected_shape(app, 180)
+        self.assertIsInstance(app.undo_stack.top(), TransformCommand)
+        self.assertCoordsAlmostEqual(app.scene.coords(1), [20, 0, 30, 10])
+        self.assertCoordsAlmostEqual(app.scene.coords(2), [0, 0, 10, 10])
+        undo(app)
+        self.assertCoordsAlmostEqual(app.scene.coords(1), [0, 0, 10, 10])
+
+    def test_delete_and_recolor_selection(self):
+        app = make_app(scheduler=True)
+        select_groups(app, ["g001", "g002", "g003"])
+        recolor_selection(app, "blue")
+        app.canvas.run_pending()
+        self.assertEqual(app.scene.get(2).fill, "blue")
+        self.assertEqual(app.canvas.itemcget(app.view.item_for(2), "fill"), "blue")
+        self.assertEqual(app.canvas.itemcget(app.view.item_for(2), "width"), 3)
+
+        calls = app.canvas.calls
+        delete_selected_item(app)
+        app.canvas.run_pending()
+        self.assertEqual(len(app.scene), 7)
+        self.assertIsNone(app.canvas.selected_item)
+        self.assertLess(app.canvas.calls - calls, 10)
+        self.assertEqual(app.canvas.item_count(), 7)
+
+        undo(app)
+        app.canvas.run_pending()
+        self.assertEqual(len(app.scene), 10)
+        undo(app)
+        self.assertEqual(app.scene.get(2).fill, "red")
+
+
+if __name__ == "__main__":
+    unittest.main()
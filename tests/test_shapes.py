@@ -0,0 +1,58 @@
+import math
+import unittest
+
+from shapes import (
+    PolygonShape, Shape, SHAPE_REGISTRY, load_shape_plugins, register_shape, shape_for, shape_names, unit_polygon
+)
+
+
+class TestShapeRegistry(unittest.TestCase):
+    def test_builtin_cycle(self):
+        self.assertEqual(shape_names()[:3], ["Circle", "Triangle", "Square"])
+        self.assertNotIn("Polygon", shape_names())
+
+    def test_instances_are_shared(self):
+        self.assertIs(shape_for("Triangle", True), shape_for("Triangle", True))
+        self.assertIsNot(shape_for("Triangle", True), shape_for("Triangle", False))
+        self.assertIs(shape_for("Polygon", False, 7), shape_for("Polygon", False, 7))
+
+    def test_plugin_registration(self):
+        @register_shape("TestDiamond")
+        class Diamond(Shape):
+            __slots__ = ()
+            kind = "polygon"
+
+            def points(self, x1, y1, x2, y2):
+                cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+                return [cx, y1, x2, cy, cx, y2, x1, cy]
+
+        try:
+            self.assertIn("TestDiamond", shape_names())
+            self.assertEqual(shape_for("TestDiamond").points(0, 0, 10, 10), [5, 0, 10, 5, 5, 10, 0, 5])
+        finally:
+            del SHAPE_REGISTRY["TestDiamond"]
+            from shapes import _CYCLE
+            _CYCLE.remove("TestDiamond")
+
+    def test_bundled_plugins_are_discovered(self):
+        modules = [module.__name__ for module in load_shape_plugins()]
+        self.assertIn("shape_plugins.diamond", modules)
+        self.assertIn("Diamond", shape_names())
+        self.assertEqual(shape_for("Diamond").points(0, 0, 10, 10), [5, 0, 10, 5, 5, 10, 0, 5])
+
+
+class TestPolygonGeometry(unittest.TestCase):
+    def test_matches_direct_trigonometry(self):
+        sides = 9
+        points = PolygonShape(sides, reverse=True).points(0, 0, 100, 60)
+        step = 2 * math.pi / sides
+        for i in range(sides):
+            self.assertAlmostEqual(points[2 * i], 50 + 30 * math.cos(-i * step))
+            self.assertAlmostEqual(points[2 * i + 1], 30 + 30 * math.sin(-i * step))
+
+    def test_unit_table_is_cached(self):
+        self.assertIs(unit_polygon(64, False), unit_polygon(64, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
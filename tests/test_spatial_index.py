@@ -0,0 +1,62 @@
+import random
+import unittest
+
+from scene_model import Scene
+from spatial_index import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+    def test_insert_query_remove(self):
+        index = GridIndex(cell_size=10)
+        index.insert("a", (0, 0, 5, 5))
+        index.insert("b", (50, 50, 60, 60))
+        self.assertEqual(index.query_point(2, 2), {"a"})
+        self.assertEqual(index.query_rect(0, 0, 100, 100), {"a", "b"})
+        index.update("a", (70, 70, 80, 80))
+        self.assertEqual(index.query_point(2, 2), set())
+        self.assertEqual(index.query_point(75, 75), {"a"})
+        index.remove("b")
+        self.assertEqual(index.query_rect(0, 0, 100, 100), {"a"})
+
+    def test_oversize_items_are_found(self):
+        index = GridIndex(cell_size=1)
+        index.insert("big", (0, 0, 1000, 1000))
+        self.assertEqual(index.query_point(500, 500), {"big"})
+        index.remove("big")
+        self.assertEqual(len(index), 0)
+
+
+class TestScenePicking(unittest.TestCase):
+    def test_topmost_follows_creation_order(self):
+        scene = Scene()
+        bottom = scene.add("rectangle", [0, 0, 100, 100], fill="red")
+        top = scene.add("oval", [40, 40, 60, 60], fill="blue")
+        self.assertEqual(scene.topmost_at(50, 50), top)
+        self.assertEqual(scene.topmost_at(10, 10), bottom)
+        self.assertIsNone(scene.topmost_at(200, 200))
+
+    def test_outline_only_polygon_hit_on_edge(self):
+        scene = Scene()
+        shape_id = scene.add("polygon", [0, 0, 100, 0, 100, 100, 0, 100])
+        self.assertEqual(scene.shapes_at(50, 0, 2), [shape_id])
+        self.assertEqual(scene.shapes_at(50, 50, 2), [])
+
+    def test_index_tracks_moves(self):
+        scene = Scene()
+        shape_id = scene.add("oval", [0, 0, 10, 10], fill="black")
+        scene.move_group(scene.get(shape_id).group, 500, 500)
+        self.assertIsNone(scene.topmost_at(5, 5))
+        self.assertEqual(scene.topmost_at(505, 505), shape_id)
+
+    def test_dense_scene_pick(self):
+        rng = random.Random(7)
+        scene = Scene()
+        for _ in range(5000):
+            x, y = rng.uniform(0, 4000), rng.uniform(0, 4000)
+            scene.add("oval", [x, y, x + 20, y + 20], fill="black")
+        x1, y1, x2, y2 = scene.get(1234).bbox()
+        self.assertIn(1234, scene.shapes_at((x1 + x2) / 2, (y1 + y2) / 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
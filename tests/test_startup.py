@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+import unittest
+
+from benchmarks.bench_suite import REPO, bench_import
+from profiler import StartupProfile
+
+# Cold-start budgets, several times what a typical machine needs, so only
+# a real regression (e.g. NumPy back on the import path) trips them.
+IMPORT_BUDGET_MS = 150
+FIRST_PAINT_BUDGET_MS = 1500
+# Loaded on first use, never by startup.
+LAZY_MODULES = (
+    "numpy", "raster", "raster_layer", "flood_fill", "document", "export", "batch_render",
+    "multiprocessing", "tkinter.filedialog", "tkinter.messagebox", "tkinter.colorchooser",
+)
+
+
+def has_display():
+    try:
+        tk.Tk().destroy()
+    except tk.TclError:
+        return False
+    return True
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_modules_load_on_first_use(self):
+        code = f"import sys, drawing_app; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+        out = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_import_within_budget(self):
+        self.assertLess(bench_import()["median_ms"], IMPORT_BUDGET_MS)
+
+    def test_startup_profile_report(self):
+        startup = StartupProfile(time.perf_counter(), hotspots=3)
+        sorted(range(1000))
+        startup.mark("build")
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            startup.finish(path)
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            os.remove(path)
+        self.assertEqual(list(report["phases"]), ["imports", "build"])
+        self.assertAlmostEqual(report["total_ms"], sum(report["phases"].values()), places=3)
+        self.assertLessEqual(len(report["hotspots"]), 3)
+
+    @unittest.skipUnless(has_display(), "needs a display")
+    def test_first_paint_within_budget(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            subprocess.run(
+                [sys.executable, "drawing_app.py", f"--startup-profile={path}", "--exit-after-startup"],
+                cwd=REPO, check=True, timeout=60,
+            )
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            os.remove(path)
+        self.assertIn("first paint", report["phases"])
+        self.assertLess(report["total_ms"], FIRST_PAINT_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from strokes import StrokeBuilder, simplify, stroke_tolerance
+
+
+class TestSimplify(unittest.TestCase):
+    def test_collinear_points_collapse_to_endpoints(self):
+        points = []
+        for i in range(1000):
+            points.extend([i, 2 * i])
+        self.assertEqual(list(simplify(points, 0.5)), [0, 0, 999, 1998])
+
+    def test_corner_is_kept(self):
+        points = [0, 0, 5, 0.1, 10, 0, 10, 5, 10, 10]
+        self.assertEqual(list(simplify(points, 1)), [0, 0, 10, 0, 10, 10])
+
+    def test_tolerance_tracks_brush_size(self):
+        self.assertEqual(stroke_tolerance(1), 0.5)
+        self.assertEqual(stroke_tolerance(8), 4)
+
+
+class TestStrokeBuilder(unittest.TestCase):
+    def test_flush_appends_only_new_points(self):
+        canvas = HeadlessCanvas()
+        stroke = StrokeBuilder(canvas, "black", 2)
+        stroke.add_point(0, 0)
+        stroke.flush()
+        self.assertIsNone(stroke.item)
+        for i in range(1, 200):
+            stroke.add_point(i, i % 7)
+            stroke.flush()
+        self.assertEqual(len(canvas.coords(stroke.item)), 400)
+        # One create plus one insert per later flush; nothing is resent.
+        self.assertEqual(canvas.calls, 1 + 198 + 1)
+
+    def test_duplicate_points_are_dropped(self):
+        stroke = StrokeBuilder(HeadlessCanvas(), "black", 2)
+        stroke.add_point(3, 4)
+        stroke.add_point(3, 4)
+        self.assertEqual(len(stroke), 1)
+
+    def test_finish_removes_live_item(self):
+        canvas = HeadlessCanvas()
+        stroke = StrokeBuilder(canvas, "black", 2)
+        for i in range(10):
+            stroke.add_point(i, 0)
+        stroke.flush()
+        self.assertEqual(list(stroke.finish(1)), [0, 0, 9, 0])
+        self.assertEqual(canvas.item_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
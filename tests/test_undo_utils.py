@@ -0,0 +1,79 @@
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from geometry_utils import TransformCommand, rotate_matrix, scale_matrix, translate_matrix
+from scene_model import Scene
+from scene_view import SceneView
+from undo_utils import AddCommand, RemoveCommand, UndoStack, redo, undo
+
+
+def make_app(budget=1024 * 1024):
+    canvas = HeadlessCanvas()
+    scene = Scene()
+    return types.SimpleNamespace(canvas=canvas, scene=scene, view=SceneView(canvas, scene), undo_stack=UndoStack(budget))
+
+
+def add_shape(app, coords, kind="polygon"):
+    shape_id = app.scene.add(kind, coords)
+    group = app.scene.get(shape_id).group
+    app.undo_stack.push(AddCommand.for_group(app.scene, group))
+    return shape_id, group
+
+
+class TestUndoStack(unittest.TestCase):
+    def test_add_undo_redo_keeps_id(self):
+        app = make_app()
+        shape_id, _ = add_shape(app, [0, 0, 10, 0, 5, 10])
+        undo(app)
+        self.assertNotIn(shape_id, app.scene)
+        redo(app)
+        self.assertIn(shape_id, app.scene)
+        self.assertIsNotNone(app.view.item_for(shape_id))
+
+    def test_push_clears_redo(self):
+        app = make_app()
+        add_shape(app, [0, 0, 10, 0, 5, 10])
+        undo(app)
+        add_shape(app, [0, 0, 20, 0, 5, 10])
+        self.assertFalse(app.undo_stack.can_redo())
+
+    def test_remove_command(self):
+        app = make_app()
+        shape_id, group = add_shape(app, [0, 0, 10, 0, 5, 10])
+        app.undo_stack.push(RemoveCommand(app.scene.remove_group(group)))
+        undo(app)
+        self.assertIn(shape_id, app.scene)
+        redo(app)
+        self.assertNotIn(shape_id, app.scene)
+
+    def test_drag_frames_merge_into_one_entry(self):
+        app = make_app()
+        shape_id, group = add_shape(app, [0, 0, 10, 0, 5, 10])
+        for matrix in (translate_matrix(5, 0), scale_matrix(2, 2, 5, 0), rotate_matrix(30, 10, 5)):
+            command = TransformCommand([group], matrix, drag=1)
+            command.redo(app)
+            app.undo_stack.push(command)
+        self.assertEqual(len(app.undo_stack), 2)
+        undo(app)
+        for got, want in zip(app.scene.coords(shape_id), [0, 0, 10, 0, 5, 10]):
+            self.assertAlmostEqual(got, want)
+
+    def test_budget_evicts_oldest(self):
+        app = make_app(budget=2000)
+        ids = []
+        for i in range(10):
+            shape_id, group = add_shape(app, [i, 0] * 20, "line")
+            ids.append(shape_id)
+            app.undo_stack.push(RemoveCommand(app.scene.remove_group(group)))
+        self.assertLessEqual(app.undo_stack.nbytes, 2000)
+        self.assertGreater(app.undo_stack.evicted, 0)
+        undo(app)
+        self.assertIn(ids[-1], app.scene)
+        while app.undo_stack:
+            undo(app)
+        self.assertNotIn(ids[0], app.scene)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import types
+import unittest
+
+from benchmarks.headless_canvas import HeadlessCanvas
+from scene_model import Scene
+from scene_view import SceneView
+from shape_selector import on_click, on_release
+from viewport import SCREEN_TAG, Viewport, lod_level
+
+
+class TestViewport(unittest.TestCase):
+    def setUp(self):
+        self.canvas = HeadlessCanvas(width=200, height=100)
+        self.scene = Scene()
+        self.viewport = Viewport(200, 100)
+        self.view = SceneView(self.canvas, self.scene, viewport=self.viewport)
+        self.canvas.undo_stack = None
+        self.canvas.scheduler = types.SimpleNamespace(pending=lambda key: False)
+        self.canvas.hovered_handle = None
+        self.canvas.selected_item = None
+        # A row of squares running far off to the right.
+        self.ids = [self.scene.add("rectangle", [x, 10, x + 10, 20], fill="red") for x in range(0, 5000, 50)]
+
+    def test_only_shapes_near_the_view_have_items(self):
+        # Region is the 200x100 view grown by half its size on every side.
+        live = {shape_id for shape_id in self.ids if self.view.item_for(shape_id) is not None}
+        self.assertEqual(live, {shape_id for shape_id in self.ids if self.scene.get(shape_id).bbox()[0] <= 300})
+
+        self.view.set_view(1.0, 2000, 0)
+        live = {shape_id for shape_id in self.ids if self.view.item_for(shape_id) is not None}
+        self.assertTrue(live)
+        for shape_id in live:
+            x1, _, x2, _ = self.scene.get(shape_id).bbox()
+            self.assertTrue(1900 <= x2 and x1 <= 2300)
+        self.assertEqual(len(self.canvas.find_withtag("movable")), len(live))
+
+    def test_pan_moves_items_but_not_screen_items(self):
+        item = self.view.item_for(self.ids[1])
+        hud = self.canvas.create_rectangle(0, 0, 10, 10, tags=(SCREEN_TAG,))
+        self.assertFalse(self.view.set_view(1.0, 30, 5))
+        self.assertEqual(self.canvas.coords(item), [20.0, 5.0, 30.0, 15.0])
+        self.assertEqual(self.canvas.coords(hud), [0.0, 0.0, 10.0, 10.0])
+
+    def test_zoom_and_click_in_window_coordinates(self):
+        self.view.set_view(2.0, 50, 0)
+        item = self.view.item_for(self.ids[1])
+        self.assertEqual(self.canvas.coords(item), [0.0, 20.0, 20.0, 40.0])
+        self.assertEqual(self.view.to_document(10, 30), (55.0, 15.0))
+
+        event = types.SimpleNamespace(widget=self.canvas, x=10, y=30, state=0)
+        on_click(event)
+        on_release(event)
+        self.assertEqual(self.canvas.selected_item, self.scene.get(self.ids[1]).group)
+
+    def test_zoomed_out_strokes_are_simplified(self):
+        points = []
+        for i in range(200):
+            points.extend((i, 50 + (i % 2) * 0.5))
+        stroke = self.scene.add("line", points)
+        self.view.set_view(1 / 4, 0, 0)
+        self.assertEqual(lod_level(1 / 4), 2)
+        coords = self.canvas.coords(self.view.item_for(stroke))
+        self.assertLess(len(coords), len(points) // 4)
+        self.assertEqual(coords[:2], [0.0, 12.5])
+
+        self.view.set_view(1.0, 0, 0)
+        self.assertEqual(len(self.canvas.coords(self.view.item_for(stroke))), len(points))
+
+
+if __name__ == "__main__":
+    unittest.main()
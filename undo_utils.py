@@ -1,16 +1,174 @@
+from collections import deque
+
+HISTORY_BUDGET = 32 * 1024 * 1024
+ENTRY_OVERHEAD = 96
+
+
+def record_nbytes(record):
+    size = ENTRY_OVERHEAD + record.coords.itemsize * len(record.coords)
+    if record.data is not None:
+        size += len(record.data.bits)
+    return size
+
+def restore_records(app, records):
+    for record in records:
+        app.scene.restore(record)
+    for group in dict.fromkeys(record.group for record in records):
+        app.view.create_decorations(group)
+
+
+class AddCommand:
+    # Shapes a tool created. While done, the records live in the scene and
+    # cost history nothing; once undone, history holds them for redo.
+    def __init__(self, records):
+        self.records = records
+        self.owned = False
+
+    @classmethod
+    def for_group(cls, scene, group):
+        return cls([scene.get(shape_id) for shape_id in scene.group_members(group)])
+
+    def nbytes(self):
+        if not self.owned:
+            return ENTRY_OVERHEAD * len(self.records)
+        return sum(record_nbytes(record) for record in self.records)
+
+    def undo(self, app):
+        for record in reversed(self.records):
+            app.scene.remove(record.id)
+        self.owned = True
+
+    def redo(self, app):
+        restore_records(app, self.records)
+        self.owned = False
+
+
+class RemoveCommand(AddCommand):
+    def __init__(self, records):
+        super().__init__(records)
+        self.owned = True
+
+    def undo(self, app):
+        AddCommand.redo(self, app)
+
+    def redo(self, app):
+        AddCommand.undo(self, app)
+
+
+class RestyleCommand:
+    # Style changes as (shape_id, before, after) dicts of style options.
+    def __init__(self, changes):
+        self.changes = changes
+
+    def nbytes(self):
+        return ENTRY_OVERHEAD * len(self.changes)
+
+    def undo(self, app):
+        for shape_id, before, _ in reversed(self.changes):
+            if shape_id in app.scene:
+                app.scene.set_style(shape_id, **before)
+
+    def redo(self, app):
+        for shape_id, _, after in self.changes:
+            if shape_id in app.scene:
+                app.scene.set_style(shape_id, **after)
+
+
+class UndoStack:
+    # Undo/redo history of command objects exposing undo(app), redo(app)
+    # and nbytes(). A command with merge(other) may absorb the next push,
+    # which is how a whole drag ends up as one entry. Once the history is
+    # over `budget` bytes the oldest entries are dropped.
+    def __init__(self, budget=HISTORY_BUDGET):
+        self.budget = budget
+        self.nbytes = 0
+        self.evicted = 0
+        self._done = deque()
+        self._undone = []
+
+    def __len__(self):
+        return len(self._done)
+
+    def __bool__(self):
+        return bool(self._done)
+
+    def can_redo(self):
+        return bool(self._undone)
+
+    def top(self):
+        return self._done[-1][0] if self._done else None
+
+    def push(self, command):
+        for _, size in self._undone:
+            self.nbytes -= size
+        self._undone.clear()
+        top = self.top()
+        if top is not None and hasattr(top, "merge") and top.merge(command):
+            _, size = self._done.pop()
+            self.nbytes -= size
+            command = top
+        size = command.nbytes()
+        self._done.append((command, size))
+        self.nbytes += size
+        self._evict()
+
+    def undo(self, app):
+        return self._move(self._done, self._undone, "undo", app)
+
+    def redo(self, app):
+        return self._move(self._undone, self._done, "redo", app)
+
+    def _move(self, source, target, method, app):
+        if not source:
+            return None
+        command, size = source.pop()
+        self.nbytes -= size
+        getattr(command, method)(app)
+        size = command.nbytes()
+        target.append((command, size))
+        self.nbytes += size
+        self._evict()
+        return command
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self._evict()
+
+    def _evict(self):
+        # The newest undo entry always survives, however large it is.
+        while self.nbytes > self.budget and (len(self._done) > 1 or self._undone):
+            if len(self._done) > 1:
+                _, size = self._done.popleft()
+            else:
+                _, size = self._undone.pop(0)
+            self.nbytes -= size
+            self.evicted += 1
+
+    def clear(self):
+        self._done.clear()
+        self._undone.clear()
+        self.nbytes = 0
+
+    def usage(self):
+        return (
+            f"{len(self._done)} undo / {len(self._undone)} redo steps, "
+            f"{self.nbytes / 1024:.1f} KiB of {self.budget / (1024 * 1024):.0f} MiB"
+            f" ({self.evicted} evicted)"
+        )
+
+
+def _drop_stale_selection(app):
+    group_tag = getattr(app.canvas, 'selected_item', None)
+    if group_tag is not None and not app.scene.has_group(group_tag):
+        app.canvas.selected_item = None
+        remaining = [group for group in app.view.highlighted if app.scene.has_group(group)]
+        if remaining:
+            app.canvas.selected_item = remaining[0]
+
 def undo(app, event=None):
-    if app.undo_stack:
-        item = app.undo_stack.pop()
-        group_tag = None
-        for tag in app.canvas.gettags(item):
-            if tag.startswith("group_"):
-                group_tag = tag
-                break
-
-        app.canvas.delete(item)
-
-        if group_tag:
-            for item in app.canvas.find_withtag(group_tag):
-                app.canvas.delete(item)
-            app.canvas.bbox_corners.pop(group_tag, None)
-            app.canvas.bbox_handles.pop(group_tag, None)
+    if app.undo_stack.undo(app) is not None:
+        _drop_stale_selection(app)
+
+def redo(app, event=None):
+    if app.undo_stack.redo(app) is not None:
+        _drop_stale_selection(app)
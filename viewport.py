@@ -0,0 +1,157 @@
+# File: viewport.py
+
+import math
+
+MIN_ZOOM = 1 / 64
+MAX_ZOOM = 32
+ZOOM_STEP = 1.25
+FIT_PADDING = 20  # px around the drawing for zoom_to_fit
+# Canvas items carrying this tag stay put in the window (the performance
+# HUD); panning moves every other item.
+SCREEN_TAG = "screen"
+# Items are kept for the viewport grown by this fraction of its size on
+# every side, so panning only re-culls once it leaves that region.
+CULL_MARGIN = 0.5
+
+
+class Viewport:
+    # The window onto the unbounded document: canvas (window) pixels are
+    # (document - origin) * zoom. `width`/`height` are the window size.
+    def __init__(self, width, height, zoom=1.0, x=0.0, y=0.0):
+        self.width = width
+        self.height = height
+        self.zoom = zoom
+        self.x = x
+        self.y = y
+
+    @property
+    def identity(self):
+        return self.zoom == 1 and self.x == 0 and self.y == 0
+
+    def state(self):
+        return (self.zoom, self.x, self.y)
+
+    def to_document(self, sx, sy):
+        return (self.x + sx / self.zoom, self.y + sy / self.zoom)
+
+    def to_screen(self, x, y):
+        return ((x - self.x) * self.zoom, (y - self.y) * self.zoom)
+
+    def screen_coords(self, coords):
+        if self.identity:
+            return coords
+        import numpy as np
+
+        points = np.asarray(coords, dtype=np.float64)
+        out = np.empty_like(points)
+        out[0::2] = (points[0::2] - self.x) * self.zoom
+        out[1::2] = (points[1::2] - self.y) * self.zoom
+        return out.tolist()
+
+    def screen_bbox(self, bbox):
+        x1, y1 = self.to_screen(bbox[0], bbox[1])
+        x2, y2 = self.to_screen(bbox[2], bbox[3])
+        return (x1, y1, x2, y2)
+
+    def visible_bbox(self):
+        return (self.x, self.y, self.x + self.width / self.zoom, self.y + self.height / self.zoom)
+
+    def region(self, margin=CULL_MARGIN):
+        x1, y1, x2, y2 = self.visible_bbox()
+        mx = (x2 - x1) * margin
+        my = (y2 - y1) * margin
+        return (x1 - mx, y1 - my, x2 + mx, y2 + my)
+
+    def zoomed(self, factor, sx, sy):
+        # (zoom, x, y) after zooming by `factor` about window point sx, sy,
+        # which keeps the document point under it.
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        x, y = self.to_document(sx, sy)
+        return (zoom, x - sx / zoom, y - sy / zoom)
+
+    def fitted(self, bbox, padding=FIT_PADDING):
+        x1, y1, x2, y2 = bbox
+        width = max(self.width - 2 * padding, 1)
+        height = max(self.height - 2 * padding, 1)
+        zoom = min(width / max(x2 - x1, 1e-9), height / max(y2 - y1, 1e-9))
+        zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        # Centre the box in the window.
+        return (zoom, (x1 + x2) / 2 - self.width / 2 / zoom, (y1 + y2) / 2 - self.height / 2 / zoom)
+
+
+def contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+def lod_level(zoom):
+    # Polylines are simplified once zoomed out by at least 2x; each halving
+    # of the zoom doubles the tolerance, so cached levels stay few.
+    if zoom >= 0.5:
+        return 0
+    return int(math.floor(math.log2(1 / zoom)))
+
+
+# App-level view control. Every change goes through set_view so the scene
+# view, layer caches and raster layer stay in step.
+def set_view(app, zoom, x, y):
+    view = app.view
+    zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+    rescaled = zoom != view.viewport.zoom
+    if view.set_view(zoom, x, y):
+        app.compositor.set_region(view.region, zoom)
+    if rescaled and app.raster_layer is not None:
+        app.raster_layer.rescale()
+
+def zoom_by(app, factor, sx=None, sy=None):
+    viewport = app.view.viewport
+    if sx is None:
+        sx, sy = viewport.width / 2, viewport.height / 2
+    set_view(app, *viewport.zoomed(factor, sx, sy))
+
+def reset_zoom(app):
+    viewport = app.view.viewport
+    x, y = viewport.to_document(viewport.width / 2, viewport.height / 2)
+    set_view(app, 1.0, x - viewport.width / 2, y - viewport.height / 2)
+
+def zoom_to_fit(app):
+    records = list(app.scene)
+    if not records:
+        set_view(app, 1.0, 0.0, 0.0)
+        return
+    boxes = [record.bbox() for record in records]
+    bbox = (
+        min(box[0] for box in boxes), min(box[1] for box in boxes),
+        max(box[2] for box in boxes), max(box[3] for box in boxes),
+    )
+    set_view(app, *app.view.viewport.fitted(bbox))
+
+def pan_by(app, dx, dy):
+    # dx, dy in window pixels; the drawing follows the pointer.
+    zoom, x, y = app.view.viewport.state()
+    set_view(app, zoom, x - dx / zoom, y - dy / zoom)
+
+def on_wheel(app, event):
+    # <MouseWheel> carries a delta (Windows/macOS); X11 sends buttons 4/5.
+    up = event.delta > 0 if getattr(event, "num", None) not in (4, 5) else event.num == 4
+    if event.state & 0x0004:  # Ctrl: zoom about the pointer
+        zoom_by(app, ZOOM_STEP if up else 1 / ZOOM_STEP, event.x, event.y)
+    elif event.state & 0x0001:  # Shift: scroll sideways
+        pan_by(app, 40 if up else -40, 0)
+    else:
+        pan_by(app, 0, 40 if up else -40)
+
+def start_pan(app, event):
+    app.pan_anchor = (event.x, event.y, app.view.viewport.x, app.view.viewport.y)
+
+def drag_pan(app, event):
+    # Coalesced to one view change per frame, like shape drags.
+    sx, sy, x, y = app.pan_anchor
+    zoom = app.view.viewport.zoom
+    target = (x - (event.x - sx) / zoom, y - (event.y - sy) / zoom)
+    app.scheduler.request("pan", lambda: set_view(app, app.view.viewport.zoom, *target))
+
+def on_resize(app, event):
+    viewport = app.view.viewport
+    if (event.width, event.height) == (viewport.width, viewport.height):
+        return
+    viewport.width, viewport.height = event.width, event.height
+    set_view(app, *viewport.state())